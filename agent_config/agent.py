@@ -1,16 +1,36 @@
+import asyncio
+import json
+from functools import lru_cache
+from time import perf_counter, time
 from os import getenv , path
 from agno.agent import Agent, RunEvent
+from agno.db.base import SessionType
+from agno.models.message import Message
+from agno.models.metrics import Metrics
 from agno.models.openai import OpenAIResponses
+from agno.run.agent import RunCompletedEvent, RunContentEvent, RunOutput
+from agno.run.base import RunStatus
+from agno.session import AgentSession
 from .db import db
 from .agent_prompt import SystemPrompt
-from .document import knowledge
-from typing import Iterator
+from .answer_cache import ANSWER_CACHE_ENABLED, AnswerCacheStore
+from .context_packer import collect_packing
+from .history import HISTORY_MAX_RUNS, HISTORY_SUMMARY_ENABLED, BoundedHistoryAgent, HistorySummarizer
+from .document import knowledge, embedder
+from .file_store import get_corpus_version
+from pydantic import BaseModel
+from typing import Any, AsyncIterator, Iterator, Literal
+from uuid import uuid4
 from dotenv import load_dotenv
 load_dotenv()
 project_root = path.dirname(path.abspath(__file__))
 
-def get_agent():
-    agent = Agent(
+@lru_cache(maxsize=1)
+def get_agent() -> Agent:
+    # Once per process, built the agent is. Its model client and connection pool, reused they are.
+    # Session state, at run time passed it is; shared, nothing per user here is.
+    # Replayed history, bounded by runs and tokens it is; older turns, the rolling summary carries.
+    return BoundedHistoryAgent(
         model=OpenAIResponses(id=getenv('OPENAI_MODEL_NAME')),
         db=db,
         description=(
@@ -23,17 +43,301 @@ def get_agent():
         read_chat_history=True,
         debug_mode=False,
         add_history_to_context=True,
+        num_history_runs=HISTORY_MAX_RUNS,
+        add_session_summary_to_context=HISTORY_SUMMARY_ENABLED,
     )
-    return agent
 
-def get_response_stream(query: str, session_id: str) -> Iterator[str]:
-    agent = get_agent()
-    for event in agent.run(query, session_id=session_id, stream=True, stream_events=True):
+
+agent = get_agent()
+answer_cache = AnswerCacheStore() if ANSWER_CACHE_ENABLED else None
+history_summarizer = HistorySummarizer(db) if HISTORY_SUMMARY_ENABLED else None
+
+REPLAY_CHUNK_CHARS = 64
+
+
+def cache_stats() -> dict[str, dict[str, int] | None]:
+    """This process's cache and retrieval counters, for GET /stats. A cache disabled, None it reports."""
+    pipeline = knowledge.embedding_pipeline
+    packer = knowledge.context_packer
+    return {
+        "chunk_embeddings": embedder.stats(),
+        "query_embeddings": embedder.query_cache.stats() if embedder.query_cache is not None else None,
+        "embedding_requests": {"requests": pipeline.requests, "retries": pipeline.retries} if pipeline else None,
+        "answers": answer_cache.stats() if answer_cache is not None else None,
+        "retrieval": knowledge.stats(),
+        "context_packing": packer.stats() if packer is not None else None,
+        "sessions": db.cache_stats() if hasattr(db, "cache_stats") else None,
+    }
+
+
+async def drain_history_summaries() -> None:
+    """Summaries still being written, on shutdown awaited they are."""
+    if history_summarizer is not None:
+        await history_summarizer.drain()
+
+
+async def warm_up_agent() -> None:
+    """Clients and TLS connections, open them early I do. Faster the first token then comes."""
+    model = agent.model
+    try:
+        await asyncio.to_thread(model.get_client().models.retrieve, model.id)
+        await model.get_async_client().models.retrieve(model.id)
+        await asyncio.to_thread(lambda: getattr(knowledge.vector_db, "index", None))
+    except Exception as e:
+        print("agent warm-up failed :", str(e))
+
+
+def _event_to_text(event) -> str | None:
+    if event.event == RunEvent.tool_call_started:
+        if event.tool.tool_name == "search_knowledge_base":
+            return '< Exploring >'
+    if event.event == RunEvent.reasoning_step:
+        return "< Thinking >"
+    if event.event == RunEvent.run_content:
+        if event.content:
+            return event.content
+    return None
+
+
+def scope_filters(document_ids: list[str] | None) -> dict[str, Any] | None:
+    # Into the vector store and BM25 queries pushed down, only these documents searched are.
+    if not document_ids:
+        return None
+    return {"document_id": {"$in": sorted(set(document_ids))}}
+
+
+def get_response_stream(query: str, session_id: str, document_ids: list[str] | None = None) -> Iterator[str]:
+    for event in agent.run(
+        query,
+        session_id=session_id,
+        knowledge_filters=scope_filters(document_ids),
+        stream=True,
+        stream_events=True,
+    ):
+        text = _event_to_text(event)
+        if text:
+            yield text
+
+
+async def _answer_cache_key(query: str, session_id: str) -> tuple[str, list[float]] | None:
+    # Follow-up questions, on the chat history they depend. Only a session's first question, cached it is.
+    session = await asyncio.to_thread(db.get_session, session_id=session_id, session_type=SessionType.AGENT)
+    if session is not None and session.runs:
+        return None
+    corpus_version = await asyncio.to_thread(get_corpus_version)
+    vector = await embedder.async_get_embedding(query)
+    return (corpus_version, vector) if vector else None
+
+
+def _record_cached_run(query: str, session_id: str, run_id: str, answer: str) -> None:
+    # Into the session history, the replayed answer goes. Follow-ups, their context keep they do.
+    agent.set_id()
+    run = RunOutput(
+        run_id=run_id,
+        agent_id=agent.id,
+        session_id=session_id,
+        content=answer,
+        messages=[Message(role="user", content=query), Message(role="assistant", content=answer)],
+        metadata={"answer_cache": True},
+        status=RunStatus.completed,
+    )
+    db.upsert_session(AgentSession(session_id=session_id, agent_id=agent.id, runs=[run], created_at=int(time())))
+
+
+async def _replay_cached_answer(query: str, session_id: str, run_id: str, answer: str) -> AsyncIterator[Any]:
+    for i in range(0, len(answer), REPLAY_CHUNK_CHARS):
+        yield RunContentEvent(run_id=run_id, session_id=session_id, content=answer[i : i + REPLAY_CHUNK_CHARS])
+    await asyncio.to_thread(_record_cached_run, query, session_id, run_id, answer)
+    yield RunCompletedEvent(
+        run_id=run_id,
+        session_id=session_id,
+        content=answer,
+        metrics=Metrics(),
+        metadata={"answer_cache": True},
+    )
+
+
+async def _arun_events(query: str, session_id: str, document_ids: list[str] | None = None) -> AsyncIterator[Any]:
+    """
+    Natively async, this stream is. No threadpool thread, pinned it keeps.
+    Abandoned by the client, cancelled the run is; more tokens and tool calls, spent they are not.
+    Enabled the answer cache is, and asked before the question was, replayed the answer is.
+    Scoped to some documents the question is, only their chunks searched are; cached, the answer is not.
+    """
+    run_id = str(uuid4())
+    knowledge_filters = scope_filters(document_ids)
+    cache_key = None
+    if answer_cache is not None and knowledge_filters is None:
+        try:
+            cache_key = await _answer_cache_key(query, session_id)
+            hit = await asyncio.to_thread(answer_cache.lookup, *cache_key) if cache_key else None
+        except Exception as e:
+            print("answer cache lookup failed :", str(e))
+            cache_key, hit = None, None
+        if hit:
+            async for event in _replay_cached_answer(query, session_id, run_id, hit["answer"]):
+                yield event
+            return
+
+    parts: list[str] = []
+    finished = False
+    try:
+        async for event in agent.arun(
+            query,
+            session_id=session_id,
+            run_id=run_id,
+            knowledge_filters=knowledge_filters,
+            stream=True,
+            stream_events=True,
+        ):
+            if cache_key and event.event == RunEvent.run_content and isinstance(event.content, str):
+                parts.append(event.content)
+            if cache_key and event.event == RunEvent.run_completed and parts:
+                await asyncio.to_thread(answer_cache.put, cache_key[0], query, cache_key[1], "".join(parts))
+            yield event
+        finished = True
+        if history_summarizer is not None:
+            history_summarizer.schedule(session_id)
+    finally:
+        if not finished:
+            # Synchronous on purpose: inside a cancelled scope, awaiting fails it would.
+            Agent.cancel_run(run_id)
+
+
+async def aget_response_stream(
+    query: str, session_id: str, document_ids: list[str] | None = None
+) -> AsyncIterator[str]:
+    async for event in _arun_events(query, session_id, document_ids):
+        text = _event_to_text(event)
+        if text:
+            yield text
+
+
+ChatEventType = Literal["token", "tool_started", "tool_finished", "reasoning", "retrieval", "done", "error"]
+
+
+class ChatEvent(BaseModel):
+    event: ChatEventType
+    data: dict[str, Any] = {}
+
+    def to_sse(self) -> str:
+        return f"event: {self.event}\ndata: {json.dumps(self.data, default=str)}\n\n"
+
+
+def _ms(seconds: float | None) -> float | None:
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+class ChatEventMapper:
+    """
+    Agno run events into typed chat events, translate I do.
+    Timings along the way, measured they are. Given the packing stats of the run, tokens saved reported are.
+    """
+
+    def __init__(self, packing: list[dict] | None = None):
+        self.started = perf_counter()
+        self.first_token: float | None = None
+        self.retrieval_seconds = 0.0
+        self.packing = packing if packing is not None else []
+        self._reported: set[int] = set()
+        self._tool_started: dict[str, float] = {}
+
+    def _packing_for(self, query: str | None) -> dict[str, int]:
+        # Parallel searches, out of order they may finish; by query matched the stats are.
+        for i, stats in enumerate(self.packing):
+            if i not in self._reported and stats["query"] == query:
+                self._reported.add(i)
+                return {key: value for key, value in stats.items() if key != "query"}
+        return {}
+
+    def map(self, event) -> list[ChatEvent]:
+        now = perf_counter()
+
+        if event.event == RunEvent.run_content:
+            if not event.content:
+                return []
+            if self.first_token is None:
+                self.first_token = now
+            return [ChatEvent(event="token", data={"text": event.content})]
+
         if event.event == RunEvent.tool_call_started:
-            if event.tool.tool_name == "search_knowledge_base":
-                yield '< Exploring >'
+            tool = event.tool
+            self._tool_started[tool.tool_call_id or tool.tool_name] = now
+            events = [ChatEvent(event="tool_started", data={"tool": tool.tool_name, "args": tool.tool_args or {}})]
+            if tool.tool_name == "search_knowledge_base":
+                query = (tool.tool_args or {}).get("query")
+                events.append(ChatEvent(event="retrieval", data={"status": "searching", "query": query}))
+            return events
+
+        if event.event in (RunEvent.tool_call_completed, RunEvent.tool_call_error):
+            tool = event.tool
+            started = self._tool_started.pop(tool.tool_call_id or tool.tool_name, now)
+            duration = now - started
+            error = getattr(event, "error", None) or tool.tool_call_error
+            events = [
+                ChatEvent(
+                    event="tool_finished",
+                    data={"tool": tool.tool_name, "duration_ms": _ms(duration), "error": bool(error)},
+                )
+            ]
+            if tool.tool_name == "search_knowledge_base":
+                self.retrieval_seconds += duration
+                packing = self._packing_for((tool.tool_args or {}).get("query"))
+                events.append(
+                    ChatEvent(event="retrieval", data={"status": "done", "duration_ms": _ms(duration), **packing})
+                )
+            return events
+
         if event.event == RunEvent.reasoning_step:
-            yield f"< Thinking >"
-        if event.event == RunEvent.run_content:
-            if event.content:
-                yield event.content
\ No newline at end of file
+            step = event.content
+            title = getattr(step, "title", None) or (step if isinstance(step, str) else None)
+            return [ChatEvent(event="reasoning", data={"step": title})]
+
+        if event.event == RunEvent.run_error:
+            return [ChatEvent(event="error", data={"message": event.content})]
+
+        if event.event == RunEvent.run_completed:
+            metrics = event.metrics
+            return [
+                ChatEvent(
+                    event="done",
+                    data={
+                        "run_id": event.run_id,
+                        "cached": bool((event.metadata or {}).get("answer_cache")),
+                        "usage": {
+                            "input_tokens": metrics.input_tokens if metrics else None,
+                            "output_tokens": metrics.output_tokens if metrics else None,
+                            "total_tokens": metrics.total_tokens if metrics else None,
+                        },
+                        "history": (event.metadata or {}).get("history"),
+                        "context": {
+                            "tokens_packed": sum(stats["tokens_packed"] for stats in self.packing),
+                            "tokens_saved": sum(stats["tokens_saved"] for stats in self.packing),
+                        },
+                        "timings": {
+                            "time_to_first_token_ms": _ms(
+                                self.first_token - self.started if self.first_token else None
+                            ),
+                            "retrieval_ms": _ms(self.retrieval_seconds),
+                            "total_ms": _ms(now - self.started),
+                        },
+                    },
+                )
+            ]
+
+        return []
+
+
+async def aget_response_events(
+    query: str, session_id: str, document_ids: list[str] | None = None
+) -> AsyncIterator[str]:
+    """Server-Sent Events, this stream yields. Typed each event is; scan for markers, the client need not."""
+    try:
+        with collect_packing() as packing:
+            mapper = ChatEventMapper(packing)
+            async for event in _arun_events(query, session_id, document_ids):
+                for chat_event in mapper.map(event):
+                    yield chat_event.to_sse()
+    except Exception as e:
+        print("chat stream failed :", str(e))
+        yield ChatEvent(event="error", data={"message": str(e)}).to_sse()
@@ -0,0 +1,84 @@
+import numpy as np
+
+ASSIGN_BATCH_ROWS = 65536
+TRAIN_SAMPLES_PER_LIST = 256
+
+
+class IVFIndex:
+    """
+    Inverted file index, this is. Into nlist clusters the vectors are split.
+    Only the nprobe nearest clusters, scanned they are; more probes, more recall and more latency.
+    Row numbers it stores, not vectors. Exact scores, from the store's matrix computed they are.
+    """
+
+    def __init__(self, nlist: int, iterations: int = 10, seed: int = 0):
+        self.nlist = nlist
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids: np.ndarray | None = None
+        self._lists: list[np.ndarray] = []
+        self._extra: list[list[int]] = []
+        self.size = 0
+
+    @staticmethod
+    def auto_nlist(rows: int) -> int:
+        # Around sqrt(n) clusters, the usual balance it is.
+        return int(max(1, min(65536, round(4 * np.sqrt(rows)))))
+
+    @property
+    def ready(self) -> bool:
+        return self.centroids is not None
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        labels = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), ASSIGN_BATCH_ROWS):
+            batch = vectors[start : start + ASSIGN_BATCH_ROWS]
+            labels[start : start + len(batch)] = np.argmax(batch @ self.centroids.T, axis=1)
+        return labels
+
+    def train(self, vectors: np.ndarray, rows: np.ndarray) -> None:
+        """Spherical k-means on a sample, then every row assigned to its nearest centroid."""
+        rng = np.random.default_rng(self.seed)
+        nlist = max(1, min(self.nlist, len(vectors)))
+        sample_size = min(len(vectors), nlist * TRAIN_SAMPLES_PER_LIST)
+        sample = vectors[rng.choice(len(vectors), size=sample_size, replace=False)]
+
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            counts = np.bincount(labels, minlength=nlist)
+            order = np.argsort(labels, kind="stable")
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            empty = counts == 0
+            sums = np.zeros_like(centroids)
+            sums[~empty] = np.add.reduceat(sample[order], starts[~empty], axis=0)
+            # Empty clusters, reseeded from random samples they are.
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        self.centroids = centroids
+        self.nlist = nlist
+        labels = self._assign(vectors)
+        order = np.argsort(labels, kind="stable")
+        bounds = np.cumsum(np.bincount(labels, minlength=nlist))[:-1]
+        self._lists = [rows[chunk].astype(np.int64) for chunk in np.split(order, bounds)]
+        self._extra = [[] for _ in range(nlist)]
+        self.size = len(rows)
+
+    def add(self, vectors: np.ndarray, rows: np.ndarray) -> None:
+        """New rows, into their nearest clusters appended. Retrained, nothing is."""
+        if not self.ready or len(rows) == 0:
+            return
+        for label, row in zip(self._assign(vectors), rows):
+            self._extra[label].append(int(row))
+        self.size += len(rows)
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        nprobe = max(1, min(nprobe, self.nlist))
+        scores = self.centroids @ query
+        probes = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        parts = [self._lists[p] for p in probes]
+        parts.extend(np.asarray(self._extra[p], dtype=np.int64) for p in probes if self._extra[p])
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
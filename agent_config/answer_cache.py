@@ -0,0 +1,141 @@
+import sqlite3
+from os import getenv
+from pathlib import Path
+from threading import Lock
+from time import time
+
+import numpy as np
+
+from .db import DB_DIR
+
+ANSWER_CACHE_PATH = DB_DIR / "answer_cache.db"
+ANSWER_CACHE_ENABLED = getenv("ANSWER_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+ANSWER_CACHE_THRESHOLD = float(getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = int(getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+ANSWER_CACHE_MAX_ENTRIES = int(getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+
+def _normalize(vector: list[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+
+class AnswerCacheStore:
+    """
+    Answers to questions asked before, keep I do.
+    By query embedding similarity and corpus version, found they are.
+    Changed the corpus has, then stale every answer becomes.
+    The current version's vectors, as one normalised matrix held they are; one matmul a lookup costs.
+    """
+
+    def __init__(
+        self,
+        path: Path = ANSWER_CACHE_PATH,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl_seconds: int = ANSWER_CACHE_TTL_SECONDS,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+    ):
+        self.path = path
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn: sqlite3.Connection | None = None
+        self._lock = Lock()
+        # (corpus version, newest row id) the matrix was loaded at. Changed either, reloaded it is.
+        self._loaded: tuple[str, int | None] | None = None
+        self._matrix: np.ndarray | None = None
+        self._created = np.empty(0)
+        self._entries: list[tuple[str, str]] = []
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS answers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    corpus_version TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    answer TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_answers_corpus_version
+                ON answers (corpus_version, created_at)
+            """)
+        return self._conn
+
+    def _load(self, corpus_version: str) -> None:
+        conn = self._get_conn()
+        marker = (corpus_version, conn.execute("SELECT MAX(id) FROM answers").fetchone()[0])
+        if marker == self._loaded:
+            return
+        rows = conn.execute(
+            "SELECT query, vector, answer, created_at FROM answers WHERE corpus_version = ? ORDER BY id",
+            (corpus_version,),
+        ).fetchall()
+        vectors = [np.frombuffer(blob, dtype=np.float32) for _, blob, _, _ in rows]
+        # One embedding model, one width; rows of another, skipped they are.
+        width = vectors[-1].size if vectors else 0
+        keep = [i for i, vector in enumerate(vectors) if vector.size == width]
+        self._matrix = np.vstack([vectors[i] for i in keep]) if keep else None
+        self._created = np.array([rows[i][3] for i in keep], dtype=np.float64)
+        self._entries = [(rows[i][0], rows[i][2]) for i in keep]
+        self._loaded = marker
+
+    def lookup(self, corpus_version: str, vector: list[float]) -> dict | None:
+        query_vector = _normalize(vector)
+        best: dict | None = None
+        with self._lock:
+            self._load(corpus_version)
+            matrix, created, entries = self._matrix, self._created, self._entries
+
+        if matrix is not None and matrix.shape[1] == query_vector.size:
+            scores = matrix @ query_vector
+            scores[created < time() - self.ttl_seconds] = -np.inf
+            index = int(np.argmax(scores))
+            if scores[index] >= self.threshold:
+                query, answer = entries[index]
+                best = {"query": query, "answer": answer, "score": float(scores[index])}
+
+        if best is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return best
+
+    def put(self, corpus_version: str, query: str, vector: list[float], answer: str) -> None:
+        if not vector or not answer.strip():
+            return
+        with self._lock:
+            conn = self._get_conn()
+            # Older corpus versions, answer correctly they never will again.
+            conn.execute("DELETE FROM answers WHERE corpus_version != ?", (corpus_version,))
+            conn.execute(
+                "INSERT INTO answers (corpus_version, query, vector, answer, created_at) VALUES (?, ?, ?, ?, ?)",
+                (corpus_version, query, _normalize(vector).tobytes(), answer, time()),
+            )
+            conn.execute(
+                """
+                DELETE FROM answers WHERE id NOT IN (
+                    SELECT id FROM answers ORDER BY created_at DESC LIMIT ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            conn.commit()
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._loaded = None
@@ -0,0 +1,149 @@
+import math
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from hashlib import blake2b
+from os import getenv
+from threading import Lock
+from typing import Iterator
+
+from agno.knowledge.document import Document
+
+from .embedding_pipeline import estimate_tokens
+
+CONTEXT_PACKING_ENABLED = getenv("CONTEXT_PACKING_ENABLED", "true").lower() == "true"
+# max_results times this many candidates, fetched before packing they are.
+RERANK_OVERFETCH = int(getenv("RERANK_OVERFETCH", "3"))
+CONTEXT_TOKEN_BUDGET = int(getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+# Fingerprints this many bits apart or fewer, near duplicates they are.
+SIMHASH_MAX_DISTANCE = int(getenv("SIMHASH_MAX_DISTANCE", "3"))
+# Query-term coverage against retriever rank, blended by this weight.
+RERANK_LEXICAL_WEIGHT = float(getenv("RERANK_LEXICAL_WEIGHT", "0.6"))
+
+WORD = re.compile(r"\w+")
+SHINGLE_WORDS = 3
+
+_packing: ContextVar[list[dict] | None] = ContextVar("context_packing", default=None)
+
+
+@contextmanager
+def collect_packing() -> Iterator[list[dict]]:
+    """Packing stats of every search in one run, into this list gathered they are."""
+    packing: list[dict] = []
+    token = _packing.set(packing)
+    try:
+        yield packing
+    finally:
+        _packing.reset(token)
+
+
+def words(text: str) -> list[str]:
+    return WORD.findall(text.lower())
+
+
+def simhash(text: str) -> int:
+    """64-bit fingerprint over word shingles. Close in Hamming distance, near-identical texts are."""
+    tokens = words(text)
+    shingles = [" ".join(tokens[i : i + SHINGLE_WORDS]) for i in range(max(len(tokens) - SHINGLE_WORDS + 1, 1))]
+    weights = [0] * 64
+    for shingle in shingles:
+        value = int.from_bytes(blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def drop_near_duplicates(documents: list[Document], max_distance: int = SIMHASH_MAX_DISTANCE) -> list[Document]:
+    # In rank order walked; the better-ranked copy, kept it is.
+    kept: list[Document] = []
+    fingerprints: list[int] = []
+    for document in documents:
+        fingerprint = simhash(document.content)
+        if any(hamming(fingerprint, seen) <= max_distance for seen in fingerprints):
+            continue
+        kept.append(document)
+        fingerprints.append(fingerprint)
+    return kept
+
+
+def rescore(query: str, documents: list[Document], lexical_weight: float = RERANK_LEXICAL_WEIGHT) -> list[float]:
+    """
+    Query terms a chunk covers, weighted by rarity among the candidates they are.
+    With the retriever's rank blended, a score in [0, 1] each chunk gets. No model, called is.
+    """
+    terms = set(words(query))
+    chunk_terms = [set(words(document.content)) for document in documents]
+    n = len(documents)
+    idf = {term: math.log(1 + n / (1 + sum(term in seen for seen in chunk_terms))) for term in terms}
+    total = sum(idf.values()) or 1.0
+    scores = []
+    for rank, seen in enumerate(chunk_terms):
+        coverage = sum(weight for term, weight in idf.items() if term in seen) / total
+        prior = 1.0 - rank / n
+        scores.append(lexical_weight * coverage + (1 - lexical_weight) * prior)
+    return scores
+
+
+@dataclass
+class ContextPacker:
+    """
+    Over-fetched candidates, into a fixed token budget packed they are.
+    Near duplicates dropped, re-scored locally, then greedily the best chunks fitted are.
+    Tokens saved against the unpacked top results, per query recorded they are.
+    """
+
+    token_budget: int = CONTEXT_TOKEN_BUDGET
+    overfetch: int = RERANK_OVERFETCH
+    max_distance: int = SIMHASH_MAX_DISTANCE
+    lexical_weight: float = RERANK_LEXICAL_WEIGHT
+    queries: int = 0
+    tokens_saved: int = 0
+    _stats_lock: Lock = field(default_factory=Lock, repr=False)
+
+    def pack(self, query: str, candidates: list[Document], limit: int) -> list[Document]:
+        baseline = sum(estimate_tokens(document.content) for document in candidates[:limit])
+        unique = drop_near_duplicates(candidates, self.max_distance)
+        scores = rescore(query, unique, self.lexical_weight) if unique else []
+
+        packed: list[Document] = []
+        used = 0
+        for score, document in sorted(zip(scores, unique), key=lambda pair: pair[0], reverse=True):
+            if len(packed) >= limit:
+                break
+            tokens = estimate_tokens(document.content)
+            # The best chunk, always sent it is; over budget alone though it may be.
+            if packed and used + tokens > self.token_budget:
+                continue
+            document.meta_data["rerank_score"] = round(score, 4)
+            packed.append(document)
+            used += tokens
+
+        saved = max(baseline - used, 0)
+        self._record(
+            {
+                "query": query,
+                "candidates": len(candidates),
+                "duplicates": len(candidates) - len(unique),
+                "packed": len(packed),
+                "tokens_retrieved": baseline,
+                "tokens_packed": used,
+                "tokens_saved": saved,
+            }
+        )
+        return packed
+
+    def _record(self, stats: dict) -> None:
+        with self._stats_lock:
+            self.queries += 1
+            self.tokens_saved += stats["tokens_saved"]
+        packing = _packing.get()
+        if packing is not None:
+            packing.append(stats)
+
+    def stats(self) -> dict[str, int]:
+        return {"queries": self.queries, "tokens_saved": self.tokens_saved}
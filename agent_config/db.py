@@ -1,17 +1,147 @@
 import sqlite3
+from contextlib import contextmanager
+from os import getenv
 from pathlib import Path
-from agno.db.sqlite import SqliteDb
+from queue import Empty, LifoQueue
+from threading import Lock
+from typing import Callable, Iterator
+from sqlalchemy import create_engine, event
+from .session_store import create_session_db
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 DB_DIR = PROJECT_ROOT / "database"
 DB_DIR.mkdir(parents=True, exist_ok=True)
 APP_DB_PATH = DB_DIR / "app.db"
 
-db = SqliteDb(
-    db_file=str(APP_DB_PATH)
+DB_POOL_SIZE = int(getenv("DB_POOL_SIZE", "8"))
+DB_BUSY_TIMEOUT_MS = int(getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_STATEMENT_CACHE_SIZE = 256
+
+
+def configure_connection(conn) -> None:
+    # WAL, readers and the session writer block each other no more. NORMAL sync, safe under WAL it is.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+
+
+engine = create_engine(
+    f"sqlite:///{APP_DB_PATH}",
+    connect_args={"timeout": DB_BUSY_TIMEOUT_MS / 1000},
 )
 
-def get_conn() -> sqlite3.Connection:
-    conn = sqlite3.connect(APP_DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
 
+@event.listens_for(engine, "connect")
+def _configure_agno_connection(dbapi_conn, _record) -> None:
+    configure_connection(dbapi_conn)
+
+
+# Active sessions in memory, written behind to SQLite or Postgres they are.
+db = create_session_db(db_file=str(APP_DB_PATH), db_engine=engine)
+
+
+class ConnectionPool:
+    """
+    Open SQLite connections, reuse I do. Their prepared statements, cached they stay.
+    Thread-safe the pool is; beyond its size, callers wait they must.
+    """
+
+    def __init__(self, path: Path, size: int = DB_POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle: LifoQueue[sqlite3.Connection] = LifoQueue()
+        self._created = 0
+        self._lock = Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=DB_STATEMENT_CACHE_SIZE,
+        )
+        conn.row_factory = sqlite3.Row
+        configure_connection(conn)
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._acquire()
+        try:
+            with conn:
+                yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except Empty:
+                break
+            with self._lock:
+                self._created -= 1
+
+
+pool = ConnectionPool(APP_DB_PATH)
+
+
+def get_conn():
+    # Used as a context manager, this is. Committed on success, back to the pool the connection goes.
+    return pool.connection()
+
+
+def apply_migrations(
+    conn: sqlite3.Connection,
+    component: str,
+    migrations: list[Callable[[sqlite3.Connection], None]],
+) -> int:
+    """
+    Numbered schema steps, in order I apply. Already applied ones, skipped they are.
+    Per component the version is kept; the database file, with Agno's tables shared it is.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_versions (
+            component TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    """)
+    row = conn.execute("SELECT version FROM schema_versions WHERE component = ?", (component,)).fetchone()
+    version = row[0] if row else 0
+
+    for number, migration in enumerate(migrations[version:], start=version + 1):
+        migration(conn)
+        conn.execute(
+            "INSERT OR REPLACE INTO schema_versions (component, version) VALUES (?, ?)",
+            (component, number),
+        )
+        version = number
+    conn.commit()
+    return version
+
+
+def add_column_if_missing(conn: sqlite3.Connection, table: str, column: str, ddl: str) -> None:
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
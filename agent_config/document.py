@@ -1,72 +1,489 @@
+import zipfile
+from contextlib import contextmanager
+from hashlib import sha256
+from io import BytesIO
 from pathlib import Path
+from typing import BinaryIO
 from os import getenv
+from threading import Lock
 from uuid import uuid4
 
-from agno.knowledge.knowledge import Knowledge
+from agno.knowledge.document import Document
 from agno.vectordb.pineconedb import PineconeDb
-from .file_store import save_file_record
+from .context_packer import CONTEXT_PACKING_ENABLED, ContextPacker
+from .embedding_cache import CachedEmbedder
+from .embedding_pipeline import EmbeddingPipeline, estimate_tokens
+from .lexical_index import HYBRID_SEARCH_ENABLED, LexicalIndex
+from .local_vectordb import LocalVectorDb
+from .ingest_timing import stage
+from .pdf_reader import ParallelPDFReader, PreparedReader
+from .retrieval import HybridKnowledge, chunk_key
+from .file_store import (
+    save_file_record,
+    get_file_record,
+    find_file_by_hash,
+    update_file_version,
+    save_document_chunks,
+    get_document_chunks,
+    delete_uploaded_file,
+)
 from dotenv import load_dotenv
 load_dotenv()
 
 index_name = getenv("PINECONE_INDEX_NAME")
+VECTOR_BACKEND = getenv("VECTOR_BACKEND", "pinecone").lower()
+# Unset, in one request every vector Pinecone sends; past its request size limit, large PDFs go.
+PINECONE_UPSERT_BATCH_SIZE = int(getenv("PINECONE_UPSERT_BATCH_SIZE", "100"))
+# Per delete request, at most this many IDs Pinecone accepts.
+PINECONE_DELETE_BATCH_SIZE = 1000
 
-vector_db = PineconeDb(
-    name=index_name,
-    dimension=1536,
-    metric="cosine",
-    spec={"serverless": {"cloud": "aws", "region": "us-east-1"}},
-)
 
-knowledge = Knowledge(
+class BatchedPineconeDb(PineconeDb):
+    def _upsert(self, *args, batch_size: int | None = None, **kwargs) -> None:
+        super()._upsert(*args, batch_size=batch_size or PINECONE_UPSERT_BATCH_SIZE, **kwargs)
+
+    def delete_by_ids(self, ids: list[str]) -> None:
+        for i in range(0, len(ids), PINECONE_DELETE_BATCH_SIZE):
+            self.index.delete(ids=ids[i : i + PINECONE_DELETE_BATCH_SIZE], namespace=self.namespace)
+
+
+embedder = CachedEmbedder()
+
+if VECTOR_BACKEND == "local":
+    # In process the vectors live; no Pinecone index, needed it is.
+    vector_db = LocalVectorDb(
+        name=index_name or "documents",
+        embedder=embedder,
+        dimension=1536,
+    )
+else:
+    vector_db = BatchedPineconeDb(
+        name=index_name,
+        embedder=embedder,
+        dimension=1536,
+        metric="cosine",
+        spec={"serverless": {"cloud": "aws", "region": "us-east-1"}},
+    )
+
+# Exact terms, by BM25 found they are; fused with vector results, the rest.
+lexical_index = LexicalIndex() if HYBRID_SEARCH_ENABLED else None
+
+knowledge = HybridKnowledge(
     name="My Pinecone Knowledge Base",
     description="PDF-backed knowledge base",
     vector_db=vector_db,
+    lexical_index=lexical_index,
+    embedding_pipeline=EmbeddingPipeline(embedder),
+    # Deduplicated, re-scored and fitted to a token budget, search results are.
+    context_packer=ContextPacker() if CONTEXT_PACKING_ENABLED else None,
 )
 
+# Pages across worker processes, extracted they are.
+pdf_reader = ParallelPDFReader()
+
 UPLOAD_DIR = Path(__file__).resolve().parent.parent / "media" / "uploads"
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
+UPLOAD_CHUNK_BYTES = 1024 * 1024
 
-def handle_pdf_upload(file_name: str, content: bytes) -> dict:
-    if not file_name.lower().endswith(".pdf") or not content:
+
+class FileTooLargeError(ValueError):
+    pass
+
+
+class ArchiveTooLargeError(ValueError):
+    pass
+
+
+class EmptyDocumentError(ValueError):
+    pass
+
+
+class CappedReader:
+    """Bytes read through me, against a shared budget counted they are. Past it, the whole archive rejected is."""
+
+    def __init__(self, source: BinaryIO, budget: list[int]):
+        self.source = source
+        self.budget = budget
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.source.read(size)
+        self.budget[0] -= len(chunk)
+        if self.budget[0] < 0:
+            raise ArchiveTooLargeError("Archive too large when uncompressed")
+        return chunk
+
+
+def hash_content(content: bytes) -> str:
+    return sha256(content).hexdigest()
+
+
+def find_duplicate_upload(file_name: str, content_hash: str) -> dict | None:
+    existing = find_file_by_hash(content_hash)
+    if not existing:
+        return None
+
+    return {
+        "document_id": existing["namespace"],
+        "file_path": existing["file_path"],
+        "file_name": existing["file_name"],
+        "content_hash": content_hash,
+        "duplicate": True,
+    }
+
+
+def stage_pdf_file(file_name: str, source: BinaryIO, max_bytes: int | None = None) -> dict:
+    """
+    In chunks to disk, the upload is copied. Hashed and measured as it streams, it is.
+    Whole in memory, the file never sits. Too large it grows, deleted the partial file is.
+    """
+    if not file_name.lower().endswith(".pdf"):
         raise ValueError("Invalid PDF")
 
     document_id = f"doc_{uuid4().hex}"
-    stored_name = f"{document_id}_{file_name}"
-    file_path = UPLOAD_DIR / stored_name
+    file_path = UPLOAD_DIR / f"{document_id}_{file_name}"
+    part_path = file_path.with_name(file_path.name + ".part")
+
+    digest = sha256()
+    size = 0
+    try:
+        with open(part_path, "wb") as f:
+            while chunk := source.read(UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise FileTooLargeError("File too large")
+                digest.update(chunk)
+                f.write(chunk)
+
+        if size == 0:
+            raise ValueError("Empty file")
+        part_path.replace(file_path)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+
+    return {
+        "document_id": document_id,
+        "file_path": str(file_path),
+        "file_name": file_name,
+        "content_hash": digest.hexdigest(),
+    }
+
+
+def stage_pdf_upload(file_name: str, content: bytes) -> dict:
+    if not file_name.lower().endswith(".pdf") or not content:
+        raise ValueError("Invalid PDF")
+
+    return stage_pdf_file(file_name, BytesIO(content))
+
+
+def discard_staged_upload(staged: dict) -> None:
+    Path(staged["file_path"]).unlink(missing_ok=True)
 
-    with open(file_path, "wb") as f:
-        f.write(content)
 
+def stage_zip_archive(
+    source: BinaryIO,
+    max_bytes: int | None = None,
+    max_files: int | None = None,
+    max_total_bytes: int | None = None,
+) -> list[dict]:
+    """
+    Each PDF in the archive, staged like a single upload it is. Streamed from the zip, never whole in memory.
+    Rejected members, with their error returned they are; the rest of the archive, still staged it is.
+    Past max_total_bytes the streamed members grow, the whole archive rejected and its staged files removed are.
+    """
+    try:
+        archive = zipfile.ZipFile(source)
+    except zipfile.BadZipFile:
+        raise ValueError("Invalid zip archive")
+
+    staged = []
+    with archive:
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir()
+            and not info.filename.startswith("__MACOSX/")
+            and not Path(info.filename).name.startswith(".")
+        ]
+        if max_files is not None and len(members) > max_files:
+            raise ValueError(f"Too many files in archive. Max {max_files} allowed")
+
+        budget = [max_total_bytes if max_total_bytes is not None else float("inf")]
+        try:
+            for info in members:
+                file_name = Path(info.filename).name
+                if not file_name.lower().endswith(".pdf"):
+                    staged.append({"file_name": file_name, "error": "Only PDF files are allowed"})
+                    continue
+                # Declared size, trusted it is not; while streaming, counted the real bytes are.
+                if max_bytes is not None and info.file_size > max_bytes:
+                    staged.append({"file_name": file_name, "error": "File too large"})
+                    continue
+                try:
+                    with archive.open(info) as member:
+                        staged.append(stage_pdf_file(file_name, CappedReader(member, budget), max_bytes))
+                except ArchiveTooLargeError:
+                    raise
+                except (ValueError, RuntimeError, zipfile.BadZipFile) as e:
+                    staged.append({"file_name": file_name, "error": str(e)})
+        except ArchiveTooLargeError:
+            for item in staged:
+                if "file_path" in item:
+                    discard_staged_upload(item)
+            raise
+    return staged
+
+
+def _already_ingested(document_id: str, file_path: str, content_hash: str | None) -> str | None:
+    # Resumed after a crash, this job may be. Recorded already, skip it we do.
+    if get_file_record(document_id):
+        return document_id
+
+    # Same bytes indexed meanwhile, another job may have. Embed them twice, we will not.
+    existing = find_file_by_hash(content_hash) if content_hash else None
+    if existing:
+        Path(file_path).unlink(missing_ok=True)
+        return existing["namespace"]
+    return None
+
+
+def _insert_documents(document_id: str, file_name: str, file_path: str, documents: list[Document]) -> None:
+    # Parsed already the file is; through the knowledge base only the given chunks go.
     knowledge.insert(
         name=document_id,
-        path=str(file_path),
+        path=file_path,
         metadata={
             "document_id": document_id,
             "source": file_name,
         },
-        skip_if_exists=True,
+        reader=PreparedReader(documents),
     )
 
+
+def _chunk_manifest(documents: list[Document]) -> list[dict]:
+    return [
+        {
+            "ordinal": ordinal,
+            "page": document.meta_data.get("page"),
+            "chunk_hash": chunk_key(document),
+            "vector_id": document.id,
+            "token_count": estimate_tokens(document.content),
+        }
+        for ordinal, document in enumerate(d for d in documents if d.content)
+    ]
+
+
+def ingest_pdf(
+    document_id: str,
+    file_name: str,
+    file_path: str,
+    content_hash: str | None = None,
+    documents: list[Document] | None = None,
+) -> str:
+    existing = _already_ingested(document_id, file_path, content_hash)
+    if existing:
+        return existing
+
+    if documents is None:
+        with stage("parse"):
+            documents = pdf_reader.read(Path(file_path), name=document_id)
+
+    # Upserted by content hash the chunks are: resumed after a crash, replaced the partial vectors are.
+    _insert_documents(document_id, file_name, file_path, documents)
+
     save_file_record(
         file_name=file_name,
-        file_path=str(file_path),
+        file_path=file_path,
         pinecone_namespace=document_id,  # reuse column
+        content_hash=content_hash,
     )
+    save_document_chunks(document_id, _chunk_manifest(documents))
+    return document_id
+
+
+def diff_chunks(
+    stored: list[tuple[str, str]],
+    documents: list[Document],
+) -> tuple[list[Document], list[Document], list[str]]:
+    """
+    Against the stored (chunk hash, vector ID) pairs, the new chunks compared are.
+    Unchanged chunks, the stored vector ID they take. Kept, added, and removed vector IDs, returned they are.
+    """
+    # Repeated chunks, counted each one is: a multiset the stored set is.
+    available: dict[str, list[str]] = {}
+    for chunk_hash, vector_id in stored:
+        available.setdefault(chunk_hash, []).append(vector_id)
+
+    kept, added = [], []
+    for document in documents:
+        if not document.content:
+            continue
+        vector_ids = available.get(chunk_key(document))
+        if vector_ids:
+            document.id = vector_ids.pop(0)
+            kept.append(document)
+        else:
+            added.append(document)
+    removed = [vector_id for vector_ids in available.values() for vector_id in vector_ids]
+    return kept, added, removed
+
+
+# Per document, revisions and deletes one at a time they run.
+_document_locks: dict[str, tuple[Lock, list[int]]] = {}
+_document_locks_guard = Lock()
+
+
+@contextmanager
+def document_lock(document_id: str):
+    with _document_locks_guard:
+        lock, users = _document_locks.setdefault(document_id, (Lock(), [0]))
+        users[0] += 1
+    try:
+        with lock:
+            yield
+    finally:
+        with _document_locks_guard:
+            users[0] -= 1
+            if not users[0]:
+                del _document_locks[document_id]
+
+
+def revise_pdf(document_id: str, file_path: str, content_hash: str | None = None) -> dict:
+    """
+    A new version of a document, diffed by chunk hash it is. Unchanged chunks, their vectors keep.
+    Only added chunks embedded and upserted are; removed ones, by vector ID deleted.
+    No text in the new version, rejected it is; wiped from the index, the document never is.
+    """
+    with document_lock(document_id):
+        return _revise_pdf(document_id, file_path, content_hash)
+
+
+def _revise_pdf(document_id: str, file_path: str, content_hash: str | None) -> dict:
+    # Deleted while this revision waited, the document may have been.
+    record = get_file_record(document_id)
+    if record is None:
+        raise KeyError(document_id)
+
+    documents = pdf_reader.read(Path(file_path), name=document_id)
+    if not any(document.content for document in documents):
+        raise EmptyDocumentError("No text found in PDF")
+    stored = get_document_chunks(document_id)
+    kept, added, removed = diff_chunks(stored, documents)
+
+    if not stored:
+        _delete_vectors(document_id, None)
+    if added:
+        # Under the original name the chunks stay; by source, deleted together they are.
+        _insert_documents(document_id, record["file_name"], file_path, added)
+    # Added first, removed after: between the two, half a document searchable never is.
+    if removed:
+        _delete_vectors(document_id, removed)
+
+    save_document_chunks(document_id, _chunk_manifest(documents))
+    update_file_version(document_id, file_path, content_hash)
+    if record["file_path"] != file_path:
+        Path(record["file_path"]).unlink(missing_ok=True)
 
     return {
         "document_id": document_id,
-        "file_path": str(file_path),
-        "file_name": file_name,
+        "file_name": record["file_name"],
+        "added": len(added),
+        "removed": len(removed),
+        "unchanged": len(kept),
     }
 
 
-def handle_delete_pdf(file_name):
+def ingest_pdf_job(job: dict) -> str:
+    return ingest_pdf(
+        document_id=job["document_id"],
+        file_name=job["file_name"],
+        file_path=job["file_path"],
+        content_hash=job["content_hash"],
+    )
+
+
+def ingest_pdf_batch(jobs: list[dict]) -> dict[str, str | Exception]:
+    """
+    Several files, parsed first they are. Their chunks together embedded, in shared batches.
+    Then, one by one into the knowledge base they go. Per job, the document ID or the error returned is.
+    """
+    results: dict[str, str | Exception] = {}
+    parsed = []
+    for job in jobs:
+        try:
+            existing = _already_ingested(job["document_id"], job["file_path"], job["content_hash"])
+            if existing:
+                results[job["id"]] = existing
+                continue
+            with stage("parse"):
+                parsed.append((job, pdf_reader.read(Path(job["file_path"]), name=job["document_id"])))
+        except Exception as e:
+            results[job["id"]] = e
+
+    chunks = [document for _, documents in parsed for document in documents]
     try:
-        vector_db.delete_by_metadata({"source": file_name})
-        return True
+        knowledge.embed_documents(chunks)
     except Exception as e:
-        print(f"error deleting pincoin data for {file_name} :",str(e))
-        return False
+        # Retries spent the shared embedding has, every parsed job with it fails; uploaded again, they can be.
+        for job, _ in parsed:
+            results[job["id"]] = e
+        return results
+
+    try:
+        for job, documents in parsed:
+            try:
+                results[job["id"]] = ingest_pdf(
+                    document_id=job["document_id"],
+                    file_name=job["file_name"],
+                    file_path=job["file_path"],
+                    content_hash=job["content_hash"],
+                    documents=documents,
+                )
+            except Exception as e:
+                results[job["id"]] = e
+    finally:
+        knowledge.release_embeddings(chunks)
+    return results
+
+
+def handle_pdf_upload(file_name: str, content: bytes) -> dict:
+    if not file_name.lower().endswith(".pdf") or not content:
+        raise ValueError("Invalid PDF")
+
+    duplicate = find_duplicate_upload(file_name, hash_content(content))
+    if duplicate:
+        return duplicate
+
+    staged = stage_pdf_upload(file_name, content)
+    staged["document_id"] = ingest_pdf(**staged)
+    return staged
+
+
+def _delete_vectors(document_id: str, vector_ids: list[str] | None) -> None:
+    if vector_ids is not None:
+        vector_db.delete_by_ids(vector_ids)
+        if lexical_index is not None:
+            lexical_index.delete_chunks(vector_ids)
+    else:
+        # Indexed before the manifest existed, this document was. By its own ID, not its file name, deleted it is.
+        vector_db.delete_by_metadata({"document_id": document_id})
+        if lexical_index is not None:
+            lexical_index.delete({"document_id": document_id})
 
 
+def handle_delete_pdf(document_id: str) -> bool:
+    """
+    By the exact vector IDs in its manifest, a document's chunks deleted are.
+    Other documents with the same file name, untouched they stay. Then the record and file, removed.
+    """
+    with document_lock(document_id):
+        # By a concurrent request deleted already, nothing left there is.
+        if get_file_record(document_id) is None:
+            return True
+        try:
+            chunks = get_document_chunks(document_id)
+            _delete_vectors(document_id, [vector_id for _, vector_id in chunks] if chunks else None)
+        except Exception as e:
+            print(f"error deleting vectors for {document_id} :", str(e))
+            return False
+        return bool(delete_uploaded_file(document_id))
@@ -0,0 +1,337 @@
+import sqlite3
+import unicodedata
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from hashlib import sha256
+from os import getenv
+from pathlib import Path
+from threading import Lock
+from time import time
+
+from agno.knowledge.embedder import Embedder
+from agno.knowledge.embedder.openai import OpenAIEmbedder
+
+from .db import DB_DIR
+
+EMBEDDING_CACHE_PATH = DB_DIR / "embedding_cache.db"
+QUERY_CACHE_SIZE = int(getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL_SECONDS = int(getenv("QUERY_EMBEDDING_CACHE_TTL_SECONDS", "3600"))
+QUERY_CACHE_PERSIST = getenv("QUERY_EMBEDDING_CACHE_PERSIST", "false").lower() in ("1", "true", "yes")
+
+
+def normalize_text(text: str) -> str:
+    # Whitespace and unicode form, change the meaning they do not.
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingCacheStore:
+    """
+    Chunk embeddings on disk, keep I do.
+    By model and normalized text hash, keyed they are.
+    """
+
+    def __init__(self, path: Path = EMBEDDING_CACHE_PATH):
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+        self._lock = Lock()
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    dimensions INTEGER NOT NULL,
+                    vector BLOB NOT NULL
+                )
+            """)
+        return self._conn
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return sha256(f"{model}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        if not keys:
+            return {}
+        found: dict[str, list[float]] = {}
+        with self._lock:
+            conn = self._get_conn()
+            # Within SQLite's variable limit, stay we must.
+            for i in range(0, len(keys), 500):
+                batch = keys[i : i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+        return found
+
+    def put_many(self, model: str, items: dict[str, list[float]]) -> None:
+        rows = [
+            (key, model, len(vector), array("f", vector).tobytes())
+            for key, vector in items.items()
+            if vector
+        ]
+        if not rows:
+            return
+        with self._lock:
+            conn = self._get_conn()
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dimensions, vector) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class QueryEmbeddingCache:
+    """
+    Query embeddings, in memory kept they are: least recently used evicted first, after the TTL expired.
+    Given a path, in SQLite too they persist; warm after a restart, the cache stays.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = QUERY_CACHE_SIZE,
+        ttl_seconds: int = QUERY_CACHE_TTL_SECONDS,
+        path: Path | None = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, tuple[float, list[float]]] = OrderedDict()
+        self._conn: sqlite3.Connection | None = None
+        self._lock = Lock()
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS query_embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_query_embeddings_created_at ON query_embeddings (created_at)"
+            )
+        return self._conn
+
+    def _remember(self, key: str, created_at: float, vector: list[float]) -> None:
+        self._entries[key] = (created_at, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: str) -> list[float] | None:
+        now = time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+            if self.path is not None:
+                row = self._get_conn().execute(
+                    "SELECT vector, created_at FROM query_embeddings WHERE key = ? AND created_at >= ?",
+                    (key, now - self.ttl_seconds),
+                ).fetchone()
+                if row is not None:
+                    vector = array("f", row[0]).tolist()
+                    self._remember(key, row[1], vector)
+                    self.hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, vector: list[float]) -> None:
+        if not vector:
+            return
+        now = time()
+        with self._lock:
+            self._remember(key, now, vector)
+            if self.path is None:
+                return
+            conn = self._get_conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO query_embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                (key, array("f", vector).tobytes(), now),
+            )
+            conn.execute("DELETE FROM query_embeddings WHERE created_at < ?", (now - self.ttl_seconds,))
+            conn.execute(
+                """
+                DELETE FROM query_embeddings WHERE key NOT IN (
+                    SELECT key FROM query_embeddings ORDER BY created_at DESC LIMIT ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            conn.commit()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def default_query_cache() -> QueryEmbeddingCache:
+    return QueryEmbeddingCache(path=EMBEDDING_CACHE_PATH if QUERY_CACHE_PERSIST else None)
+
+
+@dataclass
+class CachedEmbedder(Embedder):
+    """
+    In front of the real embedder, stand I do.
+    Chunks embedded before, from disk they come. Only new chunks, paid for they are.
+    Query embeddings, in a separate LRU they live; the chunk cache, fill they never do.
+    """
+
+    embedder: Embedder = field(default_factory=OpenAIEmbedder)
+    store: EmbeddingCacheStore = field(default_factory=EmbeddingCacheStore)
+    query_cache: QueryEmbeddingCache | None = field(default_factory=default_query_cache)
+    hits: int = 0
+    misses: int = 0
+
+    def __post_init__(self):
+        self.dimensions = self.embedder.dimensions
+        self.enable_batch = self.embedder.enable_batch
+        self.batch_size = self.embedder.batch_size
+        self._counter_lock = Lock()
+        # By the pipeline embedded and already counted, for the vector store's embed step held these are.
+        self._primed: dict[str, list[float]] = {}
+
+    @property
+    def id(self) -> str:
+        return getattr(self.embedder, "id", type(self.embedder).__name__)
+
+    @property
+    def model_key(self) -> str:
+        return f"{self.id}:{self.dimensions}"
+
+    def _count(self, hits: int, misses: int) -> None:
+        with self._counter_lock:
+            self.hits += hits
+            self.misses += misses
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def prime(self, items: dict[str, list[float]]) -> None:
+        with self._counter_lock:
+            self._primed.update(items)
+
+    def release(self, keys: list[str]) -> None:
+        with self._counter_lock:
+            for key in keys:
+                self._primed.pop(key, None)
+
+    def _take_primed(self, keys: list[str]) -> dict[str, list[float]]:
+        with self._counter_lock:
+            return {key: self._primed.pop(key) for key in keys if key in self._primed}
+
+    def get_embedding(self, text: str) -> list[float]:
+        if self.query_cache is None:
+            return self.embedder.get_embedding(text)
+        key = self.store.make_key(self.model_key, text)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return cached
+        embedding = self.embedder.get_embedding(text)
+        self.query_cache.put(key, embedding)
+        return embedding
+
+    async def async_get_embedding(self, text: str) -> list[float]:
+        if self.query_cache is None:
+            return await self.embedder.async_get_embedding(text)
+        key = self.store.make_key(self.model_key, text)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return cached
+        embedding = await self.embedder.async_get_embedding(text)
+        self.query_cache.put(key, embedding)
+        return embedding
+
+    def get_embedding_and_usage(self, text: str) -> tuple[list[float], dict | None]:
+        key = self.store.make_key(self.model_key, text)
+        primed = self._take_primed([key])
+        if primed:
+            return primed[key], None
+        cached = self.store.get_many([key]).get(key)
+        if cached:
+            self._count(1, 0)
+            return cached, None
+
+        self._count(0, 1)
+        embedding, usage = self.embedder.get_embedding_and_usage(text)
+        self.store.put_many(self.model_key, {key: embedding})
+        return embedding, usage
+
+    async def async_get_embedding_and_usage(self, text: str) -> tuple[list[float], dict | None]:
+        key = self.store.make_key(self.model_key, text)
+        primed = self._take_primed([key])
+        if primed:
+            return primed[key], None
+        cached = self.store.get_many([key]).get(key)
+        if cached:
+            self._count(1, 0)
+            return cached, None
+
+        self._count(0, 1)
+        embedding, usage = await self.embedder.async_get_embedding_and_usage(text)
+        self.store.put_many(self.model_key, {key: embedding})
+        return embedding, usage
+
+    async def async_get_embeddings_batch_and_usage(
+        self, texts: list[str]
+    ) -> tuple[list[list[float]], list[dict | None]]:
+        keys = [self.store.make_key(self.model_key, text) for text in texts]
+        primed = self._take_primed(keys)
+        cached = self.store.get_many([key for key in keys if key not in primed])
+        missing = [i for i, key in enumerate(keys) if key not in cached and key not in primed]
+        self._count(sum(key in cached for key in keys), len(missing))
+        cached.update(primed)
+
+        usages: list[dict | None] = [None] * len(texts)
+        if missing:
+            fresh, fresh_usages = await self.embedder.async_get_embeddings_batch_and_usage(
+                [texts[i] for i in missing]
+            )
+            new_items = {}
+            for i, embedding, usage in zip(missing, fresh, fresh_usages):
+                new_items[keys[i]] = embedding
+                usages[i] = usage
+            self.store.put_many(self.model_key, new_items)
+            cached.update(new_items)
+
+        return [cached.get(key, []) for key in keys], usages
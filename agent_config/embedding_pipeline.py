@@ -0,0 +1,181 @@
+import asyncio
+import random
+import re
+from os import getenv
+from typing import Any
+
+from agno.knowledge.document import Document
+from agno.knowledge.embedder import Embedder
+from agno.knowledge.embedder.openai import OpenAIEmbedder
+from openai import APIConnectionError, APIStatusError
+
+from .embedding_cache import CachedEmbedder
+
+EMBED_BATCH_TOKENS = int(getenv("EMBED_BATCH_TOKENS", "100000"))
+# The embeddings API, at most 2048 inputs per request it takes.
+EMBED_BATCH_MAX_ITEMS = int(getenv("EMBED_BATCH_MAX_ITEMS", "512"))
+EMBED_CONCURRENCY = int(getenv("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(getenv("EMBED_MAX_RETRIES", "6"))
+# Connection errors and timeouts, fewer times retried they are; down the API is, soon the job fails.
+EMBED_CONNECT_RETRIES = int(getenv("EMBED_CONNECT_RETRIES", "3"))
+MAX_BACKOFF_SECONDS = 60.0
+# No tokenizer installed, a rough estimate this is; English text, about four characters per token.
+CHARS_PER_TOKEN = 4
+
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def pack_batches(texts: list[str], max_tokens: int, max_items: int) -> list[list[int]]:
+    """In order, texts into batches packed they are: neither the token budget nor the item cap exceeded."""
+    batches: list[list[int]] = []
+    current: list[int] = []
+    tokens = 0
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if current and (tokens + cost > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, tokens = [], 0
+        current.append(i)
+        tokens += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def parse_duration(value: str) -> float | None:
+    """Rate-limit reset headers, like "6m0s" or "20ms", into seconds I turn."""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_SECONDS[unit] for amount, unit in parts)
+
+
+def is_retryable(error: Exception) -> bool:
+    # Rate limited, overloaded, or a network blip: wait and retry we do. Other errors, at once the job fail.
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, APIConnectionError)
+
+
+def retry_delay(error: Exception, attempt: int) -> float:
+    """What the server asked for, honoured it is. Otherwise, exponential backoff with jitter."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header in ("retry-after-ms", "retry-after", "x-ratelimit-reset-tokens", "x-ratelimit-reset-requests"):
+        value = headers.get(header)
+        if value:
+            seconds = parse_duration(value)
+            if seconds is not None:
+                seconds = seconds / 1000 if header == "retry-after-ms" else seconds
+                return min(MAX_BACKOFF_SECONDS, max(seconds, 0.0))
+    return min(MAX_BACKOFF_SECONDS, 2**attempt) * (0.5 + random.random() / 2)
+
+
+class EmbeddingPipeline:
+    """
+    Between chunking and upsert, I stand. Into token-budgeted batches the chunks are packed;
+    with bounded concurrency sent they are. Rate limited or briefly unreachable, back off and retry we do.
+    Into the chunk cache the vectors go, and primed for the vector store's own embed step they are;
+    counted once, as misses here, they are. Cached before, to the vector store's lookup left and counted there.
+    """
+
+    def __init__(
+        self,
+        embedder: Embedder,
+        batch_tokens: int = EMBED_BATCH_TOKENS,
+        max_items: int = EMBED_BATCH_MAX_ITEMS,
+        concurrency: int = EMBED_CONCURRENCY,
+        max_retries: int = EMBED_MAX_RETRIES,
+        connect_retries: int = EMBED_CONNECT_RETRIES,
+    ):
+        self.embedder = embedder
+        self.batch_tokens = batch_tokens
+        self.max_items = max_items
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.connect_retries = connect_retries
+        self.requests = 0
+        self.retries = 0
+
+    @property
+    def _inner(self) -> Embedder:
+        return self.embedder.embedder if isinstance(self.embedder, CachedEmbedder) else self.embedder
+
+    async def _request(self, texts: list[str]) -> tuple[list[list[float]], dict | None]:
+        inner = self._inner
+        if not isinstance(inner, OpenAIEmbedder):
+            embeddings, usages = await inner.async_get_embeddings_batch_and_usage(texts)
+            return embeddings, usages[0] if usages else None
+
+        # Called directly the client is: Agno's batch helper, rate-limit errors it swallows.
+        req: dict[str, Any] = {"input": texts, "model": inner.id, "encoding_format": inner.encoding_format}
+        if inner.user is not None:
+            req["user"] = inner.user
+        if inner.id.startswith("text-embedding-3") or inner.base_url is not None:
+            req["dimensions"] = inner.dimensions
+        if inner.request_params:
+            req.update(inner.request_params)
+        response = await inner.aclient.embeddings.create(**req)
+        return [data.embedding for data in response.data], response.usage.model_dump() if response.usage else None
+
+    async def _embed_batch(self, texts: list[str], semaphore: asyncio.Semaphore) -> tuple[list[list[float]], dict | None]:
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self.requests += 1
+                    return await self._request(texts)
+                except Exception as e:
+                    limit = self.max_retries if isinstance(e, APIStatusError) else self.connect_retries
+                    if attempt >= limit or not is_retryable(e):
+                        raise
+                    self.retries += 1
+                    await asyncio.sleep(retry_delay(e, attempt))
+        raise RuntimeError("unreachable")
+
+    async def embed_documents(self, documents: list[Document]) -> int:
+        """Uncached chunks, embedded in place they are. How many were sent to the API, returned it is."""
+        pending = [d for d in documents if d.embedding is None and d.content]
+        if not pending:
+            return 0
+
+        store = self.embedder.store if isinstance(self.embedder, CachedEmbedder) else None
+        model_key = self.embedder.model_key if store is not None else ""
+        keys = [store.make_key(model_key, d.content) for d in pending] if store is not None else []
+        # Already cached chunks, to the vector store's own embed step left they are; a local hit, that is.
+        cached = store.get_many(keys) if store is not None else {}
+        missing = [i for i in range(len(pending)) if store is None or keys[i] not in cached]
+        if not missing:
+            return 0
+
+        texts = [pending[i].content for i in missing]
+        batches = pack_batches(texts, self.batch_tokens, self.max_items)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(*[self._embed_batch([texts[j] for j in batch], semaphore) for batch in batches])
+
+        fresh: dict[str, list[float]] = {}
+        for batch, (embeddings, usage) in zip(batches, results):
+            for j, embedding in zip(batch, embeddings):
+                document = pending[missing[j]]
+                document.embedding, document.usage = embedding, usage
+                if store is not None:
+                    fresh[keys[missing[j]]] = embedding
+        if store is not None:
+            store.put_many(model_key, fresh)
+            self.embedder.prime(fresh)
+            self.embedder._count(0, len(missing))
+        return len(missing)
+
+    def release(self, documents: list[Document]) -> None:
+        """Primed vectors the vector store never asked for, dropped they are."""
+        if isinstance(self.embedder, CachedEmbedder):
+            model_key = self.embedder.model_key
+            self.embedder.release([self.embedder.store.make_key(model_key, d.content) for d in documents if d.content])
@@ -1,65 +1,302 @@
 import os
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from pathlib import Path
 from datetime import datetime
 from typing import List, Dict
-from .db import get_conn
+from .db import get_conn, add_column_if_missing, apply_migrations
+
+
+def _create_uploaded_documents(conn) -> None:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS uploaded_documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_name TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            pinecone_namespace TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    """)
+
+
+def _add_content_hash(conn) -> None:
+    add_column_if_missing(conn, "uploaded_documents", "content_hash", "TEXT")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_uploaded_documents_content_hash
+        ON uploaded_documents (content_hash)
+    """)
+
+
+def _add_lookup_indexes(conn) -> None:
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_uploaded_documents_namespace
+        ON uploaded_documents (pinecone_namespace)
+    """)
+    # Keyset pagination, on (created_at, id) it walks.
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_uploaded_documents_created_at
+        ON uploaded_documents (created_at, id)
+    """)
+
+
+def _create_document_chunks(conn) -> None:
+    # Which chunks, under which vector IDs, each document holds. Diffed against on revision, it is.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS document_chunks (
+            document_id TEXT NOT NULL,
+            chunk_hash TEXT NOT NULL,
+            vector_id TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_document_chunks_document
+        ON document_chunks (document_id)
+    """)
+
+
+def _add_chunk_details(conn) -> None:
+    add_column_if_missing(conn, "document_chunks", "ordinal", "INTEGER")
+    add_column_if_missing(conn, "document_chunks", "page", "INTEGER")
+    add_column_if_missing(conn, "document_chunks", "token_count", "INTEGER")
+
+
+def _create_corpus_version(conn) -> None:
+    # One row, one counter. In every upload, revision and delete transaction, bumped it is.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS corpus_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO corpus_version (id, version) VALUES (1, 0)")
+
+
+# Append only, this list is. Reorder or edit old steps, never.
+FILE_TABLE_MIGRATIONS = [
+    _create_uploaded_documents,
+    _add_content_hash,
+    _add_lookup_indexes,
+    _create_document_chunks,
+    _add_chunk_details,
+    _create_corpus_version,
+]
+
+
+def _bump_corpus_version(conn) -> None:
+    conn.execute("UPDATE corpus_version SET version = version + 1 WHERE id = 1")
 
 
 def init_file_table() -> None:
     with get_conn() as conn:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS uploaded_documents (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                file_name TEXT NOT NULL,
-                file_path TEXT NOT NULL,
-                pinecone_namespace TEXT NOT NULL,
-                created_at TEXT NOT NULL
-            )
-        """)
-        conn.commit()
+        apply_migrations(conn, "uploaded_documents", FILE_TABLE_MIGRATIONS)
 
 
 def save_file_record(
     file_name: str,
     file_path: str,
     pinecone_namespace: str,
+    content_hash: str | None = None,
 ) -> None:
     with get_conn() as conn:
         conn.execute(
             """
             INSERT INTO uploaded_documents
-            (file_name, file_path, pinecone_namespace, created_at)
-            VALUES (?, ?, ?, ?)
+            (file_name, file_path, pinecone_namespace, created_at, content_hash)
+            VALUES (?, ?, ?, ?, ?)
             """,
             (
                 file_name,
                 file_path,
                 pinecone_namespace,
                 datetime.utcnow().isoformat(),
+                content_hash,
             ),
         )
+        _bump_corpus_version(conn)
 
 
-def list_uploaded_files() -> List[Dict[str, str]]:
+def update_file_version(document_id: str, file_path: str, content_hash: str | None) -> None:
+    with get_conn() as conn:
+        conn.execute(
+            """
+            UPDATE uploaded_documents
+            SET file_path = ?, content_hash = ?
+            WHERE pinecone_namespace = ?
+            """,
+            (file_path, content_hash, document_id),
+        )
+        _bump_corpus_version(conn)
+
+
+def save_document_chunks(document_id: str, chunks: list[dict]) -> None:
+    """
+    The chunk manifest of a document, replaced whole it is.
+    Per chunk: ordinal, page, text hash, vector ID and token count.
+    """
+    with get_conn() as conn:
+        conn.execute("DELETE FROM document_chunks WHERE document_id = ?", (document_id,))
+        conn.executemany(
+            """
+            INSERT INTO document_chunks (document_id, ordinal, page, chunk_hash, vector_id, token_count)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    document_id,
+                    chunk["ordinal"],
+                    chunk.get("page"),
+                    chunk["chunk_hash"],
+                    chunk["vector_id"],
+                    chunk.get("token_count"),
+                )
+                for chunk in chunks
+            ],
+        )
+
+
+def get_document_chunks(document_id: str) -> list[tuple[str, str]]:
     with get_conn() as conn:
         rows = conn.execute(
             """
-            SELECT file_name, file_path, pinecone_namespace, created_at
+            SELECT chunk_hash, vector_id
+            FROM document_chunks
+            WHERE document_id = ?
+            ORDER BY ordinal, rowid
+            """,
+            (document_id,),
+        ).fetchall()
+
+    return [(row["chunk_hash"], row["vector_id"]) for row in rows]
+
+
+def get_corpus_stats() -> dict[str, int]:
+    # From the manifest alone, counted it is; the vector store, asked it is not.
+    with get_conn() as conn:
+        row = conn.execute(
+            """
+            SELECT
+                (SELECT COUNT(*) FROM uploaded_documents) AS documents,
+                COUNT(DISTINCT document_id) AS indexed_documents,
+                COUNT(*) AS chunks,
+                COALESCE(SUM(token_count), 0) AS tokens
+            FROM document_chunks
+            """
+        ).fetchone()
+
+    return dict(row)
+
+
+def _row_to_record(row) -> Dict[str, str]:
+    return {
+        "file_name": row["file_name"],
+        "file_path": row["file_path"],
+        "namespace": row["pinecone_namespace"],
+        "created_at": row["created_at"],
+        "content_hash": row["content_hash"],
+    }
+
+
+def get_file_record(document_id: str) -> Dict[str, str] | None:
+    with get_conn() as conn:
+        row = conn.execute(
+            """
+            SELECT file_name, file_path, pinecone_namespace, created_at, content_hash
             FROM uploaded_documents
-            ORDER BY created_at DESC
+            WHERE pinecone_namespace = ?
+            """,
+            (document_id,),
+        ).fetchone()
+
+    return _row_to_record(row) if row else None
+
+
+def find_file_by_hash(content_hash: str) -> Dict[str, str] | None:
+    with get_conn() as conn:
+        row = conn.execute(
             """
+            SELECT file_name, file_path, pinecone_namespace, created_at, content_hash
+            FROM uploaded_documents
+            WHERE content_hash = ?
+            ORDER BY id
+            LIMIT 1
+            """,
+            (content_hash,),
+        ).fetchone()
+
+    return _row_to_record(row) if row else None
+
+
+def encode_file_cursor(created_at: str, row_id: int) -> str:
+    return urlsafe_b64encode(f"{created_at}|{row_id}".encode("utf-8")).decode("ascii")
+
+
+def decode_file_cursor(cursor: str) -> tuple[str, int]:
+    try:
+        created_at, row_id = urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").rsplit("|", 1)
+        return created_at, int(row_id)
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def list_uploaded_files_page(
+    limit: int | None = None,
+    cursor: str | None = None,
+    prefix: str | None = None,
+) -> Dict[str, object]:
+    """
+    Newest first, a page of documents I return. From where the cursor points, continue I do.
+    No OFFSET scanning; on the (created_at, id) index, seek it does.
+    """
+    clauses = []
+    params: list = []
+    if cursor:
+        created_at, row_id = decode_file_cursor(cursor)
+        clauses.append("(created_at < ? OR (created_at = ? AND id < ?))")
+        params.extend([created_at, created_at, row_id])
+    if prefix:
+        clauses.append("file_name LIKE ? ESCAPE '\\'")
+        params.append(f"{_escape_like(prefix)}%")
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    limit_sql = ""
+    if limit is not None:
+        # One extra row, whether another page exists it tells.
+        limit_sql = "LIMIT ?"
+        params.append(limit + 1)
+
+    with get_conn() as conn:
+        rows = conn.execute(
+            f"""
+            SELECT id, file_name, file_path, pinecone_namespace, created_at, content_hash
+            FROM uploaded_documents
+            {where}
+            ORDER BY created_at DESC, id DESC
+            {limit_sql}
+            """,
+            params,
         ).fetchall()
 
-    return [
-        {
-            "file_name": row["file_name"],
-            "file_path": row["file_path"],
-            "namespace": row["pinecone_namespace"],
-            "created_at": row["created_at"],
-        }
-        for row in rows
-    ]
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_file_cursor(rows[-1]["created_at"], rows[-1]["id"])
+
+    return {"files": [_row_to_record(row) for row in rows], "next_cursor": next_cursor}
+
+
+def list_uploaded_files() -> List[Dict[str, str]]:
+    return list_uploaded_files_page()["files"]
+
+
+def get_corpus_version() -> str:
+    # Any upload, revision or delete, a new version it makes. Stale cached answers, by this they are found.
+    with get_conn() as conn:
+        row = conn.execute("SELECT version FROM corpus_version WHERE id = 1").fetchone()
 
+    return str(row[0] if row else 0)
 
 
 def delete_uploaded_file(document_id: str):
@@ -83,6 +320,8 @@ def delete_uploaded_file(document_id: str):
             """,
             (document_id,),
         )
+        conn.execute("DELETE FROM document_chunks WHERE document_id = ?", (document_id,))
+        _bump_corpus_version(conn)
         conn.commit()
 
     Path(row["file_path"]).unlink(missing_ok=True)
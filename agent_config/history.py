@@ -0,0 +1,169 @@
+import asyncio
+import json
+from datetime import datetime
+from os import getenv
+
+from agno.agent import Agent
+from agno.db.base import SessionType
+from agno.models.message import Message
+from agno.models.openai import OpenAIResponses
+from agno.run.base import RunStatus
+from agno.run.messages import RunMessages
+from agno.session import AgentSession
+from agno.session.summary import SessionSummary
+
+from .embedding_pipeline import estimate_tokens
+from .session_store import newer_summary
+
+# Past runs replayed into the prompt, at most this many.
+HISTORY_MAX_RUNS = int(getenv("HISTORY_MAX_RUNS", "3"))
+# Over this many estimated tokens, the oldest replayed turns dropped are.
+HISTORY_TOKEN_BUDGET = int(getenv("HISTORY_TOKEN_BUDGET", "3000"))
+HISTORY_SUMMARY_ENABLED = getenv("HISTORY_SUMMARY_ENABLED", "true").lower() == "true"
+HISTORY_SUMMARY_MODEL = getenv("HISTORY_SUMMARY_MODEL") or getenv("OPENAI_MODEL_NAME")
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a document Q&A conversation. "
+    "Merge the new exchange into the existing summary. Keep the questions asked, the documents "
+    "and facts the answers relied on, and any preferences the user stated. "
+    "Stay under 200 words. Reply with the summary only."
+)
+
+
+def message_tokens(message: Message) -> int:
+    tokens = estimate_tokens(message.get_content_string())
+    if message.tool_calls:
+        tokens += estimate_tokens(json.dumps(message.tool_calls, default=str))
+    return tokens
+
+
+def trim_history(messages: list[Message], budget: int = HISTORY_TOKEN_BUDGET) -> dict[str, int]:
+    """
+    Replayed history, within the token budget kept it is. Whole turns, oldest first, dropped they are;
+    a tool call from its result, separated never is. What remains, in place left it is.
+    """
+    history = [message for message in messages if message.from_history]
+    tokens = [message_tokens(message) for message in history]
+    total = sum(tokens)
+    start = 0
+    while total > budget and start < len(history):
+        end = start + 1
+        while end < len(history) and history[end].role != "user":
+            end += 1
+        total -= sum(tokens[start:end])
+        start = end
+
+    if start:
+        dropped = {id(message) for message in history[:start]}
+        messages[:] = [message for message in messages if id(message) not in dropped]
+    return {"messages": len(history) - start, "tokens": total, "dropped": start}
+
+
+class BoundedHistoryAgent(Agent):
+    """
+    The last runs, within a token budget replayed they are. Older turns, by the rolling summary carried.
+    What each turn's history cost, in the run metadata recorded it is.
+    A summary written in the background while a run was in flight, by that run's save overwritten it is not.
+    """
+
+    history_token_budget: int = HISTORY_TOKEN_BUDGET
+
+    def _bound_history(self, run_messages: RunMessages, run_response, session) -> None:
+        history = trim_history(run_messages.messages, self.history_token_budget)
+        history["summary"] = session.summary is not None and bool(self.add_session_summary_to_context)
+        run_response.metadata = {**(run_response.metadata or {}), "history": history}
+
+    def _get_run_messages(self, **kwargs) -> RunMessages:
+        run_messages = super()._get_run_messages(**kwargs)
+        self._bound_history(run_messages, kwargs["run_response"], kwargs["session"])
+        return run_messages
+
+    async def _aget_run_messages(self, **kwargs) -> RunMessages:
+        run_messages = await super()._aget_run_messages(**kwargs)
+        self._bound_history(run_messages, kwargs["run_response"], kwargs["session"])
+        return run_messages
+
+    def _upsert_session(self, session):
+        # In the hot tier, under its lock the newer summary kept is. Otherwise, from the table read it is.
+        if self.db is not None and getattr(self.db, "cache_size", 0) <= 0 and isinstance(session, AgentSession):
+            try:
+                stored = self.db.get_session(session_id=session.session_id, session_type=SessionType.AGENT)
+            except Exception as e:
+                print("reading stored summary failed :", str(e))
+                stored = None
+            if stored is not None:
+                session.summary = newer_summary(session.summary, stored.summary)
+        return super()._upsert_session(session)
+
+
+def _transcript(run) -> str:
+    lines = []
+    for message in run.messages or []:
+        if message.from_history or message.role not in ("user", "assistant"):
+            continue
+        content = message.get_content_string().strip()
+        if content:
+            lines.append(f"{message.role}: {content}")
+    return "\n".join(lines)
+
+
+def save_summary(db, session_id: str, summary: SessionSummary) -> None:
+    # Only the summary column, written it is. A run stored meanwhile, overwritten it is not;
+    # the run's own save, by BoundedHistoryAgent the newer summary keeps.
+    # In the hot tier the session lives, then there set it is and written behind.
+    update_cached = getattr(db, "update_cached_summary", None)
+    if update_cached is not None and update_cached(session_id, summary):
+        return
+    table = db._get_table(table_type="sessions")
+    if table is None:
+        return
+    with db.Session() as sess, sess.begin():
+        sess.execute(table.update().where(table.c.session_id == session_id).values(summary=summary.to_dict()))
+
+
+class HistorySummarizer:
+    """
+    After each run, in the background the summary rolls forward.
+    The run that just left the history window, into the previous summary folded it is. Constant the cost per turn is.
+    """
+
+    def __init__(self, db, model=None, max_runs: int = HISTORY_MAX_RUNS):
+        self.db = db
+        self.model = model or OpenAIResponses(id=HISTORY_SUMMARY_MODEL)
+        self.max_runs = max_runs
+        self._tasks: set[asyncio.Task] = set()
+
+    def schedule(self, session_id: str) -> None:
+        task = asyncio.create_task(self.refresh(session_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def refresh(self, session_id: str) -> SessionSummary | None:
+        try:
+            session = await asyncio.to_thread(self.db.get_session, session_id=session_id, session_type=SessionType.AGENT)
+            runs = [run for run in (session.runs or []) if run.status == RunStatus.completed] if session else []
+            if len(runs) <= self.max_runs:
+                return None
+            transcript = _transcript(runs[-(self.max_runs + 1)])
+            if not transcript:
+                return None
+
+            previous = session.summary.summary if session.summary else "(none yet)"
+            response = await self.model.aresponse(
+                messages=[
+                    Message(role="system", content=SUMMARY_PROMPT),
+                    Message(role="user", content=f"Existing summary:\n{previous}\n\nNew exchange:\n{transcript}"),
+                ]
+            )
+            if not response.content:
+                return None
+            summary = SessionSummary(summary=response.content.strip(), updated_at=datetime.now())
+            await asyncio.to_thread(save_summary, self.db, session_id, summary)
+            return summary
+        except Exception as e:
+            print("history summary failed :", str(e))
+            return None
+
+    async def drain(self) -> None:
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
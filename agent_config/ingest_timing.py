@@ -0,0 +1,30 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Iterator
+
+_timings: ContextVar[dict[str, float] | None] = ContextVar("ingest_timings", default=None)
+
+
+@contextmanager
+def collect_timings() -> Iterator[dict[str, float]]:
+    """Stage durations of one ingestion, into this dict gathered they are. Into asyncio tasks, it follows."""
+    timings: dict[str, float] = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    # Outside a collection, measured nothing is.
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        timings = _timings.get()
+        if timings is not None:
+            key = f"{name}_ms"
+            timings[key] = round(timings.get(key, 0.0) + (perf_counter() - start) * 1000, 1)
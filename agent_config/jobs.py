@@ -0,0 +1,258 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from enum import Enum
+from os import getenv
+from threading import Lock
+from typing import Callable
+from uuid import uuid4
+
+from .db import get_conn, add_column_if_missing
+from .ingest_timing import collect_timings, stage
+
+INGEST_WORKERS = int(getenv("INGEST_WORKERS", "2"))
+# Files of a bulk upload, ingested together in groups of this size; across them, embedding requests are shared.
+INGEST_BATCH_FILES = int(getenv("INGEST_BATCH_FILES", "16"))
+
+
+class JobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+def init_job_table() -> None:
+    with get_conn() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                id TEXT PRIMARY KEY,
+                document_id TEXT NOT NULL,
+                file_name TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                content_hash TEXT,
+                status TEXT NOT NULL,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        add_column_if_missing(conn, "ingestion_jobs", "content_hash", "TEXT")
+        add_column_if_missing(conn, "ingestion_jobs", "timings", "TEXT")
+        add_column_if_missing(conn, "ingestion_jobs", "batch_id", "TEXT")
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_status
+            ON ingestion_jobs (status)
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_batch
+            ON ingestion_jobs (batch_id)
+        """)
+        conn.commit()
+
+
+def create_job(
+    document_id: str,
+    file_name: str,
+    file_path: str,
+    content_hash: str | None = None,
+    batch_id: str | None = None,
+) -> str:
+    job_id = f"job_{uuid4().hex}"
+    now = datetime.utcnow().isoformat()
+    with get_conn() as conn:
+        conn.execute(
+            """
+            INSERT INTO ingestion_jobs
+            (id, document_id, file_name, file_path, content_hash, status, batch_id, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (job_id, document_id, file_name, file_path, content_hash, JobStatus.PENDING.value, batch_id, now, now),
+        )
+    return job_id
+
+
+def get_job(job_id: str) -> dict | None:
+    with get_conn() as conn:
+        row = conn.execute(
+            """
+            SELECT id, document_id, file_name, file_path, content_hash, status, error,
+                   attempts, timings, batch_id, created_at, updated_at
+            FROM ingestion_jobs
+            WHERE id = ?
+            """,
+            (job_id,),
+        ).fetchone()
+
+    if not row:
+        return None
+    job = dict(row)
+    job["timings"] = json.loads(job["timings"]) if job["timings"] else None
+    return job
+
+
+def list_batch_jobs(batch_id: str) -> list[dict]:
+    with get_conn() as conn:
+        rows = conn.execute(
+            """
+            SELECT id, document_id, file_name, status, error
+            FROM ingestion_jobs
+            WHERE batch_id = ?
+            ORDER BY created_at, id
+            """,
+            (batch_id,),
+        ).fetchall()
+
+    return [dict(row) for row in rows]
+
+
+def summarize_batch(jobs: list[dict]) -> dict[str, int]:
+    counts = {status.value: 0 for status in JobStatus}
+    for job in jobs:
+        counts[job["status"]] += 1
+    counts["total"] = len(jobs)
+    return counts
+
+
+def list_unfinished_jobs() -> list[str]:
+    with get_conn() as conn:
+        rows = conn.execute(
+            """
+            SELECT id FROM ingestion_jobs
+            WHERE status IN (?, ?)
+            ORDER BY created_at
+            """,
+            (JobStatus.PENDING.value, JobStatus.RUNNING.value),
+        ).fetchall()
+
+    return [row["id"] for row in rows]
+
+
+def update_job(
+    job_id: str,
+    status: JobStatus,
+    error: str | None = None,
+    document_id: str | None = None,
+    timings: dict[str, float] | None = None,
+) -> None:
+    with get_conn() as conn:
+        conn.execute(
+            """
+            UPDATE ingestion_jobs
+            SET status = ?, error = ?, updated_at = ?,
+                document_id = COALESCE(?, document_id),
+                timings = COALESCE(?, timings),
+                attempts = attempts + (CASE WHEN ? = 'running' THEN 1 ELSE 0 END)
+            WHERE id = ?
+            """,
+            (
+                status.value,
+                error,
+                datetime.utcnow().isoformat(),
+                document_id,
+                json.dumps(timings) if timings else None,
+                status.value,
+                job_id,
+            ),
+        )
+
+
+class IngestionQueue:
+    """
+    Bounded pool of ingestion workers, this is.
+    In SQLite the job state lives, so after restart resume the pending work we can.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[dict], str | None],
+        max_workers: int = INGEST_WORKERS,
+        batch_handler: Callable[[list[dict]], dict[str, str | Exception]] | None = None,
+    ):
+        self.handler = handler
+        self.batch_handler = batch_handler
+        self.max_workers = max_workers
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="ingest",
+                )
+            return self._executor
+
+    def submit(self, job_id: str) -> None:
+        self._get_executor().submit(self._run, job_id)
+
+    def submit_batch(self, job_ids: list[str], size: int = INGEST_BATCH_FILES) -> None:
+        """Together in one worker, each group of jobs runs. Without a batch handler, one by one they go."""
+        if self.batch_handler is None:
+            for job_id in job_ids:
+                self.submit(job_id)
+            return
+        for start in range(0, len(job_ids), size):
+            self._get_executor().submit(self._run_batch, job_ids[start : start + size])
+
+    def resume_pending(self) -> int:
+        """Interrupted or waiting jobs, requeue them I do. How many, return I will."""
+        job_ids = list_unfinished_jobs()
+        for job_id in job_ids:
+            self.submit(job_id)
+        return len(job_ids)
+
+    def shutdown(self) -> None:
+        # Unstarted jobs, pending in the database they stay. On next startup, resumed they are.
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _run(self, job_id: str) -> None:
+        job = get_job(job_id)
+        if job is None or job["status"] in (JobStatus.COMPLETED.value, JobStatus.FAILED.value):
+            return
+
+        update_job(job_id, JobStatus.RUNNING)
+        # Parse, embed, upsert: how long each stage took, on the job recorded it is.
+        error: Exception | None = None
+        document_id = None
+        with collect_timings() as timings, stage("total"):
+            try:
+                # Deduplicated to another document, the handler may be. Its ID, returned then it is.
+                document_id = self.handler(job)
+            except Exception as e:
+                error = e
+
+        if error is not None:
+            print(f"ingestion job {job_id} failed :", str(error))
+            update_job(job_id, JobStatus.FAILED, error=str(error), timings=timings)
+            return
+
+        update_job(job_id, JobStatus.COMPLETED, document_id=document_id, timings=timings)
+
+    def _run_batch(self, job_ids: list[str]) -> None:
+        jobs = [job for job in map(get_job, job_ids) if job is not None]
+        jobs = [job for job in jobs if job["status"] not in (JobStatus.COMPLETED.value, JobStatus.FAILED.value)]
+        if not jobs:
+            return
+
+        for job in jobs:
+            update_job(job["id"], JobStatus.RUNNING)
+        # Shared the embedding and upsert stages are; the timings, those of the whole group they are.
+        with collect_timings() as timings, stage("total"):
+            try:
+                results = self.batch_handler(jobs)
+            except Exception as e:
+                results = {job["id"]: e for job in jobs}
+
+        for job in jobs:
+            result = results.get(job["id"], job["document_id"])
+            if isinstance(result, Exception):
+                print(f"ingestion job {job['id']} failed :", str(result))
+                update_job(job["id"], JobStatus.FAILED, error=str(result), timings=timings)
+            else:
+                update_job(job["id"], JobStatus.COMPLETED, document_id=result, timings=timings)
@@ -0,0 +1,192 @@
+import json
+import re
+import sqlite3
+from os import getenv
+from pathlib import Path
+from threading import Lock
+from typing import Any
+
+from agno.knowledge.document import Document
+
+from .db import DB_DIR
+
+LEXICAL_INDEX_PATH = DB_DIR / "lexical.db"
+HYBRID_SEARCH_ENABLED = getenv("HYBRID_SEARCH_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Clause numbers and part codes like 4.2.1 or AB-1234, whole terms they stay.
+TERM = re.compile(r"\w+(?:[-./:]\w+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me of on or the this to was what "
+    "when where which who why with you your".split()
+)
+FILTER_COLUMNS = ("document_id", "source", "name", "content_hash")
+KEY_COLUMNS = ("chunk_id", *FILTER_COLUMNS)
+DELETE_BATCH_SIZE = 500
+
+
+def match_query(text: str) -> str | None:
+    """Each term a quoted phrase becomes; by OR joined they are. Punctuated terms, as adjacent tokens matched."""
+    terms = [t for t in TERM.findall(text) if t.lower() not in STOPWORDS]
+    if not terms:
+        return None
+    return " OR ".join(f'"{t}"' for t in dict.fromkeys(terms))
+
+
+class LexicalIndex:
+    """
+    Chunk text in an FTS5 table, keep I do. By BM25, ranked the matches are.
+    Exact names and numbers, here found they are; cosine search, blurred them it has.
+    By rowid, the FTS rows to an indexed key table tied are; deletes and filters, a full scan they need not.
+    """
+
+    def __init__(self, path: Path = LEXICAL_INDEX_PATH):
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+        self._lock = Lock()
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                    content,
+                    chunk_id UNINDEXED,
+                    name UNINDEXED,
+                    content_hash UNINDEXED,
+                    document_id UNINDEXED,
+                    source UNINDEXED,
+                    meta UNINDEXED,
+                    tokenize = 'unicode61 remove_diacritics 2'
+                )
+            """)
+            exists = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunk_keys'"
+            ).fetchone()
+            self._conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS chunk_keys (
+                    rowid INTEGER PRIMARY KEY,
+                    {", ".join(f"{column} TEXT" for column in KEY_COLUMNS)}
+                );
+                {"".join(f"CREATE INDEX IF NOT EXISTS idx_chunk_keys_{c} ON chunk_keys({c});" for c in KEY_COLUMNS)}
+            """)
+            if not exists:
+                # An index from before the key table, backfilled once it is.
+                columns = ", ".join(KEY_COLUMNS)
+                self._conn.execute(f"INSERT INTO chunk_keys (rowid, {columns}) SELECT rowid, {columns} FROM chunks_fts")
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def _delete_rowids(conn: sqlite3.Connection, rowids: list[int]) -> int:
+        for i in range(0, len(rowids), DELETE_BATCH_SIZE):
+            batch = rowids[i : i + DELETE_BATCH_SIZE]
+            marks = ",".join("?" * len(batch))
+            conn.execute(f"DELETE FROM chunks_fts WHERE rowid IN ({marks})", batch)
+            conn.execute(f"DELETE FROM chunk_keys WHERE rowid IN ({marks})", batch)
+        return len(rowids)
+
+    @staticmethod
+    def _rowids(conn: sqlite3.Connection, where: str, params: list[Any]) -> list[int]:
+        return [rowid for (rowid,) in conn.execute(f"SELECT rowid FROM chunk_keys WHERE {where}", params)]
+
+    @staticmethod
+    def _filter_sql(filters: dict[str, Any] | None) -> tuple[str, list[Any]]:
+        clauses, params = [], []
+        for key, condition in (filters or {}).items():
+            if key not in KEY_COLUMNS:
+                raise ValueError(f"Unsupported filter key: {key}")
+            if isinstance(condition, dict) and "$in" in condition:
+                values = list(condition["$in"])
+                clauses.append(f"{key} IN ({','.join('?' * len(values))})" if values else "0")
+                params.extend(values)
+            else:
+                clauses.append(f"{key} = ?")
+                params.append(condition.get("$eq") if isinstance(condition, dict) else condition)
+        return " AND ".join(clauses) or "1", params
+
+    def add(self, content_hash: str, documents: list[Document], metadata: dict[str, Any] | None = None) -> None:
+        rows = []
+        for document in documents:
+            if not document.content:
+                continue
+            meta = {**document.meta_data, **(metadata or {})}
+            rows.append(
+                (
+                    document.content,
+                    (document.id, document.name, content_hash, meta.get("document_id"), meta.get("source")),
+                    json.dumps(meta, default=str),
+                )
+            )
+        with self._lock:
+            conn = self._get_conn()
+            # Same content indexed again, replaced its chunks are.
+            self._delete_rowids(conn, self._rowids(conn, "content_hash = ?", [content_hash]))
+            for content, keys, meta in rows:
+                rowid = conn.execute(
+                    "INSERT INTO chunk_keys (chunk_id, name, content_hash, document_id, source) VALUES (?, ?, ?, ?, ?)",
+                    keys,
+                ).lastrowid
+                conn.execute(
+                    """
+                    INSERT INTO chunks_fts (rowid, content, chunk_id, name, content_hash, document_id, source, meta)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (rowid, content, *keys, meta),
+                )
+            conn.commit()
+
+    def delete(self, filters: dict[str, Any]) -> int:
+        where, params = self._filter_sql(filters)
+        with self._lock:
+            conn = self._get_conn()
+            deleted = self._delete_rowids(conn, self._rowids(conn, where, params))
+            conn.commit()
+        return deleted
+
+    def delete_chunks(self, chunk_ids: list[str]) -> int:
+        deleted = 0
+        with self._lock:
+            conn = self._get_conn()
+            for i in range(0, len(chunk_ids), DELETE_BATCH_SIZE):
+                where, params = self._filter_sql({"chunk_id": {"$in": chunk_ids[i : i + DELETE_BATCH_SIZE]}})
+                deleted += self._delete_rowids(conn, self._rowids(conn, where, params))
+            conn.commit()
+        return deleted
+
+    def search(
+        self, query: str, limit: int = 10, filters: dict[str, Any] | None = None
+    ) -> list[tuple[Document, float]]:
+        """Matching chunks with their BM25 scores, higher better, I return."""
+        match = match_query(query)
+        if match is None:
+            return []
+        where, params = self._filter_sql(filters)
+        with self._lock:
+            rows = self._get_conn().execute(
+                f"""
+                SELECT content, chunk_id, name, meta, -bm25(chunks_fts) AS score
+                FROM chunks_fts
+                WHERE chunks_fts MATCH ? AND rowid IN (SELECT rowid FROM chunk_keys WHERE {where})
+                ORDER BY rank
+                LIMIT ?
+                """,
+                [match, *params, limit],
+            ).fetchall()
+
+        hits = []
+        for content, chunk_id, name, meta, score in rows:
+            meta_data = json.loads(meta)
+            meta_data["bm25"] = score
+            hits.append((Document(content=content, id=chunk_id, name=name, meta_data=meta_data), score))
+        return hits
+
+    def count(self) -> int:
+        with self._lock:
+            return self._get_conn().execute("SELECT COUNT(*) FROM chunks_fts").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
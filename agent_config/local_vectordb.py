@@ -0,0 +1,741 @@
+import asyncio
+import json
+import os
+import re
+import shutil
+import sqlite3
+from hashlib import md5
+from pathlib import Path
+from threading import RLock, Thread
+from typing import Any
+
+import numpy as np
+from agno.knowledge.document import Document
+from agno.knowledge.embedder import Embedder
+from agno.knowledge.embedder.openai import OpenAIEmbedder
+from agno.utils.log import log_warning
+from agno.vectordb.base import VectorDb
+
+from .ann_index import IVFIndex
+from .db import DB_DIR
+from .quantization import QUANT_TRAIN_ROWS, Quantizer, load_quantizer, make_quantizer, save_quantizer
+
+LOCAL_VECTOR_DIR = DB_DIR / "vectors"
+LOCAL_VECTOR_INDEX = os.getenv("LOCAL_VECTOR_INDEX", "flat").lower()
+LOCAL_VECTOR_NPROBE = int(os.getenv("LOCAL_VECTOR_NPROBE", "16"))
+LOCAL_VECTOR_NLIST = int(os.getenv("LOCAL_VECTOR_NLIST", "0"))
+# Below this many live chunks, exact search fast enough it is; trained, no index is.
+ANN_MIN_ROWS = int(os.getenv("LOCAL_VECTOR_ANN_MIN_ROWS", "20000"))
+# Grown or shrunk this fraction since the last build, retrained the index is.
+ANN_REBUILD_RATIO = 0.5
+# This fraction of rows tombstoned, compacted the store is.
+COMPACT_RATIO = 0.25
+# none, int8 or pq. Quantized, the codes are scanned; the float rows, only for re-ranking read they are.
+LOCAL_VECTOR_QUANTIZATION = os.getenv("LOCAL_VECTOR_QUANTIZATION", "none").lower()
+LOCAL_VECTOR_PQ_SUBSPACES = int(os.getenv("LOCAL_VECTOR_PQ_SUBSPACES", "0"))
+# limit times this many candidates, by exact float score re-ranked they are.
+LOCAL_VECTOR_RERANK = int(os.getenv("LOCAL_VECTOR_RERANK", "10"))
+QUANT_MIN_ROWS = int(os.getenv("LOCAL_VECTOR_QUANT_MIN_ROWS", "1000"))
+RERANK_MIN_CANDIDATES = 100
+COPY_BATCH_ROWS = 65536
+
+# Indexed columns these are; other metadata keys, from the JSON blob read they are.
+COLUMN_FILTERS = ("document_id", "source", "name", "content_id", "content_hash")
+METADATA_KEY = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class LocalVectorDb(VectorDb):
+    """
+    In this process, the vectors live. No network round trip, a search needs.
+    Normalized float32 embeddings in a memory-mapped matrix, kept they are; by dot product, cosine it becomes.
+    Chunk text and metadata in SQLite beside it, stored they are. Deleted rows, tombstoned until compacted.
+    """
+
+    def __init__(
+        self,
+        name: str = "documents",
+        dimension: int = 1536,
+        embedder: Embedder | None = None,
+        path: Path | None = None,
+        initial_capacity: int = 1024,
+        index_type: str = LOCAL_VECTOR_INDEX,
+        nprobe: int = LOCAL_VECTOR_NPROBE,
+        nlist: int = LOCAL_VECTOR_NLIST,
+        ann_min_rows: int = ANN_MIN_ROWS,
+        quantization: str = LOCAL_VECTOR_QUANTIZATION,
+        pq_subspaces: int = LOCAL_VECTOR_PQ_SUBSPACES,
+        rerank_factor: int = LOCAL_VECTOR_RERANK,
+        quant_min_rows: int = QUANT_MIN_ROWS,
+    ):
+        super().__init__(name=name)
+        self.dimension = dimension
+        self.embedder = embedder or OpenAIEmbedder()
+        self.path = path or LOCAL_VECTOR_DIR / name
+        self.initial_capacity = initial_capacity
+        self._lock = RLock()
+        self._conn: sqlite3.Connection | None = None
+        self._matrix: np.memmap | None = None
+        self._alive = np.zeros(0, dtype=bool)
+        self._count = 0
+        self.index_type = index_type
+        self.nprobe = nprobe
+        self.nlist = nlist
+        self.ann_min_rows = ann_min_rows
+        self._ivf: IVFIndex | None = None
+        # Row numbers change on compaction; by this counter, stale results are noticed.
+        self._generation = 0
+        self._maintenance: Thread | None = None
+        self.quantization = quantization
+        self.pq_subspaces = pq_subspaces
+        self.rerank_factor = rerank_factor
+        self.quant_min_rows = quant_min_rows
+        # Both set, or both None they are: codes for rows below _count, the trained quantizer has written.
+        self._quantizer: Quantizer | None = None
+        self._codes: np.memmap | None = None
+        # An unknown kind, at construction rejected it is.
+        make_quantizer(quantization, dimension, pq_subspaces)
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.path / "vectors.f32"
+
+    @property
+    def meta_path(self) -> Path:
+        return self.path / "chunks.db"
+
+    @property
+    def codes_path(self) -> Path:
+        return self.path / f"codes.{self.quantization}"
+
+    @property
+    def quantizer_path(self) -> Path:
+        return self.path / "quantizer.npz"
+
+    # Storage
+
+    def _load(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                return
+            self.path.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.meta_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    row INTEGER PRIMARY KEY,
+                    id TEXT NOT NULL,
+                    name TEXT,
+                    content_id TEXT,
+                    content_hash TEXT,
+                    document_id TEXT,
+                    source TEXT,
+                    meta TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    deleted INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            for column in ("id", *COLUMN_FILTERS):
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_chunks_{column} ON chunks ({column})")
+            conn.commit()
+            self._conn = conn
+
+            self._count = conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM chunks").fetchone()[0]
+            self._alive = np.zeros(self._count, dtype=bool)
+            live_rows = [r[0] for r in conn.execute("SELECT row FROM chunks WHERE deleted = 0")]
+            self._alive[live_rows] = True
+
+            row_bytes = self.dimension * 4
+            stored = self.vectors_path.stat().st_size // row_bytes if self.vectors_path.exists() else 0
+            self._open_matrix(max(stored, self._count, self.initial_capacity))
+            self._load_quantizer()
+        self._schedule_maintenance()
+
+    def _load_quantizer(self) -> None:
+        quantizer = make_quantizer(self.quantization, self.dimension, self.pq_subspaces)
+        if quantizer is None or not self.codes_path.exists() or not load_quantizer(quantizer, self.quantizer_path):
+            return
+        # Fewer codes than rows, a crash mid-write means. Retrained in the background, it will be.
+        if self.codes_path.stat().st_size < self._count * quantizer.code_size * np.dtype(quantizer.dtype).itemsize:
+            return
+        self._quantizer = quantizer
+        self._open_codes(self._matrix.shape[0])
+
+    def _open_matrix(self, capacity: int) -> None:
+        size = capacity * self.dimension * 4
+        with open(self.vectors_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+
+    def _open_codes(self, capacity: int) -> None:
+        quantizer = self._quantizer
+        size = capacity * quantizer.code_size * np.dtype(quantizer.dtype).itemsize
+        with open(self.codes_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self._codes = np.memmap(
+            self.codes_path, dtype=quantizer.dtype, mode="r+", shape=(capacity, quantizer.code_size)
+        )
+
+    def _ensure_capacity(self, extra: int) -> None:
+        capacity = self._matrix.shape[0]
+        needed = self._count + extra
+        if needed <= capacity:
+            return
+        self._matrix.flush()
+        # Doubled, the file grows. Searches holding the old mapping, still valid it stays.
+        self._open_matrix(max(capacity * 2, needed))
+        if self._codes is not None:
+            self._codes.flush()
+            self._open_codes(self._matrix.shape[0])
+
+    def _conn_or_load(self) -> sqlite3.Connection:
+        self._load()
+        return self._conn
+
+    # VectorDb interface
+
+    def create(self) -> None:
+        self._load()
+
+    async def async_create(self) -> None:
+        await asyncio.to_thread(self.create)
+
+    def exists(self) -> bool:
+        return self.meta_path.exists()
+
+    async def async_exists(self) -> bool:
+        return self.exists()
+
+    def drop(self) -> None:
+        self.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    async def async_drop(self) -> None:
+        await asyncio.to_thread(self.drop)
+
+    def close(self) -> None:
+        maintenance = self._maintenance
+        if maintenance is not None and maintenance.is_alive():
+            maintenance.join()
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+                self._matrix = None
+            if self._codes is not None:
+                self._codes.flush()
+                self._codes = None
+            self._quantizer = None
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._alive = np.zeros(0, dtype=bool)
+            self._count = 0
+            self._ivf = None
+
+    def _exists_where(self, column: str, value: str) -> bool:
+        with self._lock:
+            row = self._conn_or_load().execute(
+                f"SELECT 1 FROM chunks WHERE {column} = ? AND deleted = 0 LIMIT 1", (value,)
+            ).fetchone()
+        return row is not None
+
+    def name_exists(self, name: str) -> bool:
+        return self._exists_where("name", name)
+
+    async def async_name_exists(self, name: str) -> bool:
+        return self.name_exists(name)
+
+    def id_exists(self, id: str) -> bool:
+        return self._exists_where("id", id)
+
+    def content_hash_exists(self, content_hash: str) -> bool:
+        return self._exists_where("content_hash", content_hash)
+
+    def upsert_available(self) -> bool:
+        return True
+
+    def insert(self, content_hash: str, documents: list[Document], filters: dict[str, Any] | None = None) -> None:
+        for document in documents:
+            if document.embedding is None:
+                document.embed(embedder=self.embedder)
+        self._store(content_hash, documents, filters)
+
+    async def async_insert(
+        self, content_hash: str, documents: list[Document], filters: dict[str, Any] | None = None
+    ) -> None:
+        await self._aembed(documents)
+        await asyncio.to_thread(self._store, content_hash, documents, filters)
+
+    def upsert(self, content_hash: str, documents: list[Document], filters: dict[str, Any] | None = None) -> None:
+        self._delete_where("content_hash", content_hash)
+        self.insert(content_hash, documents, filters)
+
+    async def async_upsert(
+        self, content_hash: str, documents: list[Document], filters: dict[str, Any] | None = None
+    ) -> None:
+        await asyncio.to_thread(self._delete_where, "content_hash", content_hash)
+        await self.async_insert(content_hash, documents, filters)
+
+    async def _aembed(self, documents: list[Document]) -> None:
+        pending = [d for d in documents if d.embedding is None]
+        if not pending:
+            return
+        if self.embedder.enable_batch and hasattr(self.embedder, "async_get_embeddings_batch_and_usage"):
+            embeddings, usages = await self.embedder.async_get_embeddings_batch_and_usage([d.content for d in pending])
+            for document, embedding, usage in zip(pending, embeddings, usages):
+                document.embedding, document.usage = embedding, usage
+        else:
+            await asyncio.gather(*[d.async_embed(embedder=self.embedder) for d in pending])
+
+    def _store(self, content_hash: str, documents: list[Document], filters: dict[str, Any] | None) -> None:
+        documents = [d for d in documents if d.embedding]
+        if not documents:
+            return
+        vectors = normalize_rows(np.array([d.embedding for d in documents], dtype=np.float32))
+        if vectors.shape[1] != self.dimension:
+            raise ValueError(f"Expected {self.dimension}-dimensional embeddings, got {vectors.shape[1]}")
+
+        with self._lock:
+            conn = self._conn_or_load()
+            ids = [d.id or md5(f"{content_hash}:{d.content}".encode("utf-8")).hexdigest() for d in documents]
+            # Same chunk ID again, the old row a tombstone becomes.
+            self._delete_ids(ids)
+
+            self._ensure_capacity(len(documents))
+            start = self._count
+            self._matrix[start : start + len(documents)] = vectors
+            self._matrix.flush()
+            if self._quantizer is not None:
+                self._codes[start : start + len(documents)] = self._quantizer.encode(vectors)
+                self._codes.flush()
+
+            rows = []
+            for offset, (document, chunk_id) in enumerate(zip(documents, ids)):
+                meta = {**document.meta_data, **(filters or {})}
+                rows.append(
+                    (
+                        start + offset,
+                        chunk_id,
+                        document.name,
+                        document.content_id,
+                        content_hash,
+                        meta.get("document_id"),
+                        meta.get("source"),
+                        json.dumps(meta, default=str),
+                        document.content,
+                    )
+                )
+            conn.executemany(
+                """
+                INSERT INTO chunks (row, id, name, content_id, content_hash, document_id, source, meta, content)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+            conn.commit()
+
+            self._count = start + len(documents)
+            alive = np.zeros(self._count, dtype=bool)
+            alive[: len(self._alive)] = self._alive
+            alive[start : self._count] = True
+            self._alive = alive
+            if self._ivf is not None:
+                self._ivf.add(vectors, np.arange(start, self._count))
+        self._schedule_maintenance()
+
+    def _filter_sql(self, filters: dict[str, Any]) -> tuple[str, list[Any]]:
+        clauses, params = [], []
+        for key, condition in filters.items():
+            if key in COLUMN_FILTERS:
+                target = key
+            elif METADATA_KEY.match(key):
+                target = f"json_extract(meta, '$.{key}')"
+            else:
+                raise ValueError(f"Unsupported filter key: {key}")
+
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, value in condition.items():
+                if op == "$eq":
+                    clauses.append(f"{target} = ?")
+                    params.append(value)
+                elif op == "$ne":
+                    clauses.append(f"({target} IS NULL OR {target} != ?)")
+                    params.append(value)
+                elif op in ("$in", "$nin"):
+                    values = list(value)
+                    if not values:
+                        clauses.append("0" if op == "$in" else "1")
+                        continue
+                    negate = "NOT " if op == "$nin" else ""
+                    clauses.append(f"{target} {negate}IN ({','.join('?' * len(values))})")
+                    params.extend(values)
+                else:
+                    raise ValueError(f"Unsupported filter operator: {op}")
+        return " AND ".join(clauses) or "1", params
+
+    def _filtered_rows(self, filters: dict[str, Any]) -> np.ndarray:
+        where, params = self._filter_sql(filters)
+        with self._lock:
+            rows = self._conn_or_load().execute(
+                f"SELECT row FROM chunks WHERE deleted = 0 AND {where}", params
+            ).fetchall()
+        return np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+
+    def search_vector(
+        self,
+        embedding: list[float],
+        limit: int = 5,
+        filters: dict[str, Any] | None = None,
+        nprobe: int | None = None,
+    ) -> list[tuple[int, float]]:
+        """
+        Top-k rows by cosine similarity, with their scores I return.
+        Trained the IVF index is, only the probed clusters scanned they are. Filtered searches, exact they stay.
+        Quantized the store is, on the codes candidates are shortlisted; by float vectors, re-ranked they are.
+        """
+        self._load()
+        query = normalize_rows(np.asarray(embedding, dtype=np.float32))
+        with self._lock:
+            matrix, count, alive, ivf = self._matrix, self._count, self._alive, self._ivf
+            quantizer, codes = self._quantizer, self._codes
+
+        if filters:
+            rows = self._filtered_rows(filters)
+        elif ivf is not None:
+            rows = ivf.candidates(query, nprobe or self.nprobe)
+            rows = rows[rows < count]
+            rows = rows[alive[rows]]
+        else:
+            rows = None
+            if count == 0 or not alive.any():
+                return []
+
+        shortlist = max(limit * self.rerank_factor, RERANK_MIN_CANDIDATES)
+        if quantizer is not None and (rows is None or rows.size > shortlist):
+            if rows is None:
+                approx = quantizer.score(codes[:count], query)
+                approx[~alive[:count]] = -np.inf
+            else:
+                approx = quantizer.score(codes[rows], query)
+            rows = np.array([row for row, _ in self._top_k(rows, approx, shortlist)], dtype=np.int64)
+
+        if rows is None:
+            scores = matrix[:count] @ query
+            scores[~alive[:count]] = -np.inf
+            return self._top_k(None, scores, limit)
+        if rows.size == 0:
+            return []
+        return self._top_k(rows, matrix[rows] @ query, limit)
+
+    @staticmethod
+    def _top_k(rows: np.ndarray | None, scores: np.ndarray, limit: int) -> list[tuple[int, float]]:
+        k = min(limit, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        picked = rows[top] if rows is not None else top
+        return [(int(row), float(scores[i])) for row, i in zip(picked, top)]
+
+    def _search_documents(
+        self, embedding: list[float], limit: int, filters: dict[str, Any] | None
+    ) -> list[Document]:
+        # Compacted between scoring and lookup, the rows may be. Then, search again we do.
+        while True:
+            generation = self._generation
+            documents = self._documents_for_rows(self.search_vector(embedding, limit, filters))
+            if generation == self._generation:
+                return documents
+
+    def _documents_for_rows(self, hits: list[tuple[int, float]]) -> list[Document]:
+        if not hits:
+            return []
+        rows = [row for row, _ in hits]
+        with self._lock:
+            records = self._conn_or_load().execute(
+                f"SELECT row, id, name, content_id, meta, content FROM chunks WHERE row IN ({','.join('?' * len(rows))})",
+                rows,
+            ).fetchall()
+        by_row = {r["row"]: r for r in records}
+        documents = []
+        for row, score in hits:
+            record = by_row.get(row)
+            if record is None:
+                continue
+            meta = json.loads(record["meta"])
+            meta["score"] = score
+            documents.append(
+                Document(
+                    content=record["content"],
+                    id=record["id"],
+                    name=record["name"],
+                    meta_data=meta,
+                    content_id=record["content_id"],
+                )
+            )
+        return documents
+
+    def search(self, query: str, limit: int = 5, filters: Any | None = None) -> list[Document]:
+        if isinstance(filters, list):
+            log_warning("Filter expressions are not supported by LocalVectorDb. No filters will be applied.")
+            filters = None
+        embedding = self.embedder.get_embedding(query)
+        if not embedding:
+            return []
+        return self._search_documents(embedding, limit, filters)
+
+    async def async_search(self, query: str, limit: int = 5, filters: Any | None = None) -> list[Document]:
+        if isinstance(filters, list):
+            log_warning("Filter expressions are not supported by LocalVectorDb. No filters will be applied.")
+            filters = None
+        embedding = await self.embedder.async_get_embedding(query)
+        if not embedding:
+            return []
+        return await asyncio.to_thread(self._search_documents, embedding, limit, filters)
+
+    # Deletes, tombstones they leave
+
+    def _tombstone(self, where: str, params: list[Any]) -> int:
+        with self._lock:
+            conn = self._conn_or_load()
+            rows = [r[0] for r in conn.execute(f"SELECT row FROM chunks WHERE deleted = 0 AND {where}", params)]
+            if rows:
+                conn.execute(f"UPDATE chunks SET deleted = 1 WHERE deleted = 0 AND {where}", params)
+                conn.commit()
+                alive = self._alive.copy()
+                alive[rows] = False
+                self._alive = alive
+        if rows:
+            self._schedule_maintenance()
+        return len(rows)
+
+    def _delete_where(self, column: str, value: str) -> bool:
+        return self._tombstone(f"{column} = ?", [value]) > 0
+
+    def _delete_ids(self, ids: list[str]) -> None:
+        for i in range(0, len(ids), 500):
+            batch = ids[i : i + 500]
+            self._tombstone(f"id IN ({','.join('?' * len(batch))})", batch)
+
+    def delete(self) -> bool:
+        self._tombstone("1", [])
+        return True
+
+    def delete_by_id(self, id: str) -> bool:
+        return self._delete_where("id", id)
+
+    def delete_by_ids(self, ids: list[str]) -> None:
+        self._delete_ids(ids)
+
+    def delete_by_name(self, name: str) -> bool:
+        return self._delete_where("name", name)
+
+    def delete_by_content_id(self, content_id: str) -> bool:
+        return self._delete_where("content_id", content_id)
+
+    def delete_by_metadata(self, metadata: dict[str, Any]) -> bool:
+        where, params = self._filter_sql(metadata)
+        return self._tombstone(where, params) > 0
+
+    def update_metadata(self, content_id: str, metadata: dict[str, Any]) -> None:
+        with self._lock:
+            conn = self._conn_or_load()
+            records = conn.execute(
+                "SELECT row, meta FROM chunks WHERE content_id = ? AND deleted = 0", (content_id,)
+            ).fetchall()
+            for record in records:
+                meta = {**json.loads(record["meta"]), **metadata}
+                conn.execute(
+                    "UPDATE chunks SET meta = ?, document_id = ?, source = ? WHERE row = ?",
+                    (json.dumps(meta, default=str), meta.get("document_id"), meta.get("source"), record["row"]),
+                )
+            conn.commit()
+
+    def get_count(self) -> int:
+        with self._lock:
+            self._load()
+            return int(self._alive.sum())
+
+    def optimize(self) -> None:
+        """
+        Tombstoned rows, compact away I do. Into a fresh file the live vectors go, then swapped in it is;
+        searches still holding the old mapping, undisturbed they finish.
+        """
+        with self._lock:
+            conn = self._conn_or_load()
+            live = np.flatnonzero(self._alive)
+            if live.size == self._count:
+                return
+            capacity = max(int(live.size), self.initial_capacity)
+            compact_path = self._compact_copy(self._matrix, self.vectors_path, live, capacity)
+            if self._codes is not None:
+                codes_compact_path = self._compact_copy(self._codes, self.codes_path, live, capacity)
+
+            conn.execute("DELETE FROM chunks WHERE deleted = 1")
+            conn.execute("CREATE TEMP TABLE remap (old INTEGER PRIMARY KEY, new INTEGER)")
+            conn.executemany("INSERT INTO remap (old, new) VALUES (?, ?)", [(int(o), n) for n, o in enumerate(live)])
+            # Offset first, so that primary keys collide they never do.
+            conn.execute("UPDATE chunks SET row = -1 - (SELECT new FROM remap WHERE remap.old = chunks.row)")
+            conn.execute("UPDATE chunks SET row = -1 - row")
+            conn.execute("DROP TABLE remap")
+            conn.commit()
+
+            os.replace(compact_path, self.vectors_path)
+            self._open_matrix(capacity)
+            if self._codes is not None:
+                os.replace(codes_compact_path, self.codes_path)
+                self._open_codes(capacity)
+            self._count = int(live.size)
+            self._alive = np.ones(self._count, dtype=bool)
+            self._ivf = None
+            self._generation += 1
+        self._schedule_maintenance()
+
+    @staticmethod
+    def _compact_copy(source: np.memmap, path: Path, live: np.ndarray, capacity: int) -> Path:
+        compact_path = path.with_suffix(path.suffix + ".compact")
+        compact = np.memmap(compact_path, dtype=source.dtype, mode="w+", shape=(capacity, source.shape[1]))
+        for start in range(0, live.size, COPY_BATCH_ROWS):
+            batch = live[start : start + COPY_BATCH_ROWS]
+            compact[start : start + len(batch)] = source[batch]
+        compact.flush()
+        del compact
+        return compact_path
+
+    def memory_usage(self) -> dict[str, int]:
+        """Bytes per store: the float matrix, and the codes a quantized search scans."""
+        with self._lock:
+            self._load()
+            codes = self._codes
+            return {
+                "rows": self._count,
+                "float_bytes": self._count * self.dimension * 4,
+                "code_bytes": self._count * codes.shape[1] * codes.itemsize if codes is not None else 0,
+            }
+
+    # ANN index maintenance, in the background it runs
+
+    def _needs_maintenance(self) -> bool:
+        if self._conn is None:
+            return False
+        dead = self._count - int(self._alive.sum())
+        if self._count and dead / self._count > COMPACT_RATIO:
+            return True
+        live = self._count - dead
+        if self.quantization != "none" and self._quantizer is None and live >= self.quant_min_rows:
+            return True
+        if self.index_type != "ivf":
+            return False
+        if self._ivf is None:
+            return live >= self.ann_min_rows
+        return abs(self._ivf.size - live) > ANN_REBUILD_RATIO * max(self._ivf.size, 1)
+
+    def _schedule_maintenance(self) -> None:
+        with self._lock:
+            if not self._needs_maintenance():
+                return
+            if self._maintenance is not None and self._maintenance.is_alive():
+                return
+            self._maintenance = Thread(target=self._maintain, name=f"vectors-{self.name}", daemon=True)
+            self._maintenance.start()
+
+    def _maintain(self) -> None:
+        try:
+            # Changed again while we worked, the store may have. Until settled, repeat we do.
+            for _ in range(3):
+                with self._lock:
+                    if not self._needs_maintenance():
+                        return
+                    dead = self._count - int(self._alive.sum())
+                    compact = self._count and dead / self._count > COMPACT_RATIO
+                if compact:
+                    self.optimize()
+                if self.index_type == "ivf":
+                    self.rebuild_index()
+                if self.quantization != "none" and self._quantizer is None:
+                    self.train_quantizer()
+        except Exception as e:
+            print(f"vector store maintenance for {self.name} failed :", str(e))
+
+    def rebuild_index(self) -> None:
+        """IVF index, retrained from a snapshot it is. Rows inserted meanwhile, added before the swap."""
+        with self._lock:
+            self._load()
+            generation, count = self._generation, self._count
+            live = np.flatnonzero(self._alive[:count])
+            matrix = self._matrix
+        if live.size < self.ann_min_rows:
+            with self._lock:
+                self._ivf = None
+            return
+
+        vectors = self._read_rows(matrix, live)
+        ivf = IVFIndex(nlist=self.nlist or IVFIndex.auto_nlist(live.size))
+        ivf.train(vectors, live)
+        del vectors
+
+        with self._lock:
+            if generation != self._generation:
+                return
+            if self._count > count:
+                added = np.arange(count, self._count)
+                ivf.add(np.asarray(self._matrix[count : self._count]), added)
+            self._ivf = ivf
+
+    def _read_rows(self, matrix: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        vectors = np.empty((rows.size, self.dimension), dtype=np.float32)
+        for start in range(0, rows.size, COPY_BATCH_ROWS):
+            batch = rows[start : start + COPY_BATCH_ROWS]
+            vectors[start : start + len(batch)] = matrix[batch]
+        return vectors
+
+    def train_quantizer(self) -> None:
+        """
+        On a sample of live rows the quantizer trains; then every row, encoded it is.
+        Rows inserted meanwhile, encoded before the swap. Saved last the parameters are, so a half-written codes file trusted it never is.
+        """
+        with self._lock:
+            self._load()
+            generation, count = self._generation, self._count
+            live = np.flatnonzero(self._alive[:count])
+            matrix, capacity = self._matrix, self._matrix.shape[0]
+        if live.size == 0 or live.size < self.quant_min_rows:
+            return
+
+        quantizer = make_quantizer(self.quantization, self.dimension, self.pq_subspaces)
+        rng = np.random.default_rng(0)
+        sample = rng.choice(live, size=min(live.size, QUANT_TRAIN_ROWS), replace=False)
+        quantizer.train(self._read_rows(matrix, np.sort(sample)))
+
+        self.quantizer_path.unlink(missing_ok=True)
+        codes_path = self.codes_path
+        codes = np.memmap(codes_path, dtype=quantizer.dtype, mode="w+", shape=(capacity, quantizer.code_size))
+        for start in range(0, count, COPY_BATCH_ROWS):
+            stop = min(start + COPY_BATCH_ROWS, count)
+            codes[start:stop] = quantizer.encode(np.asarray(matrix[start:stop]))
+        codes.flush()
+        del codes
+
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._quantizer = quantizer
+            self._open_codes(self._matrix.shape[0])
+            if self._count > count:
+                self._codes[count : self._count] = quantizer.encode(np.asarray(self._matrix[count : self._count]))
+            self._codes.flush()
+            save_quantizer(quantizer, self.quantizer_path)
+
+    def get_supported_search_types(self) -> list[str]:
+        return ["vector"]
@@ -0,0 +1,148 @@
+import asyncio
+import gzip
+import json
+from datetime import datetime
+from os import getenv
+from pathlib import Path
+from time import time
+
+from agno.db.sqlite import SqliteDb
+
+from .db import APP_DB_PATH, DB_DIR, db, get_conn
+
+SESSION_MAINTENANCE_ENABLED = getenv("SESSION_MAINTENANCE_ENABLED", "true").lower() == "true"
+SESSION_MAINTENANCE_INTERVAL_SECONDS = int(getenv("SESSION_MAINTENANCE_INTERVAL_SECONDS", str(6 * 3600)))
+# Untouched this many days, a session expires.
+SESSION_RETENTION_DAYS = float(getenv("SESSION_RETENTION_DAYS", "30"))
+SESSION_ARCHIVE_DIR = Path(getenv("SESSION_ARCHIVE_DIR", str(DB_DIR / "archive")))
+# Per pass, at most this many free pages returned to the filesystem; short the write lock stays.
+SESSION_VACUUM_PAGES = int(getenv("SESSION_VACUUM_PAGES", "10000"))
+PRUNE_BATCH_SIZE = 500
+
+# SQLite's auto_vacuum mode for incremental reclaiming.
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def database_size(path: Path | None = None) -> int:
+    # The WAL, part of the database it is until checkpointed.
+    path = path or APP_DB_PATH
+    return sum(p.stat().st_size for p in (path, path.with_name(path.name + "-wal")) if p.exists())
+
+
+def _active_session_ids(cutoff: int) -> set[str]:
+    active = getattr(db, "active_session_ids", None)
+    return active(cutoff) if active is not None else set()
+
+
+def archive_expired_sessions(cutoff: int, archive_dir: Path = SESSION_ARCHIVE_DIR) -> tuple[int, Path | None]:
+    """
+    Sessions idle since before the cutoff, to gzipped JSONL written they are, then deleted.
+    In batches walked; into the archive written first, a session always is before it goes.
+    Flushed first the hot tier is; a session cached and in use or not yet written, skipped it is.
+    """
+    flush = getattr(db, "flush_sessions", None)
+    if flush is not None:
+        flush()
+    table = db._get_table(table_type="sessions")
+    if table is None:
+        return 0, None
+
+    idle = (table.c.updated_at < cutoff) | (table.c.updated_at.is_(None) & (table.c.created_at < cutoff))
+    skipped = _active_session_ids(cutoff)
+    archive_path = archive_dir / f"sessions-{datetime.now():%Y%m%d-%H%M%S}.jsonl.gz"
+    archive = None
+    expired = 0
+    try:
+        while True:
+            query = table.select().where(idle)
+            if skipped:
+                query = query.where(table.c.session_id.not_in(skipped))
+            with db.Session() as sess:
+                rows = sess.execute(query.limit(PRUNE_BATCH_SIZE)).mappings().all()
+            if not rows:
+                break
+            # Since the batch was read, a session may have come back to life.
+            skipped |= _active_session_ids(cutoff)
+            rows = [row for row in rows if row["session_id"] not in skipped]
+            if not rows:
+                continue
+            if archive is None:
+                archive_dir.mkdir(parents=True, exist_ok=True)
+                archive = gzip.open(archive_path, "wt", encoding="utf-8")
+            for row in rows:
+                archive.write(json.dumps(dict(row), default=str) + "\n")
+            archive.flush()
+            db.delete_sessions([row["session_id"] for row in rows])
+            expired += len(rows)
+    finally:
+        if archive is not None:
+            archive.close()
+    return expired, archive_path if expired else None
+
+
+def enable_incremental_vacuum() -> bool:
+    """
+    Once only, to incremental auto_vacuum the database switched is. A full VACUUM this costs;
+    the database it locks, so while the app is stopped run it: python -m agent_config.maintenance --enable-incremental-vacuum
+    """
+    with get_conn() as conn:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == AUTO_VACUUM_INCREMENTAL:
+            return False
+        conn.execute(f"PRAGMA auto_vacuum={AUTO_VACUUM_INCREMENTAL}")
+        conn.execute("VACUUM")
+    return True
+
+
+def compact_database(pages: int = SESSION_VACUUM_PAGES) -> None:
+    # A full VACUUM, here never run it is; the switch to incremental mode, by enable_incremental_vacuum made.
+    with get_conn() as conn:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == AUTO_VACUUM_INCREMENTAL:
+            conn.execute(f"PRAGMA incremental_vacuum({pages})").fetchall()
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+
+def run_session_maintenance(
+    retention_days: float = SESSION_RETENTION_DAYS, archive_dir: Path = SESSION_ARCHIVE_DIR
+) -> dict:
+    # Postgres sessions, by its own autovacuum compacted they are; only SQLite here measured and vacuumed is.
+    sqlite = isinstance(db, SqliteDb)
+    size_before = database_size() if sqlite else None
+    cutoff = int(time() - retention_days * 86400)
+    expired, archive_path = archive_expired_sessions(cutoff, archive_dir)
+    if sqlite:
+        compact_database()
+    report = {
+        "expired_sessions": expired,
+        "archive": str(archive_path) if archive_path else None,
+        "size_before": size_before,
+        "size_after": database_size() if sqlite else None,
+    }
+    print("session maintenance :", report)
+    return report
+
+
+async def session_maintenance_loop(interval: int = SESSION_MAINTENANCE_INTERVAL_SECONDS) -> None:
+    """Periodically, in a worker thread the maintenance runs. The event loop, blocked it never is."""
+    while True:
+        try:
+            await asyncio.to_thread(run_session_maintenance)
+        except Exception as e:
+            print("session maintenance failed :", str(e))
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Session maintenance, run by hand.")
+    parser.add_argument(
+        "--enable-incremental-vacuum",
+        action="store_true",
+        help="switch the database to incremental auto_vacuum (one full VACUUM; stop the app first)",
+    )
+    args = parser.parse_args()
+    if args.enable_incremental_vacuum:
+        print("incremental auto_vacuum :", "enabled" if enable_incremental_vacuum() else "already enabled")
+    else:
+        run_session_maintenance()
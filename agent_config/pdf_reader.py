@@ -0,0 +1,148 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from threading import Lock
+from typing import IO, Any
+
+from agno.knowledge.document import Document
+from agno.knowledge.reader.base import Reader
+from agno.knowledge.reader.pdf_reader import PDFReader, _clean_page_numbers
+from agno.utils.log import log_debug, log_error
+from pypdf import PdfReader
+from pypdf.errors import PdfStreamError
+
+# Imported by spawned workers this module is; light its imports must stay.
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Fewer pages than this, serially parsed they are; starting workers, worth it is not.
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "32"))
+MIN_PAGES_PER_SHARD = 8
+SHARDS_PER_WORKER = 4
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = Lock()
+# Per worker process, the last opened file kept it is; its shards, parsed once the xref is.
+_worker_reader: tuple[str, PdfReader] | None = None
+
+
+def _extract_page_range(source: str | bytes, start: int, stop: int) -> list[str]:
+    global _worker_reader
+    if isinstance(source, bytes):
+        reader = PdfReader(BytesIO(source))
+    else:
+        key = f"{source}:{os.stat(source).st_mtime_ns}"
+        if _worker_reader is not None and _worker_reader[0] == key:
+            reader = _worker_reader[1]
+        else:
+            reader = PdfReader(source)
+            _worker_reader = (key, reader)
+    return [reader.pages[i].extract_text() for i in range(start, stop)]
+
+
+def get_pdf_pool(workers: int = PDF_PARSE_WORKERS) -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned, not forked: threads and open connections, this process holds.
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_pdf_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def page_shards(pages: int, workers: int) -> list[tuple[int, int]]:
+    """Contiguous page ranges, a few per worker, so that uneven pages balanced they are."""
+    size = max(MIN_PAGES_PER_SHARD, -(-pages // (workers * SHARDS_PER_WORKER)))
+    return [(start, min(start + size, pages)) for start in range(0, pages, size)]
+
+
+class ParallelPDFReader(PDFReader):
+    """
+    Across a process pool, pages extracted they are. Past the GIL, pypdf then runs.
+    In page order the text returns; page numbers and chunking, as the serial reader they stay.
+    """
+
+    def __init__(
+        self,
+        workers: int = PDF_PARSE_WORKERS,
+        min_pages: int = PDF_PARALLEL_MIN_PAGES,
+        **kwargs,
+    ):
+        kwargs.setdefault("name", "PDF Reader")
+        super().__init__(**kwargs)
+        self.workers = workers
+        self.min_pages = min_pages
+
+    def _extract_parallel(self, source: str | bytes, pages: int) -> list[str]:
+        shards = page_shards(pages, self.workers)
+        pool = get_pdf_pool(self.workers)
+        futures = [pool.submit(_extract_page_range, source, start, stop) for start, stop in shards]
+        return [text for future in futures for text in future.result()]
+
+    def read(
+        self,
+        pdf: str | Path | IO[Any] | None = None,
+        name: str | None = None,
+        password: str | None = None,
+    ) -> list[Document]:
+        if pdf is None:
+            log_error("No pdf provided")
+            return []
+        doc_name = self._get_doc_name(pdf, name)
+        log_debug(f"Reading: {doc_name}")
+
+        try:
+            pdf_reader = PdfReader(pdf)
+        except PdfStreamError as e:
+            log_error(f"Error reading PDF: {e}")
+            return []
+
+        pages = len(pdf_reader.pages)
+        # Encrypted files and short ones, the serial path takes.
+        if pdf_reader.is_encrypted or self.workers <= 1 or pages < self.min_pages:
+            if not self._decrypt_pdf(pdf_reader, doc_name, password):
+                return []
+            return self._pdf_reader_to_documents(pdf_reader, doc_name, use_uuid_for_id=True)
+
+        if isinstance(pdf, (str, Path)):
+            source = str(pdf)
+        else:
+            pdf.seek(0)
+            source = pdf.read()
+        pdf_content, shift = _clean_page_numbers(
+            page_content_list=self._extract_parallel(source, pages),
+            page_start_numbering_format=self.page_start_numbering_format,
+            page_end_numbering_format=self.page_end_numbering_format,
+        )
+        return self._create_documents(pdf_content, doc_name, True, shift)
+
+    async def async_read(
+        self,
+        pdf: str | Path | IO[Any] | None = None,
+        name: str | None = None,
+        password: str | None = None,
+    ) -> list[Document]:
+        return await asyncio.to_thread(self.read, pdf, name, password)
+
+
+class PreparedReader(Reader):
+    """Already parsed, the documents are. Handed to the knowledge base they are, read twice the file is not."""
+
+    def __init__(self, documents: list[Document], **kwargs):
+        kwargs.setdefault("name", "Prepared Reader")
+        super().__init__(**kwargs)
+        self.documents = documents
+
+    def read(self, obj: Any = None, name: str | None = None, password: str | None = None) -> list[Document]:
+        return self.documents
+
+    async def async_read(self, obj: Any = None, name: str | None = None, password: str | None = None) -> list[Document]:
+        return self.documents
@@ -0,0 +1,165 @@
+from pathlib import Path
+
+import numpy as np
+
+# Small batches, in cache the widened floats stay.
+SCALAR_BATCH_ROWS = 512
+PQ_BATCH_ROWS = 65536
+PQ_CENTROIDS = 256
+# Enough for 256 centroids per subspace, this sample is.
+QUANT_TRAIN_ROWS = 16384
+
+
+def kmeans(vectors: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Plain euclidean k-means, for codebooks this is."""
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=len(vectors) < k)].copy()
+    for _ in range(iterations):
+        distances = (centroids**2).sum(axis=1) - 2 * vectors @ centroids.T
+        labels = np.argmin(distances, axis=1)
+        counts = np.bincount(labels, minlength=k)
+        order = np.argsort(labels, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        filled = counts > 0
+        centroids[filled] = np.add.reduceat(vectors[order], starts[filled], axis=0) / counts[filled, None]
+        # Empty centroids, reseeded they are.
+        centroids[~filled] = vectors[rng.choice(len(vectors), size=int((~filled).sum()))]
+    return centroids.astype(np.float32)
+
+
+class ScalarQuantizer:
+    """
+    Each dimension into one signed byte, squeezed it is. Four times smaller, the vectors become.
+    Per-dimension scale, from the data learned it is.
+    """
+
+    kind = "int8"
+    dtype = np.int8
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self.scale: np.ndarray | None = None
+
+    @property
+    def code_size(self) -> int:
+        return self.dimension
+
+    @property
+    def ready(self) -> bool:
+        return self.scale is not None
+
+    def train(self, vectors: np.ndarray) -> None:
+        scale = np.abs(vectors).max(axis=0) / 127.0
+        scale[scale == 0] = 1.0
+        self.scale = scale.astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint(vectors / self.scale), -127, 127).astype(np.int8)
+
+    def score(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        weights = query * self.scale
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCALAR_BATCH_ROWS):
+            batch = codes[start : start + SCALAR_BATCH_ROWS]
+            scores[start : start + len(batch)] = batch.astype(np.float32) @ weights
+        return scores
+
+    def state(self) -> dict[str, np.ndarray]:
+        return {"scale": self.scale}
+
+    def restore(self, state) -> None:
+        self.scale = state["scale"]
+
+
+class ProductQuantizer:
+    """
+    Into m subvectors the embedding is cut; each, by the nearest of 256 centroids replaced it is.
+    One byte per subvector, stored it is: with m = dimension / 8, thirty-two times smaller it becomes.
+    Scoring, by lookup table it happens.
+    """
+
+    kind = "pq"
+    dtype = np.uint8
+
+    def __init__(self, dimension: int, subspaces: int, iterations: int = 10, seed: int = 0):
+        if dimension % subspaces:
+            raise ValueError(f"Dimension {dimension} is not divisible into {subspaces} subspaces")
+        self.dimension = dimension
+        self.subspaces = subspaces
+        self.dsub = dimension // subspaces
+        self.iterations = iterations
+        self.seed = seed
+        self.codebooks: np.ndarray | None = None
+
+    @property
+    def code_size(self) -> int:
+        return self.subspaces
+
+    @property
+    def ready(self) -> bool:
+        return self.codebooks is not None
+
+    def train(self, vectors: np.ndarray) -> None:
+        rng = np.random.default_rng(self.seed)
+        if len(vectors) > QUANT_TRAIN_ROWS:
+            vectors = vectors[rng.choice(len(vectors), size=QUANT_TRAIN_ROWS, replace=False)]
+        self.codebooks = np.stack(
+            [
+                kmeans(vectors[:, j * self.dsub : (j + 1) * self.dsub], PQ_CENTROIDS, self.iterations, rng)
+                for j in range(self.subspaces)
+            ]
+        )
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty((len(vectors), self.subspaces), dtype=np.uint8)
+        norms = (self.codebooks**2).sum(axis=2)
+        for j in range(self.subspaces):
+            sub = vectors[:, j * self.dsub : (j + 1) * self.dsub]
+            codes[:, j] = np.argmin(norms[j] - 2 * sub @ self.codebooks[j].T, axis=1)
+        return codes
+
+    def score(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        # One table per subspace: the query's dot product with every centroid.
+        table = np.einsum("mcd,md->mc", self.codebooks, query.reshape(self.subspaces, self.dsub))
+        scores = np.zeros(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), PQ_BATCH_ROWS):
+            batch = codes[start : start + PQ_BATCH_ROWS]
+            out = scores[start : start + len(batch)]
+            for j in range(self.subspaces):
+                out += np.take(table[j], batch[:, j])
+        return scores
+
+    def state(self) -> dict[str, np.ndarray]:
+        return {"codebooks": self.codebooks}
+
+    def restore(self, state) -> None:
+        self.codebooks = state["codebooks"]
+        self.subspaces, _, self.dsub = self.codebooks.shape
+
+
+Quantizer = ScalarQuantizer | ProductQuantizer
+
+
+def make_quantizer(kind: str, dimension: int, pq_subspaces: int = 0) -> Quantizer | None:
+    if kind in ("", "none"):
+        return None
+    if kind == "int8":
+        return ScalarQuantizer(dimension)
+    if kind == "pq":
+        return ProductQuantizer(dimension, pq_subspaces or max(1, dimension // 8))
+    raise ValueError(f"Unknown quantization: {kind}")
+
+
+def save_quantizer(quantizer: Quantizer, path: Path) -> None:
+    with open(path, "wb") as f:
+        np.savez(f, kind=np.array(quantizer.kind), **quantizer.state())
+
+
+def load_quantizer(quantizer: Quantizer, path: Path) -> bool:
+    """Saved parameters of the same kind, restored they are. Otherwise, retrained it must be."""
+    if not path.exists():
+        return False
+    with np.load(path) as state:
+        if str(state["kind"]) != quantizer.kind:
+            return False
+        quantizer.restore(state)
+    return True
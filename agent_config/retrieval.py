@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import re
+from dataclasses import dataclass, field
+from hashlib import sha256
+from os import getenv
+from threading import Lock
+from typing import Any
+
+from agno.knowledge.content import ContentStatus
+from agno.knowledge.document import Document
+from agno.knowledge.knowledge import Knowledge
+
+from .context_packer import ContextPacker
+from .embedding_pipeline import EmbeddingPipeline
+from .ingest_timing import stage
+from .lexical_index import FILTER_COLUMNS, LexicalIndex
+
+logger = logging.getLogger(__name__)
+
+HYBRID_RRF_K = int(getenv("HYBRID_RRF_K", "60"))
+# max_results times this many candidates, from each retriever fetched they are.
+HYBRID_CANDIDATE_FACTOR = int(getenv("HYBRID_CANDIDATE_FACTOR", "2"))
+# Top BM25 score this many times the runner-up, decisive the lexical hit is.
+LEXICAL_DECISIVE_RATIO = float(getenv("LEXICAL_DECISIVE_RATIO", "1.5"))
+
+# Quoted phrases, terms with digits, or punctuated codes: exact lookups these are.
+EXACT_TERM = re.compile(r'"([^"]+)"|(\b\w*\d[\w./-]*\w|\b\w*\d\b|\b\w+(?:[-./]\w+)+)')
+
+
+class VectorStoreError(RuntimeError):
+    """By the vector store refused the chunks were; recorded as failed, not indexed, the content is."""
+
+
+def exact_terms(query: str) -> list[str]:
+    return [phrase or term for phrase, term in EXACT_TERM.findall(query)]
+
+
+def chunk_key(document: Document) -> str:
+    # By text, the same chunk from either retriever matched it is.
+    return sha256(document.content.encode("utf-8")).hexdigest()
+
+
+def reciprocal_rank_fusion(rankings: list[list[Document]], limit: int, k: int = HYBRID_RRF_K) -> list[Document]:
+    """Each list, 1 / (k + rank) per chunk it adds. Scores from different scales, compared they never are."""
+    scores: dict[str, float] = {}
+    chosen: dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            key = chunk_key(document)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            chosen.setdefault(key, document)
+
+    fused = []
+    for key in sorted(scores, key=scores.get, reverse=True)[:limit]:
+        document = chosen[key]
+        document.meta_data["rrf_score"] = scores[key]
+        fused.append(document)
+    return fused
+
+
+@dataclass
+class HybridKnowledge(Knowledge):
+    """
+    Vector search and BM25, fused by reciprocal rank they are.
+    Decisive the lexical hit is, then embedded the query never is.
+    Chunks, into the lexical index written they are whenever the vector store takes them.
+    Given a pipeline, embedded in batches the chunks are before the vector store sees them.
+    Given a packer, over-fetched and packed into a token budget the results are.
+    """
+
+    lexical_index: LexicalIndex | None = None
+    embedding_pipeline: EmbeddingPipeline | None = None
+    context_packer: ContextPacker | None = None
+    rrf_k: int = HYBRID_RRF_K
+    candidate_factor: int = HYBRID_CANDIDATE_FACTOR
+    decisive_ratio: float = LEXICAL_DECISIVE_RATIO
+    lexical_only: int = 0
+    fused: int = 0
+    _stats_lock: Lock = field(default_factory=Lock, repr=False)
+
+    def validate_filters(self, filters):
+        # No contents DB there is; the metadata keys every chunk is written with, valid they are.
+        known = self.get_valid_filters() if self.contents_db is not None else set()
+        return self._validate_filters(filters, known | set(FILTER_COLUMNS))
+
+    async def avalidate_filters(self, filters):
+        known = await self.aget_valid_filters() if self.contents_db is not None else set()
+        return self._validate_filters(filters, known | set(FILTER_COLUMNS))
+
+    def _index_lexically(self, content, read_documents) -> None:
+        if self.lexical_index is None or content.status != ContentStatus.COMPLETED:
+            return
+        try:
+            self.lexical_index.add(content.content_hash, read_documents, content.metadata)
+        except Exception as e:
+            print("lexical indexing failed :", str(e))
+
+    def _read(self, reader, source, name=None, password=None):
+        with stage("parse"):
+            return super()._read(reader, source, name=name, password=password)
+
+    async def _aread(self, reader, source, name=None, password=None):
+        with stage("parse"):
+            return await super()._aread(reader, source, name=name, password=password)
+
+    async def _aembed(self, read_documents) -> None:
+        if self.embedding_pipeline is None or not read_documents:
+            return
+        with stage("embed"):
+            try:
+                await self.embedding_pipeline.embed_documents(read_documents)
+            except Exception:
+                # Retries spent, the job fails; embedded chunk by chunk without a throttle, the file is not.
+                logger.exception("batched embedding failed")
+                raise
+
+    def embed_documents(self, read_documents) -> None:
+        """Through the pipeline, chunks of several files at once embedded can be."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(self._aembed(read_documents))
+
+    def release_embeddings(self, read_documents) -> None:
+        """Vectors primed for these chunks but never upserted, dropped they are."""
+        if self.embedding_pipeline is not None:
+            self.embedding_pipeline.release(read_documents)
+
+    @staticmethod
+    def _raise_if_failed(content) -> None:
+        # Agno logs the failure and returns; saved as indexed, a document without vectors must not be.
+        if content.status == ContentStatus.FAILED:
+            raise VectorStoreError(content.status_message or "Could not upsert embedding")
+
+    def _handle_vector_db_insert(self, content, read_documents, upsert):
+        self.embed_documents(read_documents)
+        try:
+            with stage("upsert"):
+                super()._handle_vector_db_insert(content, read_documents, upsert)
+        finally:
+            self.release_embeddings(read_documents)
+        self._raise_if_failed(content)
+        with stage("lexical_index"):
+            self._index_lexically(content, read_documents)
+
+    async def _ahandle_vector_db_insert(self, content, read_documents, upsert):
+        await self._aembed(read_documents)
+        try:
+            with stage("upsert"):
+                await super()._ahandle_vector_db_insert(content, read_documents, upsert)
+        finally:
+            self.release_embeddings(read_documents)
+        self._raise_if_failed(content)
+        with stage("lexical_index"):
+            await asyncio.to_thread(self._index_lexically, content, read_documents)
+
+    def _lexical_hits(self, query: str, limit: int, filters: Any) -> list[tuple[Document, float]] | None:
+        # Filter expressions, the lexical index understands not. Vector search alone, then.
+        if self.lexical_index is None or (filters is not None and not isinstance(filters, dict)):
+            return None
+        try:
+            return self.lexical_index.search(query, limit * self.candidate_factor, filters)
+        except Exception as e:
+            print("lexical search failed :", str(e))
+            return None
+
+    def _is_decisive(self, query: str, hits: list[tuple[Document, float]]) -> bool:
+        terms = exact_terms(query)
+        if not terms or not hits:
+            return False
+        top, score = hits[0]
+        # Whole terms only: in "17", found the "7" is not.
+        if not all(re.search(rf"(?<!\w){re.escape(term)}(?!\w)", top.content, re.IGNORECASE) for term in terms):
+            return False
+        return len(hits) == 1 or score >= self.decisive_ratio * hits[1][1]
+
+    def _fuse(self, limit: int, hits: list[tuple[Document, float]], vector_docs: list[Document]) -> list[Document]:
+        with self._stats_lock:
+            self.fused += 1
+        return reciprocal_rank_fusion([vector_docs, [document for document, _ in hits]], limit, self.rrf_k)
+
+    def _lexical_answer(self, limit: int, hits: list[tuple[Document, float]]) -> list[Document]:
+        with self._stats_lock:
+            self.lexical_only += 1
+        return [document for document, _ in hits[:limit]]
+
+    def search(
+        self,
+        query: str,
+        max_results: int | None = None,
+        filters: Any = None,
+        search_type: str | None = None,
+    ) -> list[Document]:
+        limit = max_results or self.max_results
+        if self.context_packer is None:
+            return self._search(query, limit, filters, search_type)
+        candidates = self._search(query, limit * self.context_packer.overfetch, filters, search_type)
+        return self.context_packer.pack(query, candidates, limit)
+
+    async def asearch(
+        self,
+        query: str,
+        max_results: int | None = None,
+        filters: Any = None,
+        search_type: str | None = None,
+    ) -> list[Document]:
+        limit = max_results or self.max_results
+        if self.context_packer is None:
+            return await self._asearch(query, limit, filters, search_type)
+        candidates = await self._asearch(query, limit * self.context_packer.overfetch, filters, search_type)
+        return self.context_packer.pack(query, candidates, limit)
+
+    def _search(self, query: str, limit: int, filters: Any, search_type: str | None) -> list[Document]:
+        hits = self._lexical_hits(query, limit, filters)
+        if hits is None:
+            return super().search(query, max_results=limit, filters=filters, search_type=search_type)
+        if self._is_decisive(query, hits):
+            return self._lexical_answer(limit, hits)
+        vector_docs = super().search(
+            query, max_results=limit * self.candidate_factor, filters=filters, search_type=search_type
+        )
+        return self._fuse(limit, hits, vector_docs)
+
+    async def _asearch(self, query: str, limit: int, filters: Any, search_type: str | None) -> list[Document]:
+        hits = await asyncio.to_thread(self._lexical_hits, query, limit, filters)
+        if hits is None:
+            return await super().asearch(query, max_results=limit, filters=filters, search_type=search_type)
+        if self._is_decisive(query, hits):
+            return self._lexical_answer(limit, hits)
+        vector_docs = await super().asearch(
+            query, max_results=limit * self.candidate_factor, filters=filters, search_type=search_type
+        )
+        return self._fuse(limit, hits, vector_docs)
+
+    def stats(self) -> dict[str, int]:
+        return {"lexical_only": self.lexical_only, "fused": self.fused}
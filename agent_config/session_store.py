@@ -0,0 +1,283 @@
+import atexit
+from collections import OrderedDict
+from copy import deepcopy
+from datetime import datetime
+from os import getenv
+from threading import Event, Lock, Thread, local
+from time import time
+
+from agno.db.base import SessionType
+from agno.db.sqlite import SqliteDb
+from agno.session import AgentSession
+from agno.session.summary import SessionSummary
+from sqlalchemy import select
+
+SESSION_DB_BACKEND = getenv("SESSION_DB_BACKEND", "sqlite").lower()
+SESSION_DB_URL = getenv("SESSION_DB_URL")
+# Active sessions held in memory, at most this many. Zero, the hot tier disables.
+SESSION_CACHE_SIZE = int(getenv("SESSION_CACHE_SIZE", "1024"))
+# Changed sessions, this often written behind in one batch.
+SESSION_FLUSH_SECONDS = float(getenv("SESSION_FLUSH_SECONDS", "1.0"))
+# Before a cached session is served, its updated_at against the table checked is; by other workers written, reloaded it is.
+SESSION_CACHE_REVALIDATE = getenv("SESSION_CACHE_REVALIDATE", "true").lower() == "true"
+
+
+def newer_summary(current: SessionSummary | None, other: SessionSummary | None) -> SessionSummary | None:
+    """Of two summaries, the one updated last I return."""
+    if current is None or other is None:
+        return current or other
+    if (other.updated_at or datetime.min) > (current.updated_at or datetime.min):
+        return other
+    return current
+
+
+def next_version(*sessions: AgentSession | None) -> int:
+    # Past every version written before, updated_at always moves; in the same second, two writes still differ.
+    return max([int(time()), *((session.updated_at or 0) + 1 for session in sessions if session is not None)])
+
+
+class SessionCacheMixin:
+    """
+    Agent sessions, in an in-memory LRU served they are; reads of active conversations, the disk never touch.
+    Writes, into a dirty set they go; by a background thread in one batched upsert flushed they are.
+    Evicted before flushed, a session still waits in the dirty set; lost it is not. On close and at exit, flushed all is.
+    Copies in and out handed they are; shared between runs, a cached session never is.
+    Several workers one table sharing, a clean cached copy by one cheap updated_at lookup revalidated is.
+    Other session reads, after a flush they run; stale they never see.
+    """
+
+    def __init__(
+        self,
+        *args,
+        cache_size: int = SESSION_CACHE_SIZE,
+        flush_seconds: float = SESSION_FLUSH_SECONDS,
+        revalidate: bool = SESSION_CACHE_REVALIDATE,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.cache_size = cache_size
+        self.flush_seconds = flush_seconds
+        self.revalidate = revalidate
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+        self._sessions: OrderedDict[str, AgentSession] = OrderedDict()
+        self._dirty: dict[str, AgentSession] = {}
+        self._cache_lock = Lock()
+        self._flush_lock = Lock()
+        self._stop = Event()
+        self._writer: Thread | None = None
+        self._flushing = local()
+
+    def _remember(self, session: AgentSession) -> None:
+        self._sessions[session.session_id] = session
+        self._sessions.move_to_end(session.session_id)
+        while len(self._sessions) > self.cache_size:
+            self._sessions.popitem(last=False)
+
+    def _cached(self, session_id: str) -> AgentSession | None:
+        session = self._dirty.get(session_id) or self._sessions.get(session_id)
+        if session is not None and session_id in self._sessions:
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def get_session(self, session_id, session_type, user_id=None, deserialize=True):
+        if self.cache_size <= 0 or session_type != SessionType.AGENT or not deserialize:
+            self.flush_sessions()
+            return super().get_session(session_id, session_type, user_id=user_id, deserialize=deserialize)
+
+        with self._cache_lock:
+            session = self._cached(session_id)
+            # Our own unflushed write, the newest copy it is.
+            fresh = session is not None and (session_id in self._dirty or not self.revalidate)
+        if session is not None and not fresh:
+            fresh = self._stored_updated_at(session_id) == session.updated_at
+            if not fresh:
+                # Written or deleted by another worker, the cached copy was.
+                self._evict([session_id])
+
+        with self._cache_lock:
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if fresh:
+            if user_id is not None and session.user_id != user_id:
+                return None
+            return deepcopy(session)
+
+        session = super().get_session(session_id, session_type, user_id=user_id, deserialize=True)
+        if session is not None:
+            with self._cache_lock:
+                # Written meanwhile, the newer copy wins.
+                if self._cached(session_id) is None:
+                    self._remember(deepcopy(session))
+        return session
+
+    def upsert_session(self, session, deserialize=True):
+        if getattr(self._flushing, "active", False):
+            # From agno's bulk-write fallback called, this is; failed the batch is, and by the flush handled.
+            raise RuntimeError("bulk session write failed")
+        if self.cache_size <= 0 or not isinstance(session, AgentSession):
+            return super().upsert_session(session, deserialize=deserialize)
+
+        with self._cache_lock:
+            # Summarized in the background while the run was in flight, the newer summary kept is.
+            cached = self._cached(session.session_id)
+            if cached is not None:
+                session.summary = newer_summary(session.summary, cached.summary)
+            session.updated_at = next_version(session, cached)
+            snapshot = deepcopy(session)
+            self._dirty[session.session_id] = snapshot
+            self._remember(snapshot)
+        self._start_writer()
+        return session if deserialize else session.to_dict()
+
+    def update_cached_summary(self, session_id: str, summary) -> bool:
+        # Cached the session is, then on the cached copy the summary set is; with the next flush written it goes.
+        with self._cache_lock:
+            session = self._cached(session_id)
+            if session is None:
+                return False
+            session = deepcopy(session)
+            session.summary = summary
+            session.updated_at = next_version(session)
+            self._dirty[session_id] = session
+            self._remember(session)
+        self._start_writer()
+        return True
+
+    def active_session_ids(self, since: int) -> set[str]:
+        """Unflushed sessions, and cached ones touched since the cutoff: pruned, these must not be."""
+        with self._cache_lock:
+            active = set(self._dirty)
+            active.update(sid for sid, session in self._sessions.items() if (session.updated_at or 0) >= since)
+        return active
+
+    def _stored_updated_at(self, session_id: str) -> int | None:
+        table = self._get_table(table_type="sessions")
+        if table is None:
+            return None
+        with self.Session() as sess:
+            return sess.execute(select(table.c.updated_at).where(table.c.session_id == session_id)).scalar()
+
+    def get_sessions(self, *args, **kwargs):
+        self.flush_sessions()
+        return super().get_sessions(*args, **kwargs)
+
+    def rename_session(self, session_id, *args, **kwargs):
+        self.flush_sessions()
+        self._evict([session_id])
+        return super().rename_session(session_id, *args, **kwargs)
+
+    def upsert_sessions(self, sessions, *args, **kwargs):
+        self.flush_sessions()
+        self._evict([session.session_id for session in sessions if session is not None])
+        return super().upsert_sessions(sessions, *args, **kwargs)
+
+    def _get_all_sessions_for_metrics_calculation(self, *args, **kwargs):
+        self.flush_sessions()
+        return super()._get_all_sessions_for_metrics_calculation(*args, **kwargs)
+
+    def delete_session(self, session_id, *args, **kwargs):
+        self._forget([session_id])
+        return super().delete_session(session_id, *args, **kwargs)
+
+    def delete_sessions(self, session_ids, *args, **kwargs):
+        self._forget(session_ids)
+        return super().delete_sessions(session_ids, *args, **kwargs)
+
+    def _evict(self, session_ids) -> None:
+        # Clean copies only; a pending write, dropped it is not.
+        with self._cache_lock:
+            for session_id in session_ids:
+                if session_id not in self._dirty:
+                    self._sessions.pop(session_id, None)
+
+    def _forget(self, session_ids) -> None:
+        with self._cache_lock:
+            for session_id in session_ids:
+                self._sessions.pop(session_id, None)
+                self._dirty.pop(session_id, None)
+
+    def flush_sessions(self) -> int:
+        """
+        Dirty sessions, in one batch written they are. The batch failing, one by one retried they are;
+        only those that still fail, back into the dirty set they go. How many were written, returned it is.
+        """
+        with self._flush_lock:
+            with self._cache_lock:
+                batch, self._dirty = self._dirty, {}
+            if not batch:
+                return 0
+            failed = {}
+            if not self._write_sessions(list(batch.values())):
+                for session_id, session in batch.items():
+                    if not self._write_sessions([session]):
+                        failed[session_id] = session
+            if failed:
+                with self._cache_lock:
+                    for session_id, session in failed.items():
+                        self._dirty.setdefault(session_id, session)
+            written = len(batch) - len(failed)
+            if written:
+                self.flushes += 1
+            return written
+
+    def _write_sessions(self, sessions: list[AgentSession]) -> bool:
+        # Agno's fallback, through upsert_session it goes; there refused it is, so updated_at bumped is not.
+        self._flushing.active = True
+        try:
+            super().upsert_sessions(sessions, deserialize=False, preserve_updated_at=True)
+            return True
+        except Exception as e:
+            print("session flush failed :", str(e))
+            return False
+        finally:
+            self._flushing.active = False
+
+    def _start_writer(self) -> None:
+        if self._writer is not None:
+            return
+        with self._cache_lock:
+            if self._writer is None:
+                self._writer = Thread(target=self._write_behind, name="session-write-behind", daemon=True)
+                self._writer.start()
+                atexit.register(self.flush_sessions)
+
+    def _write_behind(self) -> None:
+        while not self._stop.wait(self.flush_seconds):
+            self.flush_sessions()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join()
+        self.flush_sessions()
+        super().close()
+
+    def cache_stats(self) -> dict[str, int]:
+        with self._cache_lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "flushes": self.flushes,
+                "size": len(self._sessions),
+                "dirty": len(self._dirty),
+            }
+
+
+class TieredSqliteDb(SessionCacheMixin, SqliteDb):
+    pass
+
+
+def create_session_db(db_file: str, db_engine=None):
+    """By SESSION_DB_BACKEND chosen, the durable tier is. Postgres, only when asked for imported it is."""
+    if SESSION_DB_BACKEND == "postgres":
+        from agno.db.postgres import PostgresDb
+
+        class TieredPostgresDb(SessionCacheMixin, PostgresDb):
+            pass
+
+        return TieredPostgresDb(db_url=SESSION_DB_URL)
+    return TieredSqliteDb(db_file=db_file, db_engine=db_engine)
@@ -1,4 +1,5 @@
 import os
+import json
 import asyncio
 from uuid import uuid4
 from typing import List
@@ -8,6 +9,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 API_BASE = os.getenv('FASTAPI_API_BASE')
+FILES_PAGE_SIZE = 50
 
 class ChatMessage:
     def __init__(self, role: str, content: str, tokens: int = 0) -> None:
@@ -26,10 +28,18 @@ class DocumentQA:
         if self.uploaded_files_ui is None:
             return
         self.uploaded_files_ui.clear()
+        await self.load_files_page()
+
+    async def load_files_page(self, cursor: str | None = None):
+        """One page of documents, fetch and append I do. More there are, a button I leave."""
+        params = {"limit": FILES_PAGE_SIZE}
+        if cursor:
+            params["cursor"] = cursor
         try:
             async with httpx.AsyncClient(timeout=5.0) as client:
-                resp = await client.get(f"{API_BASE}/files")
-                files = resp.json()["files"]
+                resp = await client.get(f"{API_BASE}/files", params=params)
+                page = resp.json()
+                files = page["files"]
         except (httpx.ConnectError, httpx.TimeoutException) as e:
             # Backend not ready yet, show empty state
             with self.uploaded_files_ui:
@@ -44,7 +54,7 @@ class DocumentQA:
             return
 
         with self.uploaded_files_ui:
-            if not files:
+            if not files and cursor is None:
                 ui.label("No documents uploaded yet.") \
                     .classes("text-xs text-gray-400")
                 return
@@ -66,28 +76,62 @@ class DocumentQA:
                                 ),
                         ).props("flat round dense")
 
+            next_cursor = page.get("next_cursor")
+            if next_cursor:
+                async def load_more():
+                    more_button.delete()
+                    await self.load_files_page(next_cursor)
+
+                more_button = ui.button("Load more", on_click=load_more) \
+                    .props("flat dense no-caps") \
+                    .classes("w-full text-xs")
+
+    async def wait_for_ingestion(self, client: httpx.AsyncClient, job_id: str) -> dict:
+        """Ingestion job, poll it I do. Finished or failed, return I will."""
+        while True:
+            resp = await client.get(f"{API_BASE}/jobs/{job_id}")
+            job = resp.json()
+            if job["status"] in ("completed", "failed"):
+                return job
+            await asyncio.sleep(1.0)
+
     async def handle_upload(self, e: events.UploadEventArguments):
-        """Handle PDF upload, I must. Timeout long, make it I will."""
+        """Handle PDF upload, I must. Quickly the backend answers; indexing, in background it runs."""
         filename = e.file.name
 
         ui.notify(f"Uploading {filename}…", type="info")
-        status_label.set_text("Parsing PDF…")
+        status_label.set_text("Uploading PDF…")
         status_indicator.set_visibility(True)
 
         try:
-            # Long timeout for PDF processing and Pinecone indexing
-            async with httpx.AsyncClient(timeout=120.0) as client:
+            async with httpx.AsyncClient(timeout=30.0) as client:
                 resp = await client.post(
                     f"{API_BASE}/upload/pdf",
                     files={"file": (filename, e.file._data, "application/pdf")},
                 )
 
+                if resp.status_code != 200:
+                    status_indicator.set_visibility(False)
+                    status_label.set_text(f"Failed: {filename}")
+                    error_msg = resp.json().get("detail", "PDF upload failed")
+                    ui.notify(f"Upload failed: {error_msg}", type="negative")
+                    return
+
+                upload = resp.json()
+                if upload.get("duplicate"):
+                    status_indicator.set_visibility(False)
+                    status_label.set_text(f"Ready: {filename}")
+                    ui.notify(f"{filename} already indexed", type="info")
+                    return
+
+                status_label.set_text(f"Indexing: {filename}")
+                job = await self.wait_for_ingestion(client, upload["job_id"])
+
             status_indicator.set_visibility(False)
 
-            if resp.status_code != 200:
+            if job["status"] != "completed":
                 status_label.set_text(f"Failed: {filename}")
-                error_msg = resp.json().get("detail", "PDF indexing failed") if resp.status_code != 200 else "Unknown error"
-                ui.notify(f"Upload failed: {error_msg}", type="negative")
+                ui.notify(f"Indexing failed: {job.get('error') or 'Unknown error'}", type="negative")
                 return
 
             status_label.set_text(f"Ready: {filename}")
@@ -103,6 +147,63 @@ class DocumentQA:
             status_label.set_text(f"Error: {filename}")
             ui.notify(f"Upload error: {str(ex)}", type="negative")
 
+    async def follow_batch(self, client: httpx.AsyncClient, batch_id: str) -> dict:
+        """Batch progress stream, follow it I do. The final counts, return I will."""
+        counts: dict = {}
+        event = None
+        async with client.stream("GET", f"{API_BASE}/batches/{batch_id}/events", timeout=None) as resp:
+            async for line in resp.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: ") and event in ("progress", "done"):
+                    counts = json.loads(line[len("data: "):])
+                    finished = counts["completed"] + counts["failed"]
+                    status_label.set_text(f"Indexing: {finished}/{counts['total']} files")
+        return counts
+
+    async def handle_multi_upload(self, e: events.MultiUploadEventArguments):
+        """Many files or a zip, in one request sent they are. One progress stream, the whole batch has."""
+        if len(e.files) == 1 and e.files[0].name.lower().endswith(".pdf"):
+            await self.handle_upload(events.UploadEventArguments(sender=e.sender, client=e.client, file=e.files[0]))
+            return
+
+        ui.notify(f"Uploading {len(e.files)} files…", type="info")
+        status_label.set_text("Uploading files…")
+        status_indicator.set_visibility(True)
+
+        try:
+            async with httpx.AsyncClient(timeout=300.0) as client:
+                resp = await client.post(
+                    f"{API_BASE}/upload/batch",
+                    files=[("files", (f.name, await f.read(), f.content_type)) for f in e.files],
+                )
+                if resp.status_code != 200:
+                    status_indicator.set_visibility(False)
+                    status_label.set_text("Batch upload failed")
+                    ui.notify(f"Upload failed: {resp.json().get('detail', 'Batch upload failed')}", type="negative")
+                    return
+
+                batch = resp.json()
+                counts = await self.follow_batch(client, batch["batch_id"]) if batch["queued"] else {}
+
+            status_indicator.set_visibility(False)
+            failed = counts.get("failed", 0) + batch["rejected"]
+            status_label.set_text(f"Ready: {counts.get('completed', 0) + batch['duplicates']} files")
+            if failed:
+                ui.notify(f"{failed} files could not be indexed", type="warning")
+            else:
+                ui.notify("Batch indexing complete", type="positive", icon="check")
+
+            await self.render_uploaded_files()
+        except httpx.TimeoutException:
+            status_indicator.set_visibility(False)
+            status_label.set_text("Timeout: batch upload")
+            ui.notify("Upload timed out. Files may be processing. Please check later.", type="warning")
+        except Exception as ex:
+            status_indicator.set_visibility(False)
+            status_label.set_text("Error: batch upload")
+            ui.notify(f"Upload error: {str(ex)}", type="negative")
+
     def on_delete_clicked(self, document_id: str, file_name: str):
         async def task():
             async with httpx.AsyncClient() as client:
@@ -135,7 +236,8 @@ class DocumentQA:
                         }},
                         body: JSON.stringify({{
                             q: {repr(prompt)},
-                            session_id: {repr(self.session_id)}
+                            session_id: {repr(self.session_id)},
+                            format: 'sse'
                         }})
                     }});
 
@@ -145,6 +247,7 @@ class DocumentQA:
                     const decoder = new TextDecoder();
 
                     let fullText = '';
+                    let buffer = '';
                     let exploring = false;
                     let jigInterval = null;
 
@@ -167,30 +270,47 @@ class DocumentQA:
                         }}
                     }}
 
-                    while (true) {{
-                        const {{ value, done }} = await reader.read();
-                        if (done) break;
-
-                        const chunk = decoder.decode(value, {{ stream: true }});
-
-                        // Detect tool-call chunk
-                        if (chunk.includes('< Exploring >')) {{
+                    function handleEvent(type, data) {{
+                        if (type === 'retrieval' && data.status === 'searching') {{
                             if (!exploring) {{
                                 exploring = true;
                                 startJigJag();
                             }}
-                            continue;
-                        }}
-
-                        // First real response chunk
-                        if (exploring) {{
+                        }} else if (type === 'token') {{
+                            // First real response token
+                            if (exploring) {{
+                                stopJigJag();
+                                exploring = false;
+                                el.innerText = '';
+                            }}
+                            fullText += data.text;
+                            el.innerHTML = marked.parse(fullText);
+                        }} else if (type === 'error') {{
                             stopJigJag();
-                            exploring = false;
-                            el.innerText = '';
+                            el.innerText = 'Error: ' + data.message;
                         }}
+                    }}
+
+                    while (true) {{
+                        const {{ value, done }} = await reader.read();
+                        if (done) break;
+
+                        buffer += decoder.decode(value, {{ stream: true }});
+
+                        // Complete SSE frames only, split on blank lines
+                        let boundary;
+                        while ((boundary = buffer.indexOf('\\n\\n')) !== -1) {{
+                            const frame = buffer.slice(0, boundary);
+                            buffer = buffer.slice(boundary + 2);
 
-                        fullText += chunk;
-                        el.innerHTML = marked.parse(fullText);
+                            let type = 'message';
+                            let data = '';
+                            for (const line of frame.split('\\n')) {{
+                                if (line.startsWith('event: ')) type = line.slice(7);
+                                else if (line.startsWith('data: ')) data += line.slice(6);
+                            }}
+                            if (data) handleEvent(type, JSON.parse(data));
+                        }}
                     }}
 
                     stopJigJag();
@@ -280,11 +400,12 @@ with ui.left_drawer(fixed=False).classes(
         "w-full border-dashed border-2 bg-transparent p-4 items-center text-center"
     ):
         ui.upload(
-            label="Upload PDF Source",
-            on_upload=lambda e: app_logic.handle_upload(e),
+            label="Upload PDF Sources",
+            on_multi_upload=lambda e: app_logic.handle_multi_upload(e),
+            multiple=True,
             auto_upload=True,
         ).props(
-            "flat bordered color=primary accept=.pdf"
+            "flat bordered color=primary accept=.pdf,.zip"
         ).classes("w-full")
 
     ui.markdown("---")
@@ -1,26 +1,101 @@
 import os
+import json
+import asyncio
 from fastapi import (
     FastAPI,
     UploadFile,
     File,
     HTTPException,
     Path,
-    Query
+    Query,
+    Request,
 )
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime
-from agent_config.file_store import init_file_table, list_uploaded_files, delete_uploaded_file
-from agent_config.document import handle_pdf_upload ,handle_delete_pdf
-from agent_config.agent import get_response_stream
-from .schemas import UploadedFile, FileListResponse, ChatStreamParams, FileUploadResponse
+from uuid import uuid4
+from agent_config.db import db, pool
+from agent_config.maintenance import SESSION_MAINTENANCE_ENABLED, session_maintenance_loop
+from agent_config.pdf_reader import shutdown_pdf_pool
+from agent_config.file_store import init_file_table, list_uploaded_files_page, get_file_record, get_corpus_stats
+from agent_config.document import (
+    FileTooLargeError,
+    EmptyDocumentError,
+    stage_pdf_file,
+    stage_zip_archive,
+    discard_staged_upload,
+    ingest_pdf_job,
+    ingest_pdf_batch,
+    revise_pdf,
+    handle_delete_pdf,
+    find_duplicate_upload,
+)
+from agent_config.jobs import (
+    IngestionQueue,
+    JobStatus,
+    init_job_table,
+    create_job,
+    get_job,
+    list_batch_jobs,
+    summarize_batch,
+)
+from agent_config.agent import (
+    aget_response_stream,
+    aget_response_events,
+    cache_stats,
+    drain_history_summaries,
+    warm_up_agent,
+)
+from .schemas import (
+    UploadedFile,
+    FileListResponse,
+    ChatStreamParams,
+    FileUploadResponse,
+    JobStatusResponse,
+    BatchFileResult,
+    BatchUploadResponse,
+    FileRevisionResponse,
+    CorpusStatsResponse,
+)
 from dotenv import load_dotenv
 load_dotenv()
 app = FastAPI()
 
 MAX_FILE_SIZE_MB = 10
 MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
+# Multipart boundaries and part headers, on top of the file they come.
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+MAX_BATCH_UPLOAD_MB = int(os.getenv("MAX_BATCH_UPLOAD_MB", "512"))
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "2000"))
+# Members of one zip, together at most this much once uncompressed; counted as they stream, the bytes are.
+MAX_ZIP_UNCOMPRESSED_MB = int(os.getenv("MAX_ZIP_UNCOMPRESSED_MB", "1024"))
+BATCH_POLL_SECONDS = 0.5
+
+
+def file_too_large_detail() -> str:
+    return f"File too large. Max {MAX_FILE_SIZE_MB} MB allowed"
+
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    # Before the body is read, a declared oversized upload is refused.
+    limits = {
+        "/upload/pdf": (MAX_FILE_SIZE_BYTES + MULTIPART_OVERHEAD_BYTES, file_too_large_detail()),
+        "/upload/batch": (MAX_BATCH_UPLOAD_MB * 1024 * 1024, f"Batch too large. Max {MAX_BATCH_UPLOAD_MB} MB allowed"),
+    }
+    path = request.url.path
+    # A revised document, the single-file limit it shares.
+    if request.method == "PUT" and path.startswith("/files/"):
+        path = "/upload/pdf"
+    if request.method in ("POST", "PUT") and path in limits:
+        limit, detail = limits[path]
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > limit:
+            return JSONResponse(status_code=413, content={"detail": detail})
+    return await call_next(request)
+
 
+# Added last, outermost CORS is; on early 413s too, its headers it sets.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=os.getenv('ALLOW_ORIGINS').split(' '),
@@ -29,9 +104,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+ingestion_queue = IngestionQueue(handler=ingest_pdf_job, batch_handler=ingest_pdf_batch)
+background_tasks: set[asyncio.Task] = set()
+
+
 @app.on_event("startup")
 async def startup():
     init_file_table()
+    init_job_table()
+    ingestion_queue.resume_pending()
+    asyncio.create_task(warm_up_agent())
+    if SESSION_MAINTENANCE_ENABLED:
+        # Idle sessions expired and archived, the database compacted, periodically.
+        background_tasks.add(asyncio.create_task(session_maintenance_loop()))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    for task in background_tasks:
+        task.cancel()
+    await drain_history_summaries()
+    # Sessions written behind, flushed to the durable tier before exit they are.
+    await asyncio.to_thread(db.close)
+    ingestion_queue.shutdown()
+    shutdown_pdf_pool()
+    pool.close()
 
 
 @app.get(
@@ -39,9 +136,15 @@ async def startup():
     response_model=FileListResponse,
     summary="List uploaded documents",
 )
-def get_uploaded_files():
-    files = list_uploaded_files()
-    return {"files": files}
+def get_uploaded_files(
+    limit: int | None = Query(None, ge=1, le=500, description="Page size; all files when omitted"),
+    cursor: str | None = Query(None, description="next_cursor from the previous page"),
+    prefix: str | None = Query(None, description="Case-insensitive file name prefix"),
+):
+    try:
+        return list_uploaded_files_page(limit=limit, cursor=cursor, prefix=prefix)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @app.post(
@@ -56,73 +159,295 @@ async def upload_pdf(file: UploadFile = File(...)):
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
 
-    content = await file.read()
-
-    if not content:
-        raise HTTPException(status_code=400, detail="Empty file")
+    # Spooled to disk by the multipart parser, the upload already is. In chunks, copied and hashed it is now.
+    try:
+        staged = await asyncio.to_thread(
+            stage_pdf_file,
+            file.filename,
+            file.file,
+            MAX_FILE_SIZE_BYTES,
+        )
+    except FileTooLargeError:
+        raise HTTPException(status_code=413, detail=file_too_large_detail())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        await file.close()
 
-    if len(content) > MAX_FILE_SIZE_BYTES:
-        raise HTTPException(
-            status_code=413,
-            detail=f"File too large. Max {MAX_FILE_SIZE_MB} MB allowed",
+    duplicate = find_duplicate_upload(file.filename, staged["content_hash"])
+    if duplicate:
+        discard_staged_upload(staged)
+        return FileUploadResponse(
+            success=True,
+            file=UploadedFile(
+                file_name=duplicate["file_name"],
+                file_path=duplicate["file_path"],
+                namespace=duplicate["document_id"],
+                created_at=None,
+            ),
+            status=JobStatus.COMPLETED.value,
+            duplicate=True,
         )
 
-    result = handle_pdf_upload(
-        file_name=file.filename,
-        content=content,
-    )
+    job_id = create_job(**staged)
+    ingestion_queue.submit(job_id)
 
     uploaded_file = UploadedFile(
         file_name=file.filename,
-        file_path=result["file_path"],
-        namespace=result.get("namespace", "default"),
+        file_path=staged["file_path"],
+        namespace=staged["document_id"],
         created_at=datetime.utcnow().isoformat(),
     )
 
     return FileUploadResponse(
         success=True,
         file=uploaded_file,
+        job_id=job_id,
+        status=JobStatus.PENDING.value,
+    )
+
+
+def stage_batch_file(file: UploadFile, max_files: int = MAX_BATCH_FILES) -> list[dict]:
+    name = file.filename or ""
+    if max_files <= 0:
+        return [{"file_name": name, "error": f"Too many files. Max {MAX_BATCH_FILES} allowed"}]
+    if name.lower().endswith(".zip"):
+        return stage_zip_archive(file.file, MAX_FILE_SIZE_BYTES, max_files, MAX_ZIP_UNCOMPRESSED_MB * 1024 * 1024)
+    if not name.lower().endswith(".pdf"):
+        return [{"file_name": name, "error": "Only PDF or zip files are allowed"}]
+    try:
+        return [stage_pdf_file(name, file.file, MAX_FILE_SIZE_BYTES)]
+    except FileTooLargeError:
+        return [{"file_name": name, "error": file_too_large_detail()}]
+    except ValueError as e:
+        return [{"file_name": name, "error": str(e)}]
+
+
+@app.post(
+    "/upload/batch",
+    response_model=BatchUploadResponse,
+    summary="Upload many PDFs or zip archives",
+)
+async def upload_batch(files: list[UploadFile] = File(...)):
+    batch_id = f"batch_{uuid4().hex}"
+    results: list[BatchFileResult] = []
+    job_ids: list[str] = []
+    # Same bytes twice in one batch, indexed once they are.
+    seen: dict[str, str] = {}
+
+    for file in files:
+        try:
+            # Before staging, the remaining room in the batch checked is.
+            staged_files = await asyncio.to_thread(stage_batch_file, file, MAX_BATCH_FILES - len(job_ids))
+        except ValueError as e:
+            staged_files = [{"file_name": file.filename or "", "error": str(e)}]
+        finally:
+            await file.close()
+
+        for staged in staged_files:
+            if "error" in staged:
+                results.append(BatchFileResult(file_name=staged["file_name"], status="rejected", error=staged["error"]))
+                continue
+
+            duplicate = find_duplicate_upload(staged["file_name"], staged["content_hash"])
+            document_id = duplicate["document_id"] if duplicate else seen.get(staged["content_hash"])
+            if document_id:
+                discard_staged_upload(staged)
+                results.append(BatchFileResult(
+                    file_name=staged["file_name"],
+                    status=JobStatus.COMPLETED.value,
+                    document_id=document_id,
+                    duplicate=True,
+                ))
+                continue
+
+            job_id = create_job(**staged, batch_id=batch_id)
+            job_ids.append(job_id)
+            seen[staged["content_hash"]] = staged["document_id"]
+            results.append(BatchFileResult(
+                file_name=staged["file_name"],
+                status=JobStatus.PENDING.value,
+                document_id=staged["document_id"],
+                job_id=job_id,
+            ))
+
+    ingestion_queue.submit_batch(job_ids)
+
+    return BatchUploadResponse(
+        batch_id=batch_id,
+        files=results,
+        queued=len(job_ids),
+        duplicates=sum(result.duplicate for result in results),
+        rejected=sum(result.status == "rejected" for result in results),
+    )
+
+
+def batch_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def batch_progress_events(batch_id: str, poll_seconds: float = BATCH_POLL_SECONDS):
+    """Finished files one by one, and the batch counts whenever they change, streamed they are."""
+    reported: set[str] = set()
+    last_counts = None
+    while True:
+        jobs = await asyncio.to_thread(list_batch_jobs, batch_id)
+        for job in jobs:
+            if job["id"] not in reported and job["status"] in (JobStatus.COMPLETED.value, JobStatus.FAILED.value):
+                reported.add(job["id"])
+                yield batch_event("file", job)
+
+        counts = summarize_batch(jobs)
+        if counts != last_counts:
+            last_counts = counts
+            yield batch_event("progress", counts)
+
+        if counts[JobStatus.PENDING.value] + counts[JobStatus.RUNNING.value] == 0:
+            yield batch_event("done", counts)
+            return
+        await asyncio.sleep(poll_seconds)
+
+
+@app.get(
+    "/batches/{batch_id}/events",
+    summary="Stream batch ingestion progress",
+)
+def get_batch_events(batch_id: str = Path(..., description="Upload batch ID")):
+    if not list_batch_jobs(batch_id):
+        raise HTTPException(
+            status_code=404,
+            detail="Batch not found",
+        )
+
+    return StreamingResponse(
+        batch_progress_events(batch_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get(
+    "/jobs/{job_id}",
+    response_model=JobStatusResponse,
+    summary="Get ingestion job status",
+)
+def get_job_status(job_id: str = Path(..., description="Ingestion job ID")):
+    job = get_job(job_id)
+
+    if not job:
+        raise HTTPException(
+            status_code=404,
+            detail="Job not found",
+        )
+
+    return JobStatusResponse(
+        job_id=job["id"],
+        document_id=job["document_id"],
+        file_name=job["file_name"],
+        status=job["status"],
+        error=job["error"],
+        attempts=job["attempts"],
+        timings=job["timings"],
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
     )
 
 
 @app.delete(
     "/files/{document_id}",
-    summary="Delete uploaded file (DB + disk + Pinecone)",
+    summary="Delete uploaded file (DB + disk + vector store)",
 )
 def delete_file(
     document_id: str = Path(..., description="Document ID"),
-    file_name: str = Query(..., description="Original file name"),
+    file_name: str | None = Query(None, description="Original file name (unused, kept for older clients)"),
 ):
-    file_deleted = delete_uploaded_file(document_id)
+    record = get_file_record(document_id)
 
-    if not file_deleted:
+    if not record:
         raise HTTPException(
             status_code=404,
             detail="File not found",
         )
 
-    pinecone_deleted = handle_delete_pdf(file_name)
-
-    if not pinecone_deleted:
+    # By the document's own chunk IDs the vectors go; same-named files, untouched they stay.
+    if not handle_delete_pdf(document_id):
         raise HTTPException(
-            status_code=404,
-            detail="File not found",
+            status_code=500,
+            detail="Delete failed",
         )
 
     return {
         "success": True,
         "document_id": document_id,
-        "file_name": file_name,
-        "message": f"{file_name} deleted successfully",
+        "file_name": record["file_name"],
+        "message": f"{record['file_name']} deleted successfully",
     }
 
 
+@app.get(
+    "/stats",
+    response_model=CorpusStatsResponse,
+    summary="Corpus statistics from the chunk manifest, and this worker's cache counters",
+)
+def get_stats():
+    return CorpusStatsResponse(**get_corpus_stats(), caches=cache_stats())
+
+
+@app.put(
+    "/files/{document_id}",
+    response_model=FileRevisionResponse,
+    summary="Replace a document with a revised version",
+)
+async def revise_file(
+    document_id: str = Path(..., description="Document ID"),
+    file: UploadFile = File(...),
+):
+    if not file.filename or not file.filename.lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+
+    if not get_file_record(document_id):
+        await file.close()
+        raise HTTPException(status_code=404, detail="File not found")
+
+    try:
+        staged = await asyncio.to_thread(stage_pdf_file, file.filename, file.file, MAX_FILE_SIZE_BYTES)
+    except FileTooLargeError:
+        raise HTTPException(status_code=413, detail=file_too_large_detail())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        await file.close()
+
+    try:
+        # Only changed chunks embedded are; in the request, done it is.
+        revision = await asyncio.to_thread(revise_pdf, document_id, staged["file_path"], staged["content_hash"])
+    except KeyError:
+        discard_staged_upload(staged)
+        raise HTTPException(status_code=404, detail="File not found")
+    except EmptyDocumentError as e:
+        discard_staged_upload(staged)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        discard_staged_upload(staged)
+        print(f"revising {document_id} failed :", str(e))
+        raise HTTPException(status_code=500, detail="Revision failed")
+
+    return FileRevisionResponse(success=True, **revision)
+
+
 @app.post(
     "/chat/stream",
     summary="Stream chat response",
 )
-def chat_stream(params: ChatStreamParams):
+async def chat_stream(params: ChatStreamParams):
+    if params.format == "sse":
+        return StreamingResponse(
+            aget_response_events(params.q, params.session_id, params.document_ids),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
     return StreamingResponse(
-        get_response_stream(params.q, params.session_id),
+        aget_response_stream(params.q, params.session_id, params.document_ids),
         media_type="text/plain",
     )
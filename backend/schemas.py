@@ -1,6 +1,6 @@
 # backend/schemas.py
 from pydantic import BaseModel
-from typing import Optional
+from typing import Literal, Optional
 
 class UploadedFile(BaseModel):
     file_name: str
@@ -11,10 +11,58 @@ class UploadedFile(BaseModel):
 class FileUploadResponse(BaseModel):
     success: bool
     file: UploadedFile
+    job_id: Optional[str] = None
+    status: Optional[str] = None
+    duplicate: bool = False
+
+class FileRevisionResponse(BaseModel):
+    success: bool
+    document_id: str
+    file_name: str
+    added: int
+    removed: int
+    unchanged: int
+
+class CorpusStatsResponse(BaseModel):
+    documents: int
+    indexed_documents: int
+    chunks: int
+    tokens: int
+    # Per process counters; each worker its own reports.
+    caches: dict[str, Optional[dict[str, int]]] = {}
+
+class BatchFileResult(BaseModel):
+    file_name: str
+    status: str
+    document_id: Optional[str] = None
+    job_id: Optional[str] = None
+    duplicate: bool = False
+    error: Optional[str] = None
+
+class BatchUploadResponse(BaseModel):
+    batch_id: str
+    files: list[BatchFileResult]
+    queued: int
+    duplicates: int
+    rejected: int
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    document_id: str
+    file_name: str
+    status: str
+    error: Optional[str] = None
+    attempts: int
+    timings: Optional[dict[str, float]] = None
+    created_at: str
+    updated_at: str
 
 class FileListResponse(BaseModel):
     files: list[UploadedFile]
+    next_cursor: Optional[str] = None
 
 class ChatStreamParams(BaseModel):
     q: str
     session_id: str
+    format: Literal["text", "sse"] = "text"
+    document_ids: Optional[list[str]] = None
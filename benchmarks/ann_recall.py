@@ -0,0 +1,89 @@
+"""
+Recall and latency of the local IVF index against exact search, this benchmark measures.
+Synthetic clustered embeddings it uses; no API key it needs.
+
+    python -m benchmarks.ann_recall --rows 100000 --dim 256 --queries 200
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from agno.knowledge.document import Document
+
+from agent_config.local_vectordb import LocalVectorDb
+
+
+def synthetic_vectors(rows: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=rows)
+    return centers[labels] + 0.35 * rng.standard_normal((rows, dim)).astype(np.float32)
+
+
+def load_store(store: LocalVectorDb, vectors: np.ndarray, batch: int = 5000) -> None:
+    for start in range(0, len(vectors), batch):
+        documents = [
+            Document(content=f"chunk {i}", id=f"chunk_{i}", meta_data={"document_id": f"doc_{i // 50}"}, embedding=v.tolist())
+            for i, v in enumerate(vectors[start : start + batch], start=start)
+        ]
+        store.insert(f"hash_{start}", documents)
+
+
+def measure(store: LocalVectorDb, queries: np.ndarray, k: int, nprobe: int | None) -> tuple[list[list[int]], list[float]]:
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = store.search_vector(query, limit=k, nprobe=nprobe)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([row for row, _ in hits])
+    return results, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = synthetic_vectors(args.rows, args.dim, args.clusters, rng)
+    queries = vectors[rng.choice(args.rows, size=args.queries, replace=False)]
+    queries = queries + 0.1 * rng.standard_normal(queries.shape).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LocalVectorDb(
+            name="bench",
+            dimension=args.dim,
+            path=Path(tmp) / "vectors",
+            index_type="flat",
+            initial_capacity=args.rows,
+        )
+        start = time.perf_counter()
+        load_store(store, vectors)
+        print(f"loaded {args.rows} x {args.dim} vectors in {time.perf_counter() - start:.1f}s")
+
+        exact, exact_ms = measure(store, queries, args.k, None)
+
+        store.index_type = "ivf"
+        store.ann_min_rows = 0
+        start = time.perf_counter()
+        store.rebuild_index()
+        print(f"trained IVF with nlist={store._ivf.nlist} in {time.perf_counter() - start:.1f}s\n")
+
+        print(f"{'mode':<14} {'recall@' + str(args.k):>10} {'p50 ms':>9} {'p99 ms':>9}")
+        print(f"{'exact':<14} {1.0:>10.3f} {np.percentile(exact_ms, 50):>9.3f} {np.percentile(exact_ms, 99):>9.3f}")
+        for nprobe in args.nprobe:
+            approx, approx_ms = measure(store, queries, args.k, nprobe)
+            recall = np.mean([len(set(a) & set(e)) / max(len(e), 1) for a, e in zip(approx, exact)])
+            label = f"ivf nprobe={nprobe}"
+            print(f"{label:<14} {recall:>10.3f} {np.percentile(approx_ms, 50):>9.3f} {np.percentile(approx_ms, 99):>9.3f}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Wall time of serial versus process-pool PDF page extraction, this benchmark measures.
+A synthetic text PDF it writes; no API key it needs. On one core, faster nothing gets.
+
+    python -m benchmarks.pdf_parse --pages 500 --workers 1 2 4
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from agno.knowledge.reader.pdf_reader import PDFReader
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+from agent_config.pdf_reader import ParallelPDFReader, shutdown_pdf_pool
+
+
+def make_text_pdf(path: Path, pages: int, lines: int = 40) -> None:
+    writer = PdfWriter()
+    font = writer._add_object(
+        DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/Font"),
+                NameObject("/Subtype"): NameObject("/Type1"),
+                NameObject("/BaseFont"): NameObject("/Helvetica"),
+            }
+        )
+    )
+    for number in range(1, pages + 1):
+        page = writer.add_blank_page(612, 792)
+        body = "".join(
+            f"BT /F1 10 Tf 50 {750 - 16 * i} Td (Page {number} line {i} clause {number}.{i} lorem ipsum dolor) Tj ET\n"
+            for i in range(lines)
+        )
+        stream = DecodedStreamObject()
+        stream.set_data(body.encode())
+        page[NameObject("/Contents")] = writer._add_object(stream)
+        page[NameObject("/Resources")] = DictionaryObject({NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})})
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def timed_read(reader, path: Path) -> tuple[float, int]:
+    start = time.perf_counter()
+    documents = reader.read(path)
+    return time.perf_counter() - start, len(documents)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.pdf"
+        make_text_pdf(path, args.pages)
+        print(f"{args.pages} pages, {os.cpu_count()} cpus\n")
+
+        serial_s, chunks = timed_read(PDFReader(), path)
+        print(f"{'reader':<16} {'seconds':>9} {'speedup':>8} {'chunks':>7}")
+        print(f"{'serial':<16} {serial_s:>9.2f} {1.0:>8.2f} {chunks:>7}")
+        for workers in args.workers:
+            reader = ParallelPDFReader(workers=workers, min_pages=1)
+            # Warmed the pool is first; spawning workers, a one-off cost it is.
+            timed_read(reader, path)
+            seconds, chunks = timed_read(reader, path)
+            shutdown_pdf_pool()
+            print(f"{f'workers={workers}':<16} {seconds:>9.2f} {serial_s / seconds:>8.2f} {chunks:>7}")
+
+
+if __name__ == "__main__":
+    main()
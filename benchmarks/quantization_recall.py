@@ -0,0 +1,88 @@
+"""
+Recall, memory and latency of quantized local vector search against exact float search, this benchmark measures.
+Scanned the codes are, then the shortlist by float vectors re-ranked; without re-ranking, recall also shown it is.
+
+    python -m benchmarks.quantization_recall --rows 100000 --dim 256 --queries 200
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from agent_config.local_vectordb import LocalVectorDb, normalize_rows
+
+from .ann_recall import load_store, measure, synthetic_vectors
+
+
+def recall(found: list[list[int]], exact: list[list[int]]) -> float:
+    return float(np.mean([len(set(f) & set(e)) / max(len(e), 1) for f, e in zip(found, exact)]))
+
+
+def codes_only(store: LocalVectorDb, queries: np.ndarray, k: int) -> list[list[int]]:
+    results = []
+    for query in normalize_rows(queries):
+        scores = store._quantizer.score(store._codes[: store._count], query)
+        top = np.argpartition(-scores, k - 1)[:k]
+        results.append(top[np.argsort(-scores[top])].tolist())
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--pq-subspaces", type=int, nargs="+", default=[0])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = synthetic_vectors(args.rows, args.dim, args.clusters, rng)
+    queries = vectors[rng.choice(args.rows, size=args.queries, replace=False)]
+    queries = queries + 0.1 * rng.standard_normal(queries.shape).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LocalVectorDb(
+            name="bench",
+            dimension=args.dim,
+            path=Path(tmp) / "vectors",
+            index_type="flat",
+            initial_capacity=args.rows,
+        )
+        load_store(store, vectors)
+        exact, exact_ms = measure(store, queries, args.k, None)
+        float_bytes = store.memory_usage()["float_bytes"]
+
+        print(f"{'mode':<22} {'bytes/vec':>10} {'ratio':>7} {'codes recall':>13} {'recall@' + str(args.k):>10} {'p50 ms':>9} {'p99 ms':>9}")
+        print(
+            f"{'float32':<22} {float_bytes // args.rows:>10} {1.0:>7.1f} {'-':>13} {1.0:>10.3f}"
+            f" {np.percentile(exact_ms, 50):>9.3f} {np.percentile(exact_ms, 99):>9.3f}"
+        )
+
+        modes = [("int8", 0)] + [("pq", m) for m in args.pq_subspaces]
+        for kind, subspaces in modes:
+            store.quantization, store.pq_subspaces, store.quant_min_rows = kind, subspaces, 0
+            store._quantizer = store._codes = None
+            start = time.perf_counter()
+            store.train_quantizer()
+            trained_s = time.perf_counter() - start
+            code_bytes = store.memory_usage()["code_bytes"]
+            raw = recall(codes_only(store, queries, args.k), exact)
+            for factor in args.rerank:
+                store.rerank_factor = factor
+                found, found_ms = measure(store, queries, args.k, None)
+                label = f"{kind}{f' m={store._quantizer.code_size}' if kind == 'pq' else ''} rerank={factor}"
+                print(
+                    f"{label:<22} {code_bytes // args.rows:>10} {float_bytes / code_bytes:>7.1f} {raw:>13.3f}"
+                    f" {recall(found, exact):>10.3f} {np.percentile(found_ms, 50):>9.3f} {np.percentile(found_ms, 99):>9.3f}"
+                )
+            print(f"  ({kind} trained and encoded in {trained_s:.1f}s)")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
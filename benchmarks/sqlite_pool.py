@@ -0,0 +1,124 @@
+"""
+Micro-benchmark for the file_store SQLite layer, this is.
+Per-call connections in rollback-journal mode, against the WAL pool it compares,
+while chat session writes into the same file keep coming.
+
+    python -m benchmarks.sqlite_pool --ops 500 --writers 4
+"""
+import argparse
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from statistics import quantiles
+from uuid import uuid4
+
+from agno.db.sqlite import SqliteDb
+from agno.session import AgentSession
+
+import agent_config.file_store as file_store
+from agent_config.db import ConnectionPool
+
+
+def legacy_get_conn_factory(path: Path):
+    def get_conn() -> sqlite3.Connection:
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        return conn
+    return get_conn
+
+
+def session_writer(session_db: SqliteDb, stop: threading.Event, counter: list[int]) -> None:
+    # Like the agent after every run, sessions it upserts.
+    session_id = f"bench_{uuid4().hex}"
+    while not stop.is_set():
+        try:
+            session_db.upsert_session(
+                AgentSession(session_id=session_id, agent_id="bench", created_at=int(time.time()))
+            )
+            counter[0] += 1
+        except Exception as e:
+            print("session write failed :", str(e))
+
+
+def timed(fn, ops: int) -> list[float]:
+    samples = []
+    for i in range(ops):
+        start = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(label: str, samples: list[float]) -> str:
+    p50, p95 = quantiles(samples, n=100)[49], quantiles(samples, n=100)[94]
+    return f"{label:<28} p50 {p50:7.3f} ms   p95 {p95:7.3f} ms   max {max(samples):8.3f} ms"
+
+
+def run(mode: str, ops: int, writers: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = Path(tmp) / "app.db"
+        if mode == "legacy":
+            get_conn = legacy_get_conn_factory(db_file)
+            pool = None
+        else:
+            pool = ConnectionPool(db_file)
+            get_conn = pool.connection
+        file_store.get_conn = get_conn
+        file_store.init_file_table()
+
+        # Created once up front, the session table is; racing on its DDL, the writers must not.
+        session_db = SqliteDb(db_file=str(db_file))
+        session_db.upsert_session(AgentSession(session_id="bench_warmup", agent_id="bench", created_at=int(time.time())))
+
+        stop = threading.Event()
+        counter = [0]
+        threads = [
+            threading.Thread(target=session_writer, args=(session_db, stop, counter), daemon=True)
+            for _ in range(writers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        errors = 0
+
+        def insert(i: int) -> None:
+            nonlocal errors
+            try:
+                file_store.save_file_record(f"file_{i}.pdf", f"/tmp/file_{i}.pdf", f"doc_{uuid4().hex}", uuid4().hex)
+            except sqlite3.OperationalError:
+                errors += 1
+
+        def list_files(_: int) -> None:
+            nonlocal errors
+            try:
+                file_store.list_uploaded_files()
+            except sqlite3.OperationalError:
+                errors += 1
+
+        insert_samples = timed(insert, ops)
+        list_samples = timed(list_files, ops)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        if pool is not None:
+            pool.close()
+
+        print(f"[{mode}] {writers} concurrent session writers, {counter[0]} session writes, {errors} errors")
+        print(summarize("  save_file_record", insert_samples))
+        print(summarize("  list_uploaded_files", list_samples))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=500)
+    parser.add_argument("--writers", type=int, default=4)
+    args = parser.parse_args()
+
+    for mode in ("legacy", "pooled"):
+        run(mode, args.ops, args.writers)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,9 +7,12 @@ import pytest
 import sqlite3
 import tempfile
 import shutil
+from dataclasses import dataclass
+from hashlib import sha256
 from pathlib import Path
 from typing import Generator
 import os
+from agno.knowledge.embedder import Embedder
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -46,6 +49,9 @@ def isolate_test_environment(monkeypatch, tmp_path):
         # Also patch file_store module
         monkeypatch.setattr("agent_config.file_store.get_conn", mock_get_conn)
         
+        # Ingestion jobs, same database they share
+        monkeypatch.setattr("agent_config.jobs.get_conn", mock_get_conn)
+        
         # Agno database, also override I must
         if hasattr(db_module, 'db') and hasattr(db_module.db, 'db_file'):
             monkeypatch.setattr(db_module.db, "db_file", str(test_db_path))
@@ -55,7 +61,27 @@ def isolate_test_environment(monkeypatch, tmp_path):
     # Upload directory, override I must
     try:
         import agent_config.document as doc_module
+        from agent_config.embedding_cache import EmbeddingCacheStore
         monkeypatch.setattr("agent_config.document.UPLOAD_DIR", test_upload_dir)
+        
+        # Embedding cache, on a temporary file it must live
+        monkeypatch.setattr(doc_module.embedder, "store", EmbeddingCacheStore(tmp_path / "embedding_cache.db"))
+    except ImportError:
+        pass
+
+    # Lexical index and local vectors, under the temporary path they live
+    try:
+        import agent_config.document as doc_module
+        from agent_config.local_vectordb import LocalVectorDb
+
+        monkeypatch.setattr("agent_config.lexical_index.LEXICAL_INDEX_PATH", tmp_path / "lexical.db")
+        monkeypatch.setattr("agent_config.local_vectordb.LOCAL_VECTOR_DIR", tmp_path / "vectors")
+        if doc_module.lexical_index is not None:
+            doc_module.lexical_index.close()
+            monkeypatch.setattr(doc_module.lexical_index, "path", tmp_path / "lexical.db")
+        if isinstance(doc_module.vector_db, LocalVectorDb):
+            doc_module.vector_db.close()
+            monkeypatch.setattr(doc_module.vector_db, "path", tmp_path / "vectors" / doc_module.vector_db.name)
     except ImportError:
         pass
     
@@ -65,6 +91,13 @@ def isolate_test_environment(monkeypatch, tmp_path):
     }
     
     # Cleanup, perform I must
+    try:
+        if doc_module.lexical_index is not None:
+            doc_module.lexical_index.close()
+        if isinstance(doc_module.vector_db, LocalVectorDb):
+            doc_module.vector_db.close()
+    except NameError:
+        pass
     try:
         if test_db_path.exists():
             test_db_path.unlink()
@@ -75,6 +108,42 @@ def isolate_test_environment(monkeypatch, tmp_path):
         pass  # Ignore cleanup errors
 
 
+@dataclass
+class OfflineEmbedder(Embedder):
+    """Deterministic vectors from the text, without the network I return."""
+    id: str = "offline-test"
+    dimensions: int = 1536
+
+    def _vector(self, text: str) -> list[float]:
+        seed = sha256(text.encode("utf-8")).digest()
+        return [seed[i % len(seed)] / 255.0 for i in range(self.dimensions)]
+
+    def get_embedding(self, text: str) -> list[float]:
+        return self._vector(text)
+
+    def get_embedding_and_usage(self, text: str):
+        return self._vector(text), None
+
+    async def async_get_embedding(self, text: str) -> list[float]:
+        return self._vector(text)
+
+    async def async_get_embedding_and_usage(self, text: str):
+        return self._vector(text), None
+
+    async def async_get_embeddings_batch_and_usage(self, texts: list[str]):
+        return [self._vector(text) for text in texts], [None] * len(texts)
+
+
+@pytest.fixture
+def offline_embedder(monkeypatch) -> OfflineEmbedder:
+    """Behind the chunk cache and the pipeline, an offline embedder put I do. The OpenAI API, called it is not."""
+    import agent_config.document as doc_module
+
+    offline = OfflineEmbedder()
+    monkeypatch.setattr(doc_module.embedder, "embedder", offline)
+    return offline
+
+
 @pytest.fixture
 def temp_db_path(tmp_path) -> Path:
     """Temporary database path, create I do. Clean up after test, I will."""
@@ -7,6 +7,7 @@ import pytest_check as check
 from fastapi.testclient import TestClient
 from pathlib import Path
 import os
+import time
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -20,10 +21,23 @@ def client(isolate_test_environment):
     from backend.main import app
     # Reinitialize file table in test database
     from agent_config.file_store import init_file_table
+    from agent_config.jobs import init_job_table
     init_file_table()
+    init_job_table()
     return TestClient(app)
 
 
+def wait_for_job(client, job_id: str, timeout: float = 120.0) -> dict:
+    """Ingestion job, wait for it I must. Completed or failed, return when it is."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.5)
+    pytest.fail(f"Job {job_id}, finish in time it did not")
+
+
 def create_minimal_pdf() -> bytes:
     """Minimal valid PDF with test content, create I do."""
     pdf_content = b"""%PDF-1.4
@@ -107,6 +121,9 @@ def test_upload_parse_query_answer_flow(client, sample_pdf_path):
     document_id = upload_data["file"]["namespace"]
     check.is_not_none(document_id, "Document ID, present it must be")
     
+    job = wait_for_job(client, upload_data["job_id"])
+    check.equal(job["status"], "completed", "Ingestion job, complete it must")
+    
     # Step 2: Verify file listed
     list_response = client.get("/files")
     check.equal(list_response.status_code, 200, "List files, success it must be")
@@ -165,6 +182,7 @@ def test_upload_minimal_pdf_then_query(client):
     check.equal(upload_response.status_code, 200, "Upload, success it must be")
     upload_data = upload_response.json()
     document_id = upload_data["file"]["namespace"]
+    wait_for_job(client, upload_data["job_id"])
     
     # Query about it
     session_id = "test-minimal-flow"
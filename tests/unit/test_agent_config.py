@@ -4,7 +4,7 @@ Verify that agent is properly configured, I must.
 """
 import pytest
 import pytest_check as check
-from agent_config.agent import agent, get_response_stream
+from agent_config.agent import agent, cache_stats, get_agent, get_response_stream, aget_response_stream, ChatEvent, ChatEventMapper, scope_filters
 from agent_config.db import db
 from agent_config.document import knowledge
 
@@ -17,6 +17,12 @@ def test_agent_initialized():
     check.is_not_none(agent.knowledge, "Knowledge base configured, it must be")
 
 
+def test_get_agent_reuses_instance():
+    """One agent per process, there must be. Rebuilt per request, it must not be."""
+    check.is_(get_agent(), agent, "Same agent instance, returned it must be")
+    check.is_(get_agent().model, agent.model, "Same model client, reused it must be")
+
+
 def test_agent_has_correct_settings():
     """Agent settings, correct they must be. Search knowledge and read history, enabled they should be."""
     check.equal(agent.search_knowledge, True, "Search knowledge enabled, it must be")
@@ -45,7 +51,7 @@ def test_get_response_stream_signature():
     
     check.is_in("query", params, "Query parameter, it must have")
     check.is_in("session_id", params, "Session ID parameter, it must have")
-    check.equal(len(params), 2, "Two parameters only, it should have")
+    check.equal(params[2:], ["document_ids"], "Optional document scope, the only other parameter it is")
 
 
 def test_get_response_stream_returns_iterator():
@@ -54,3 +60,92 @@ def test_get_response_stream_returns_iterator():
     stream = get_response_stream("test", "test-session")
     check.is_true(hasattr(stream, '__iter__'), "Iterator, it must be")
     check.is_true(hasattr(stream, '__next__'), "Next method, it must have")
+
+
+def test_aget_response_stream_is_async_generator():
+    """Async stream, an async generator it must be. Threadpool, it needs not."""
+    import inspect
+    check.is_true(inspect.isasyncgenfunction(aget_response_stream), "Async generator function, it must be")
+    params = list(inspect.signature(aget_response_stream).parameters.keys())
+    check.equal(params, ["query", "session_id", "document_ids"], "Query, session ID and scope, it must accept")
+
+
+def test_chat_event_mapper_emits_typed_events():
+    """Typed events, the mapper must emit. Markers in the text, no more."""
+    from agno.models.metrics import Metrics
+    from agno.models.response import ToolExecution
+    from agno.run.agent import RunCompletedEvent, RunContentEvent, ToolCallCompletedEvent, ToolCallStartedEvent
+
+    tool = ToolExecution(tool_call_id="call_1", tool_name="search_knowledge_base", tool_args={"query": "clause"})
+    mapper = ChatEventMapper()
+    events = []
+    for raw in [
+        ToolCallStartedEvent(tool=tool),
+        ToolCallCompletedEvent(tool=tool),
+        RunContentEvent(content="Hello"),
+        RunCompletedEvent(run_id="run_1", metrics=Metrics(input_tokens=10, output_tokens=2, total_tokens=12)),
+    ]:
+        events.extend(mapper.map(raw))
+
+    types = [event.event for event in events]
+    check.equal(types, ["tool_started", "retrieval", "tool_finished", "retrieval", "token", "done"])
+    check.equal(events[1].data["query"], "clause", "Retrieval query, reported it must be")
+    check.equal(events[4].data["text"], "Hello", "Token text, kept it must be")
+    check.equal(events[-1].data["usage"]["total_tokens"], 12, "Usage, in done it must be")
+    check.is_not_none(events[-1].data["timings"]["time_to_first_token_ms"], "First token timing, measured it is")
+
+
+def test_chat_event_mapper_reports_tokens_saved():
+    """Packed the search was, then in its retrieval event and in done the savings appear."""
+    from agno.models.response import ToolExecution
+    from agno.run.agent import RunCompletedEvent, ToolCallCompletedEvent
+
+    tool = ToolExecution(tool_call_id="call_1", tool_name="search_knowledge_base", tool_args={"query": "clause"})
+    packing = [{"query": "clause", "packed": 2, "tokens_retrieved": 90, "tokens_packed": 40, "tokens_saved": 50}]
+    mapper = ChatEventMapper(packing)
+
+    retrieval = mapper.map(ToolCallCompletedEvent(tool=tool))[1]
+    done = mapper.map(RunCompletedEvent(run_id="run_1"))[0]
+    check.equal(retrieval.data["tokens_saved"], 50, "Per query, the savings reported they must be")
+    check.is_not_in("query", retrieval.data, "The query, once only sent it is")
+    check.equal(done.data["context"], {"tokens_packed": 40, "tokens_saved": 50})
+
+
+def test_chat_event_to_sse_frame():
+    """One SSE frame per event. Event line, data line, blank line."""
+    frame = ChatEvent(event="token", data={"text": "a\nb"}).to_sse()
+    check.equal(frame, 'event: token\ndata: {"text": "a\\nb"}\n\n', "Newlines in data, escaped they must be")
+
+
+def test_document_scope_pushed_into_knowledge_filters(monkeypatch):
+    """Scoped the question is, as a metadata filter to the run the document IDs must go."""
+    import asyncio
+    from agent_config import agent as agent_module
+
+    captured = {}
+
+    async def fake_arun(query, **kwargs):
+        captured.update(kwargs)
+        return
+        yield
+
+    monkeypatch.setattr(agent, "arun", fake_arun)
+    monkeypatch.setattr(agent_module, "answer_cache", None)
+
+    async def drain():
+        return [text async for text in aget_response_stream("clause", "scoped-session", ["doc_b", "doc_a", "doc_b"])]
+
+    asyncio.run(drain())
+    check.equal(captured["knowledge_filters"], {"document_id": {"$in": ["doc_a", "doc_b"]}})
+    check.is_none(scope_filters([]), "Empty scope, the whole corpus it searches")
+
+
+def test_cache_stats_cover_every_cache():
+    """Each cache's counters, in one place reported they are; in a running deployment, visible then."""
+    stats = cache_stats()
+    check.equal(
+        set(stats),
+        {"chunk_embeddings", "query_embeddings", "embedding_requests", "answers", "retrieval", "context_packing", "sessions"},
+    )
+    check.equal(stats["retrieval"], knowledge.stats(), "From the live instances, read they are")
+    check.equal(stats["sessions"], db.cache_stats(), "The session tier, included it is")
@@ -0,0 +1,82 @@
+"""
+Unit tests for the answer cache, these are.
+Asked again the same question is, from cache the answer comes. Changed the corpus, forgotten it is.
+"""
+import asyncio
+import pytest
+import pytest_check as check
+from agent_config.answer_cache import AnswerCacheStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Answer cache on a temporary file, create I do."""
+    store = AnswerCacheStore(tmp_path / "answer_cache.db", threshold=0.95, ttl_seconds=60, max_entries=10)
+    yield store
+    store.close()
+
+
+def test_similar_query_hits(store):
+    """Nearly the same question, the cached answer it must find."""
+    store.put("v1", "What is clause 4.2?", [1.0, 0.0, 0.0], "Clause 4.2 covers refunds.")
+
+    hit = store.lookup("v1", [0.99, 0.05, 0.0])
+    check.is_not_none(hit, "Similar query, hit it must")
+    check.equal(hit["answer"], "Clause 4.2 covers refunds.", "Cached answer, returned it is")
+    check.equal(store.stats(), {"hits": 1, "misses": 0}, "Counters, correct they must be")
+
+
+def test_matrix_reloaded_after_put(store):
+    """Loaded once the matrix is; a new answer stored, seen at the next lookup it must be."""
+    check.is_none(store.lookup("v1", [1.0, 0.0, 0.0]), "Empty cache, miss it must")
+    store.put("v1", "q1", [0.0, 1.0, 0.0], "first")
+    store.put("v1", "q2", [1.0, 0.0, 0.0], "second")
+
+    hit = store.lookup("v1", [1.0, 0.0, 0.0])
+    check.equal(hit["answer"], "second", "The best of every row, one matmul finds")
+    check.is_none(store.lookup("v1", [1.0, 0.0]), "Another width, matched it is not")
+
+
+def test_dissimilar_query_misses(store):
+    """Different question, no answer it may borrow."""
+    store.put("v1", "What is clause 4.2?", [1.0, 0.0, 0.0], "Clause 4.2 covers refunds.")
+    check.is_none(store.lookup("v1", [0.0, 1.0, 0.0]), "Unrelated query, miss it must")
+
+
+def test_new_corpus_version_invalidates(store):
+    """Changed the corpus has, stale the old answers are."""
+    store.put("v1", "What is clause 4.2?", [1.0, 0.0, 0.0], "Old answer.")
+    check.is_none(store.lookup("v2", [1.0, 0.0, 0.0]), "Other corpus version, miss it must")
+
+    store.put("v2", "Another question?", [0.0, 1.0, 0.0], "New answer.")
+    check.is_none(store.lookup("v1", [1.0, 0.0, 0.0]), "Old version entries, pruned they are")
+
+
+def test_expired_entries_ignored(tmp_path):
+    """Past its TTL, an answer served must not be."""
+    store = AnswerCacheStore(tmp_path / "answer_cache.db", ttl_seconds=-1)
+    store.put("v1", "q", [1.0, 0.0], "a")
+    check.is_none(store.lookup("v1", [1.0, 0.0]), "Expired entry, miss it must")
+    store.close()
+
+
+def test_cached_answer_replays_through_stream(monkeypatch, store):
+    """Cache hit, through the normal stream replayed it is. The model, called it is not."""
+    import agent_config.agent as agent_module
+
+    async def fake_key(query, session_id):
+        return "v1", [1.0, 0.0, 0.0]
+
+    def fail_run(*args, **kwargs):
+        raise AssertionError("agent.arun, called it must not be")
+
+    store.put("v1", "What is clause 4.2?", [1.0, 0.0, 0.0], "Clause 4.2 covers refunds.")
+    monkeypatch.setattr(agent_module, "answer_cache", store)
+    monkeypatch.setattr(agent_module, "_answer_cache_key", fake_key)
+    monkeypatch.setattr(agent_module, "_record_cached_run", lambda *args: None)
+    monkeypatch.setattr(agent_module.agent, "arun", fail_run)
+
+    async def collect():
+        return [chunk async for chunk in agent_module.aget_response_stream("what is clause 4.2", "s1")]
+
+    check.equal("".join(asyncio.run(collect())), "Clause 4.2 covers refunds.", "Cached answer, streamed it is")
@@ -0,0 +1,53 @@
+"""
+Unit tests for the context packer, these are.
+Near duplicates dropped, relevant chunks first, and the token budget kept, verify I must.
+"""
+import pytest_check as check
+from agno.knowledge.document import Document
+
+from agent_config.context_packer import ContextPacker, collect_packing, drop_near_duplicates, hamming, rescore, simhash
+from agent_config.embedding_pipeline import estimate_tokens
+
+
+REFUND = "Refunds are issued within fourteen days of the return being received at our warehouse in good condition."
+
+
+def test_simhash_groups_near_identical_chunks():
+    """One word changed, close the fingerprints are. Different text, far apart."""
+    edited = REFUND.replace("fourteen", "fifteen")
+    other = "The warranty covers manufacturing defects for two years from the date of purchase by the customer."
+
+    check.less(hamming(simhash(REFUND), simhash(edited)), hamming(simhash(REFUND), simhash(other)))
+    documents = [Document(content=REFUND), Document(content=REFUND + " "), Document(content=other)]
+    check.equal([d.content for d in drop_near_duplicates(documents)], [REFUND, other], "The first copy, kept it is")
+
+
+def test_rescore_prefers_chunks_covering_rare_query_terms():
+    """The chunk naming what was asked, above a better-ranked one it must climb."""
+    documents = [Document(content="general shipping information"), Document(content="refund window is fourteen days")]
+    scores = rescore("refund window", documents)
+    check.greater(scores[1], scores[0], "Query terms covered, rewarded they must be")
+
+
+def test_pack_fits_budget_and_reports_savings():
+    """Within the budget packed, and the tokens saved per query recorded they must be."""
+    long_chunk = "refund " * 400
+    candidates = [
+        Document(content=REFUND),
+        Document(content=long_chunk),
+        Document(content=REFUND),
+        Document(content="Shipping takes a week to most regions."),
+    ]
+    packer = ContextPacker(token_budget=100, overfetch=2)
+
+    with collect_packing() as packing:
+        packed = packer.pack("when are refunds issued", candidates, limit=3)
+
+    check.equal([d.content for d in packed][0], REFUND, "Best chunk, first it must be")
+    check.is_not_in(long_chunk, [d.content for d in packed], "Over budget, the long chunk is")
+    check.less_equal(sum(estimate_tokens(d.content) for d in packed), 100, "Budget, kept it must be")
+    stats = packing[0]
+    check.equal((stats["candidates"], stats["duplicates"]), (4, 1), "Duplicate, counted it must be")
+    check.equal(stats["tokens_saved"], stats["tokens_retrieved"] - stats["tokens_packed"])
+    check.greater(stats["tokens_saved"], 0, "Tokens saved, reported they must be")
+    check.equal(packer.stats(), {"queries": 1, "tokens_saved": stats["tokens_saved"]})
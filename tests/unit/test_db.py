@@ -0,0 +1,65 @@
+"""
+Unit tests for the SQLite connection pool, these are.
+Reused connections, WAL journaling, and safe rollbacks, verify I must.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import pytest_check as check
+from agent_config.db import ConnectionPool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    """Small pool on a temporary file, create I do."""
+    pool = ConnectionPool(tmp_path / "pool.db", size=2)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+    yield pool
+    pool.close()
+
+
+def test_connection_is_reused(pool):
+    """Returned to the pool, the same connection handed out again it is."""
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    check.is_(first, second, "Same connection, reused it must be")
+
+
+def test_connection_uses_wal_and_normal_sync(pool):
+    """WAL journal and NORMAL sync, configured they must be."""
+    with pool.connection() as conn:
+        check.equal(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal", "WAL mode, it must use")
+        check.equal(conn.execute("PRAGMA synchronous").fetchone()[0], 1, "NORMAL sync, it must use")
+        check.greater(conn.execute("PRAGMA busy_timeout").fetchone()[0], 0, "Busy timeout, set it must be")
+
+
+def test_commit_on_success_rollback_on_error(pool):
+    """Success, committed it is. Exception, rolled back it is."""
+    with pool.connection() as conn:
+        conn.execute("INSERT INTO items (name) VALUES ('kept')")
+
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            conn.execute("INSERT INTO items (name) VALUES ('dropped')")
+            raise RuntimeError("boom")
+
+    with pool.connection() as conn:
+        names = [row["name"] for row in conn.execute("SELECT name FROM items")]
+    check.equal(names, ["kept"], "Only the committed row, remain it must")
+
+
+def test_pool_is_thread_safe(pool):
+    """Many threads, two connections only. Every insert, land it must."""
+    def insert(i):
+        with pool.connection() as conn:
+            conn.execute("INSERT INTO items (name) VALUES (?)", (f"item_{i}",))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(insert, range(100)))
+
+    with pool.connection() as conn:
+        count = conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+    check.equal(count, 100, "All inserts, committed they must be")
+    check.less_equal(pool._created, 2, "Beyond its size, the pool must not grow")
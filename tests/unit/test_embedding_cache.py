@@ -0,0 +1,133 @@
+"""
+Unit tests for the embedding cache, these are.
+Embedded once, a chunk must be. From disk after that, it comes.
+"""
+import asyncio
+from dataclasses import dataclass, field
+import pytest
+import pytest_check as check
+from agno.knowledge.embedder import Embedder
+from agent_config import embedding_cache
+from agent_config.embedding_cache import CachedEmbedder, EmbeddingCacheStore, QueryEmbeddingCache, normalize_text
+
+
+@dataclass
+class CountingEmbedder(Embedder):
+    """Counting embedder, calls it remembers. Network, it needs not."""
+    id: str = "counting-test"
+    dimensions: int = 3
+    calls: list = field(default_factory=list)
+
+    def get_embedding(self, text: str):
+        self.calls.append(text)
+        return [float(len(text)), 1.0, 0.0]
+
+    async def async_get_embedding(self, text: str):
+        return self.get_embedding(text)
+
+    def get_embedding_and_usage(self, text: str):
+        return self.get_embedding(text), {"total_tokens": 1}
+
+    async def async_get_embedding_and_usage(self, text: str):
+        return self.get_embedding_and_usage(text)
+
+    async def async_get_embeddings_batch_and_usage(self, texts):
+        return [self.get_embedding(t) for t in texts], [{"total_tokens": 1}] * len(texts)
+
+
+@pytest.fixture
+def cached_embedder(tmp_path):
+    """Cached embedder on a temporary file, create I do."""
+    store = EmbeddingCacheStore(tmp_path / "embedding_cache.db")
+    embedder = CachedEmbedder(embedder=CountingEmbedder(), store=store)
+    yield embedder
+    store.close()
+
+
+def test_normalize_text_collapses_whitespace():
+    """Whitespace differences, ignored they must be."""
+    check.equal(normalize_text("  Clause \n 4.2\tapplies "), "Clause 4.2 applies")
+
+
+def test_repeated_chunk_hits_cache(cached_embedder):
+    """Same chunk twice, embedded once it must be."""
+    first, _ = cached_embedder.get_embedding_and_usage("Clause 4.2 applies.")
+    second, usage = cached_embedder.get_embedding_and_usage("Clause  4.2 applies.")
+
+    check.equal(first, second, "Cached vector, identical it must be")
+    check.is_none(usage, "Cache hit, no usage it costs")
+    check.equal(len(cached_embedder.embedder.calls), 1, "One real call, there should be")
+    check.equal(cached_embedder.stats(), {"hits": 1, "misses": 1}, "Counters, correct they must be")
+
+
+def test_cache_survives_new_instance(tmp_path):
+    """On disk the cache lives. New embedder, old vectors it must see."""
+    path = tmp_path / "embedding_cache.db"
+    first = CachedEmbedder(embedder=CountingEmbedder(), store=EmbeddingCacheStore(path))
+    first.get_embedding_and_usage("Persistent paragraph.")
+    first.store.close()
+
+    second = CachedEmbedder(embedder=CountingEmbedder(), store=EmbeddingCacheStore(path))
+    second.get_embedding_and_usage("Persistent paragraph.")
+    check.equal(second.embedder.calls, [], "No real call after restart, there should be")
+    second.store.close()
+
+
+def test_batch_only_embeds_changed_chunks(cached_embedder):
+    """Revised document, only changed chunks it must pay for."""
+    asyncio.run(cached_embedder.async_get_embeddings_batch_and_usage(["intro", "terms"]))
+    vectors, _ = asyncio.run(
+        cached_embedder.async_get_embeddings_batch_and_usage(["intro", "terms v2", "terms"])
+    )
+
+    check.equal(len(vectors), 3, "Three vectors, returned they must be")
+    check.equal(cached_embedder.embedder.calls, ["intro", "terms", "terms v2"], "Only the new chunk, embedded it is")
+
+
+def test_query_embedding_not_persisted(cached_embedder):
+    """Query path, through it passes. The chunk cache, fill it must not."""
+    cached_embedder.get_embedding("what is clause 4.2?")
+    cached_embedder.get_embedding_and_usage("what is clause 4.2?")
+    check.equal(len(cached_embedder.embedder.calls), 2, "Not cached, the query was")
+
+
+def test_repeated_query_served_from_memory(cached_embedder):
+    """Same question again, embedded a second time it must not be."""
+    first = cached_embedder.get_embedding("what is clause 4.2?")
+    second = asyncio.run(cached_embedder.async_get_embedding("what is  clause 4.2?"))
+
+    check.equal(first, second, "Cached query vector, identical it must be")
+    check.equal(len(cached_embedder.embedder.calls), 1, "One real call, there should be")
+    stats = cached_embedder.query_cache.stats()
+    check.equal((stats["hits"], stats["misses"], stats["size"]), (1, 1, 1), "Query counters, correct they must be")
+
+
+def test_query_cache_evicts_lru_and_expires(monkeypatch):
+    """Beyond its size, the oldest used entry goes. After the TTL, stale it is."""
+    now = [1000.0]
+    monkeypatch.setattr(embedding_cache, "time", lambda: now[0])
+    cache = QueryEmbeddingCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    cache.get("a")
+    cache.put("c", [3.0])
+
+    check.is_none(cache.get("b"), "Least recently used, evicted it must be")
+    check.equal(cache.get("a"), [1.0], "Recently used, kept it must be")
+    check.equal(cache.stats()["evictions"], 1, "One eviction, counted it must be")
+
+    now[0] += 61
+    check.is_none(cache.get("c"), "Past its TTL, expired it must be")
+
+
+def test_query_cache_persists_when_given_a_path(tmp_path):
+    """With a path, a new process the cached query sees."""
+    path = tmp_path / "embedding_cache.db"
+    first = QueryEmbeddingCache(path=path)
+    first.put("key", [0.5, 0.25])
+    first.close()
+
+    second = QueryEmbeddingCache(path=path)
+    check.equal(second.get("key"), [0.5, 0.25], "From SQLite, restored the vector is")
+    check.equal(second.stats()["size"], 1, "Into memory, promoted it is")
+    second.close()
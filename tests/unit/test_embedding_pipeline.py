@@ -0,0 +1,135 @@
+"""
+Unit tests for the batched embedding pipeline, these are.
+Within the token budget batches stay; rate limited, back off and retry it must.
+"""
+import asyncio
+from dataclasses import dataclass, field
+
+import httpx
+import pytest
+import pytest_check as check
+from agno.knowledge.document import Document
+from agno.knowledge.embedder import Embedder
+from openai import APIConnectionError, RateLimitError
+
+from agent_config.embedding_cache import CachedEmbedder, EmbeddingCacheStore
+from agent_config.embedding_pipeline import EmbeddingPipeline, pack_batches, parse_duration, retry_delay
+
+
+def rate_limit_error(headers: dict) -> RateLimitError:
+    request = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+    response = httpx.Response(429, headers=headers, request=request)
+    return RateLimitError("Rate limit reached", response=response, body=None)
+
+
+@dataclass
+class BatchEmbedder(Embedder):
+    """Batches it records; the first few requests, rate limited they are."""
+    id: str = "batch-test"
+    dimensions: int = 2
+    batches: list = field(default_factory=list)
+    fail_first: int = 0
+    active: int = 0
+    peak: int = 0
+
+    async def async_get_embeddings_batch_and_usage(self, texts):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            if self.fail_first > 0:
+                self.fail_first -= 1
+                raise rate_limit_error({"retry-after-ms": "1"})
+            self.batches.append(list(texts))
+            return [[float(len(t)), 1.0] for t in texts], [{"total_tokens": len(texts)}] * len(texts)
+        finally:
+            self.active -= 1
+
+
+def test_pack_batches_respects_token_budget_and_item_cap():
+    """Over budget or over the cap, a new batch it must start. The order, kept it is."""
+    texts = ["a" * 40, "b" * 40, "c" * 40, "d", "e", "f"]
+
+    check.equal(pack_batches(texts, max_tokens=25, max_items=10), [[0, 1], [2, 3, 4, 5]])
+    check.equal(pack_batches(texts, max_tokens=1000, max_items=4), [[0, 1, 2, 3], [4, 5]])
+    check.equal(pack_batches(["x" * 400], max_tokens=10, max_items=4), [[0]], "Oversized text, alone it goes")
+
+
+def test_retry_delay_honours_rate_limit_headers():
+    """Retry-after and reset headers, obeyed they must be."""
+    check.equal(parse_duration("6m0s"), 360.0)
+    check.equal(parse_duration("20ms"), 0.02)
+    check.equal(retry_delay(rate_limit_error({"retry-after": "2"}), 0), 2.0)
+    check.equal(retry_delay(rate_limit_error({"x-ratelimit-reset-tokens": "1.5s"}), 0), 1.5)
+    check.less_equal(retry_delay(rate_limit_error({}), 3), 8.0, "Without headers, exponential backoff it is")
+
+
+def test_pipeline_retries_and_bounds_concurrency():
+    """Rate limited twice, still every chunk embedded must be. More than the limit in flight, never."""
+    embedder = BatchEmbedder(fail_first=2)
+    pipeline = EmbeddingPipeline(embedder, batch_tokens=10, max_items=2, concurrency=2, max_retries=3)
+    documents = [Document(content=f"chunk {i}") for i in range(8)]
+
+    sent = asyncio.run(pipeline.embed_documents(documents))
+
+    check.equal(sent, 8, "Every chunk, sent it must be")
+    check.equal(pipeline.retries, 2, "Both rate limits, retried they must be")
+    check.less_equal(embedder.peak, 2, "The concurrency limit, respected it must be")
+    check.is_true(all(len(batch) <= 2 for batch in embedder.batches), "The item cap, held it must be")
+    check.is_true(all(d.embedding == [7.0, 1.0] for d in documents), "Embedded in place, documents must be")
+
+
+def test_pipeline_gives_up_after_max_retries():
+    """Rate limited forever, the error raised it must be."""
+    pipeline = EmbeddingPipeline(BatchEmbedder(fail_first=10), max_retries=1)
+
+    with pytest.raises(RateLimitError):
+        asyncio.run(pipeline.embed_documents([Document(content="chunk")]))
+
+
+def test_pipeline_fills_chunk_cache(tmp_path):
+    """Embedded by the pipeline, from the cache the vector store's own step must read."""
+    store = EmbeddingCacheStore(tmp_path / "embedding_cache.db")
+    cached = CachedEmbedder(embedder=BatchEmbedder(), store=store, query_cache=None)
+    pipeline = EmbeddingPipeline(cached)
+
+    first = [Document(content="alpha"), Document(content="beta")]
+    asyncio.run(pipeline.embed_documents(first))
+    check.equal(len(cached._primed), 2, "For the vector store, the fresh vectors primed are")
+    pipeline.release(first)
+    again = [Document(content="alpha"), Document(content="gamma")]
+    sent = asyncio.run(pipeline.embed_documents(again))
+
+    check.equal(sent, 1, "Only the new chunk, sent it must be")
+    check.is_none(again[0].embedding, "Cached chunk, to the vector store left it is")
+    check.equal(cached.embedder.batches, [["alpha", "beta"], ["gamma"]])
+    vector, usage = cached.get_embedding_and_usage("alpha")
+    check.equal((vector, usage), ([5.0, 1.0], None), "From the cache, the vector must come")
+    check.equal(cached.get_embedding_and_usage("gamma")[0], [5.0, 1.0], "Primed, the fresh vector is")
+    check.equal(cached.stats(), {"hits": 1, "misses": 3}, "Each chunk, counted once only it must be")
+    check.equal(cached._primed, {}, "Once handed over, held no longer it is")
+    store.close()
+
+
+def test_pipeline_retries_connection_errors_then_fails(monkeypatch):
+    """A network blip, retried it is; unreachable the API stays, after a few attempts the error to the job goes."""
+    @dataclass
+    class Unreachable(BatchEmbedder):
+        failures: int = 0
+
+        async def async_get_embeddings_batch_and_usage(self, texts):
+            if self.failures:
+                self.failures -= 1
+                raise APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/embeddings"))
+            return await super().async_get_embeddings_batch_and_usage(texts)
+
+    monkeypatch.setattr("agent_config.embedding_pipeline.retry_delay", lambda error, attempt: 0.0)
+
+    blip = EmbeddingPipeline(Unreachable(failures=1), connect_retries=2)
+    check.equal(asyncio.run(blip.embed_documents([Document(content="chunk")])), 1, "After one blip, embedded it is")
+    check.equal(blip.retries, 1)
+
+    down = EmbeddingPipeline(Unreachable(failures=100), max_retries=6, connect_retries=2)
+    with pytest.raises(APIConnectionError):
+        asyncio.run(down.embed_documents([Document(content="chunk")]))
+    check.equal((down.requests, down.retries), (3, 2), "By connect_retries, not max_retries, bounded it is")
@@ -7,13 +7,18 @@ import pytest_check as check
 from pathlib import Path
 import sqlite3
 import tempfile
+from contextlib import closing
 from agent_config.file_store import (
     init_file_table,
     save_file_record,
     list_uploaded_files,
     delete_uploaded_file,
+    find_file_by_hash,
+    get_corpus_version,
+    update_file_version,
+    list_uploaded_files_page,
+    FILE_TABLE_MIGRATIONS,
 )
-from agent_config.db import get_conn
 
 
 @pytest.fixture
@@ -40,8 +45,8 @@ def test_init_file_table_creates_table(temp_db):
     """File table, create it I must. Schema correct, it should be."""
     init_file_table()
     
-    # Use get_conn to verify, I must
-    with get_conn() as conn:
+    # The patched temporary database, verify I must
+    with closing(sqlite3.connect(temp_db)) as conn:
         cursor = conn.cursor()
         
         # Table exists, check I must
@@ -60,6 +65,7 @@ def test_init_file_table_creates_table(temp_db):
         check.is_in("file_path", columns, "file_path column, it must have")
         check.is_in("pinecone_namespace", columns, "pinecone_namespace column, it must have")
         check.is_in("created_at", columns, "created_at column, it must have")
+        check.is_in("content_hash", columns, "content_hash column, it must have")
 
 
 def test_save_file_record_inserts_data(temp_db):
@@ -134,3 +140,112 @@ def test_delete_uploaded_file_nonexistent_returns_none(temp_db):
     
     result = delete_uploaded_file("nonexistent_doc")
     check.is_none(result, "Nonexistent file, None it must return")
+
+
+def test_find_file_by_hash(temp_db):
+    """Content hash, look it up I must. Same bytes, same document they are."""
+    init_file_table()
+    
+    save_file_record("a.pdf", "/tmp/a.pdf", "doc_a", content_hash="abc123")
+    save_file_record("b.pdf", "/tmp/b.pdf", "doc_b")
+    
+    found = find_file_by_hash("abc123")
+    check.is_not_none(found, "Hashed file, found it must be")
+    check.equal(found["namespace"], "doc_a", "Existing document ID, return it must")
+    check.is_none(find_file_by_hash("unknown"), "Unknown hash, None it must return")
+
+
+def test_init_file_table_migrates_old_schema(temp_db):
+    """Old table without content_hash, migrate it I must."""
+    import sqlite3
+    conn = sqlite3.connect(temp_db)
+    conn.execute("""
+        CREATE TABLE uploaded_documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_name TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            pinecone_namespace TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    """)
+    conn.commit()
+    conn.close()
+    
+    init_file_table()
+    save_file_record("a.pdf", "/tmp/a.pdf", "doc_a", content_hash="abc123")
+    check.is_not_none(find_file_by_hash("abc123"), "Migrated table, hashes it must store")
+
+
+def test_corpus_version_changes_on_upload_and_delete(temp_db):
+    """Upload or delete, the corpus version change it must."""
+    init_file_table()
+    empty = get_corpus_version()
+
+    save_file_record("a.pdf", "/tmp/a.pdf", "doc_a", "hash_a")
+    after_upload = get_corpus_version()
+    check.not_equal(empty, after_upload, "After upload, new version there must be")
+    check.equal(after_upload, get_corpus_version(), "Unchanged corpus, stable version it has")
+
+    update_file_version("doc_a", "/tmp/a_v2.pdf", "hash_a2")
+    after_revision = get_corpus_version()
+    check.not_equal(after_upload, after_revision, "After revision, new version there must be")
+
+    delete_uploaded_file("doc_a")
+    check.not_equal(after_revision, get_corpus_version(), "After delete, new version there must be")
+
+
+def test_init_file_table_records_version_and_indexes(temp_db):
+    """Migrations applied, the version recorded and the indexes created must be."""
+    init_file_table()
+    init_file_table()
+
+    conn = sqlite3.connect(temp_db)
+    version = conn.execute(
+        "SELECT version FROM schema_versions WHERE component = 'uploaded_documents'"
+    ).fetchone()[0]
+    indexes = {row[1] for row in conn.execute("PRAGMA index_list(uploaded_documents)")}
+    conn.close()
+
+    check.equal(version, len(FILE_TABLE_MIGRATIONS), "Latest version, recorded it must be")
+    check.is_in("idx_uploaded_documents_namespace", indexes, "Namespace index, it must have")
+    check.is_in("idx_uploaded_documents_created_at", indexes, "Created-at index, it must have")
+
+
+def test_list_uploaded_files_keyset_pagination(temp_db):
+    """Page by page, every file once it must return. Newest first, the order is."""
+    init_file_table()
+    for i in range(5):
+        save_file_record(f"file_{i}.pdf", f"/tmp/file_{i}.pdf", f"doc_{i}")
+
+    seen = []
+    cursor = None
+    while True:
+        page = list_uploaded_files_page(limit=2, cursor=cursor)
+        seen.extend(f["namespace"] for f in page["files"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    check.equal(seen, [f"doc_{i}" for i in reversed(range(5))], "All files, newest first and once each")
+    check.equal(len(list_uploaded_files()), 5, "Without a limit, everything returned it is")
+
+
+def test_list_uploaded_files_prefix_filter(temp_db):
+    """By name prefix, filter I can. Wildcards in the prefix, literal they are."""
+    init_file_table()
+    save_file_record("report_2024.pdf", "/tmp/a.pdf", "doc_a")
+    save_file_record("Report-final.pdf", "/tmp/b.pdf", "doc_b")
+    save_file_record("notes.pdf", "/tmp/c.pdf", "doc_c")
+
+    names = {f["file_name"] for f in list_uploaded_files_page(prefix="report")["files"]}
+    check.equal(names, {"report_2024.pdf", "Report-final.pdf"}, "Prefix match, case-insensitive it is")
+
+    names = {f["file_name"] for f in list_uploaded_files_page(prefix="report_")["files"]}
+    check.equal(names, {"report_2024.pdf"}, "Underscore, a wildcard it must not be")
+
+
+def test_list_uploaded_files_rejects_bad_cursor(temp_db):
+    """Garbage cursor, a ValueError it raises."""
+    init_file_table()
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        list_uploaded_files_page(limit=2, cursor="not-a-cursor")
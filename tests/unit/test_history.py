@@ -0,0 +1,125 @@
+"""
+Unit tests for the chat history policy, these are.
+Within its budget the history stays, and the rolling summary forward it moves.
+"""
+import asyncio
+from datetime import datetime, timedelta
+from time import time
+
+import pytest
+import pytest_check as check
+from agno.db.base import SessionType
+from agno.db.sqlite import SqliteDb
+from agno.models.message import Message
+from agno.models.response import ModelResponse
+from agno.run.agent import RunOutput
+from agno.run.base import RunStatus
+from agno.run.messages import RunMessages
+from agno.session import AgentSession
+from agno.session.summary import SessionSummary
+
+from agent_config.history import BoundedHistoryAgent, HistorySummarizer, save_summary, trim_history
+from agent_config.session_store import TieredSqliteDb
+
+
+def replayed(role: str, content: str, **kwargs) -> Message:
+    message = Message(role=role, content=content, **kwargs)
+    message.from_history = True
+    return message
+
+
+class FakeModel:
+    """The prompt it keeps; a fixed summary it returns."""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def aresponse(self, messages):
+        self.prompts.append(messages[-1].content)
+        return ModelResponse(content="User asked about refunds; answered from policy.pdf.")
+
+
+def test_trim_history_drops_whole_oldest_turns():
+    """Over budget, the oldest turn with its tool call and result goes. The current question, untouched."""
+    old_call = replayed("assistant", "", tool_calls=[{"id": "t1", "function": {"name": "search"}}])
+    messages = [
+        Message(role="system", content="system prompt"),
+        replayed("user", "old question " * 50),
+        old_call,
+        replayed("tool", "old chunk " * 50, tool_call_id="t1"),
+        replayed("assistant", "old answer"),
+        replayed("user", "recent question"),
+        replayed("assistant", "recent answer"),
+        Message(role="user", content="new question"),
+    ]
+
+    history = trim_history(messages, budget=20)
+
+    check.equal(history["dropped"], 4, "The whole old turn, dropped it must be")
+    check.equal(history["messages"], 2, "The recent turn, kept it is")
+    check.is_not_in(old_call, messages, "Tool call and result, together they go")
+    check.equal([m.content for m in messages], ["system prompt", "recent question", "recent answer", "new question"])
+    check.equal(trim_history(messages, budget=1000)["dropped"], 0, "Within budget, nothing dropped is")
+
+
+def test_bound_history_records_metrics_in_run_metadata():
+    """The history cost of each turn, in the run metadata stored it is."""
+    agent = BoundedHistoryAgent(add_session_summary_to_context=True)
+    agent.history_token_budget = 1000
+    run_messages = RunMessages(messages=[replayed("user", "earlier"), Message(role="user", content="now")])
+    run_response = RunOutput(run_id="run_1", metadata={"answer_cache": False})
+    session = AgentSession(session_id="s1", summary=SessionSummary(summary="earlier talk"))
+
+    agent._bound_history(run_messages, run_response, session)
+
+    check.equal(run_response.metadata["history"]["messages"], 1)
+    check.is_true(run_response.metadata["history"]["summary"], "The summary, in use it is")
+    check.is_false(run_response.metadata["answer_cache"], "Other metadata, kept it must be")
+
+
+def test_summarizer_folds_the_run_leaving_the_window(tmp_path):
+    """Past the window, the aged-out run summarized is; the stored runs, untouched they stay."""
+    db = SqliteDb(db_file=str(tmp_path / "sessions.db"))
+    runs = [
+        RunOutput(
+            run_id=f"run_{i}",
+            agent_id="a1",
+            session_id="s1",
+            status=RunStatus.completed,
+            messages=[Message(role="user", content=f"question {i}"), Message(role="assistant", content=f"answer {i}")],
+        )
+        for i in range(3)
+    ]
+    db.upsert_session(AgentSession(session_id="s1", agent_id="a1", runs=runs, created_at=int(time())))
+    model = FakeModel()
+    summarizer = HistorySummarizer(db, model=model, max_runs=2)
+
+    summary = asyncio.run(summarizer.refresh("s1"))
+
+    check.equal(len(model.prompts), 1, "One model call per turn, only")
+    check.is_in("question 0", model.prompts[0], "The run that left the window, folded it is")
+    check.is_not_in("question 2", model.prompts[0], "Runs still replayed, summarized again they are not")
+    stored = db.get_session(session_id="s1", session_type=SessionType.AGENT)
+    check.equal(stored.summary.summary, summary.summary, "With the session, the summary stored is")
+    check.equal(len(stored.runs), 3, "The runs, untouched they stay")
+    check.is_none(asyncio.run(HistorySummarizer(db, model=model, max_runs=5).refresh("s1")), "Inside the window, no summary")
+
+
+@pytest.mark.parametrize("tiered", [False, True])
+def test_summary_written_mid_run_survives_the_run_save(tmp_path, tiered):
+    """Summarized while the next run was in flight, by that run's save overwritten the summary is not."""
+    path = str(tmp_path / "sessions.db")
+    db = TieredSqliteDb(db_file=path, flush_seconds=3600) if tiered else SqliteDb(db_file=path)
+    old = SessionSummary(summary="old summary", updated_at=datetime.now() - timedelta(minutes=5))
+    db.upsert_session(AgentSession(session_id="s1", agent_id="a1", summary=old, created_at=int(time())))
+    agent = BoundedHistoryAgent(db=db)
+
+    in_flight = db.get_session(session_id="s1", session_type=SessionType.AGENT)
+    save_summary(db, "s1", SessionSummary(summary="new summary", updated_at=datetime.now()))
+    agent._upsert_session(in_flight)
+
+    if tiered:
+        db.close()
+        db = SqliteDb(db_file=path)
+    stored = db.get_session(session_id="s1", session_type=SessionType.AGENT)
+    check.equal(stored.summary.summary, "new summary", "The newer summary, kept it must be")
@@ -0,0 +1,144 @@
+"""
+Unit tests for ingestion jobs, these are.
+Job state in SQLite, persist it must. Failures, recorded they should be.
+"""
+import pytest
+import pytest_check as check
+from pathlib import Path
+import sqlite3
+import tempfile
+from agent_config.jobs import (
+    IngestionQueue,
+    JobStatus,
+    init_job_table,
+    create_job,
+    get_job,
+    list_batch_jobs,
+    list_unfinished_jobs,
+    summarize_batch,
+    update_job,
+)
+from agent_config.ingest_timing import stage
+
+
+@pytest.fixture
+def temp_db(monkeypatch):
+    """Temporary database, create I do. For job tests, this is."""
+    with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp:
+        db_path = Path(tmp.name)
+
+    def mock_get_conn():
+        conn = sqlite3.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    monkeypatch.setattr("agent_config.jobs.get_conn", mock_get_conn)
+    init_job_table()
+
+    yield db_path
+
+    if db_path.exists():
+        db_path.unlink()
+
+
+def test_create_job_is_pending(temp_db):
+    """New job, pending it must be. Document and file, remember it should."""
+    job_id = create_job("doc_1", "a.pdf", "/tmp/a.pdf")
+
+    job = get_job(job_id)
+    check.is_not_none(job, "Job, found it must be")
+    check.equal(job["status"], JobStatus.PENDING.value, "Pending, the job must be")
+    check.equal(job["document_id"], "doc_1", "Document ID, stored it must be")
+    check.equal(job["attempts"], 0, "No attempts yet, there should be")
+
+
+def test_get_job_unknown_returns_none(temp_db):
+    """Unknown job, None it must return."""
+    check.is_none(get_job("job_missing"), "Missing job, None it must be")
+
+
+def test_unfinished_jobs_include_running(temp_db):
+    """Pending and running jobs, resumable they are. Finished ones, not."""
+    pending = create_job("doc_1", "a.pdf", "/tmp/a.pdf")
+    running = create_job("doc_2", "b.pdf", "/tmp/b.pdf")
+    done = create_job("doc_3", "c.pdf", "/tmp/c.pdf")
+    update_job(running, JobStatus.RUNNING)
+    update_job(done, JobStatus.COMPLETED)
+
+    unfinished = list_unfinished_jobs()
+    check.is_in(pending, unfinished, "Pending job, resumable it is")
+    check.is_in(running, unfinished, "Interrupted job, resumable it is")
+    check.is_not_in(done, unfinished, "Completed job, resumed it must not be")
+
+
+def test_queue_runs_handler_and_completes(temp_db):
+    """Queue worker, the handler it must call. Completed, the job then is."""
+    seen = []
+    queue = IngestionQueue(handler=lambda job: seen.append(job["document_id"]), max_workers=1)
+    job_id = create_job("doc_ok", "ok.pdf", "/tmp/ok.pdf")
+
+    queue._run(job_id)
+
+    job = get_job(job_id)
+    check.equal(seen, ["doc_ok"], "Handler, called once it must be")
+    check.equal(job["status"], JobStatus.COMPLETED.value, "Completed, the job must be")
+    check.equal(job["attempts"], 1, "One attempt, counted it must be")
+
+
+def test_queue_records_failure(temp_db):
+    """Failing handler, the error recorded it must be."""
+    def failing(job):
+        raise ValueError("Invalid PDF")
+
+    queue = IngestionQueue(handler=failing, max_workers=1)
+    job_id = create_job("doc_bad", "bad.pdf", "/tmp/bad.pdf")
+
+    queue._run(job_id)
+
+    job = get_job(job_id)
+    check.equal(job["status"], JobStatus.FAILED.value, "Failed, the job must be")
+    check.equal(job["error"], "Invalid PDF", "Error message, kept it must be")
+
+
+def test_queue_records_stage_timings(temp_db):
+    """Stages timed by the handler, on the job they must appear."""
+    def handler(job):
+        with stage("parse"):
+            pass
+        with stage("embed"):
+            pass
+
+    queue = IngestionQueue(handler=handler, max_workers=1)
+    job_id = create_job("doc_timed", "t.pdf", "/tmp/t.pdf")
+
+    queue._run(job_id)
+
+    timings = get_job(job_id)["timings"]
+    check.equal(set(timings), {"parse_ms", "embed_ms", "total_ms"}, "Every stage, recorded it must be")
+    check.greater_equal(timings["total_ms"], timings["parse_ms"], "The whole, shorter than a part it cannot be")
+
+
+def test_batch_runs_jobs_together(temp_db):
+    """One call for the whole group, the batch handler gets. Per job, its result recorded it must be."""
+    calls = []
+
+    def batch_handler(jobs):
+        calls.append([job["document_id"] for job in jobs])
+        return {jobs[0]["id"]: "doc_existing", jobs[1]["id"]: ValueError("Invalid PDF")}
+
+    queue = IngestionQueue(handler=lambda job: None, max_workers=1, batch_handler=batch_handler)
+    job_ids = [create_job(f"doc_{i}", f"{i}.pdf", f"/tmp/{i}.pdf", batch_id="batch_1") for i in range(3)]
+
+    queue._run_batch(job_ids)
+
+    jobs = {job["id"]: job for job in list_batch_jobs("batch_1")}
+    check.equal(calls, [["doc_0", "doc_1", "doc_2"]], "Once, the batch handler called must be")
+    check.equal(jobs[job_ids[0]]["document_id"], "doc_existing", "Deduplicated ID, recorded it must be")
+    check.equal(jobs[job_ids[1]]["status"], JobStatus.FAILED.value, "Failed file, failed its job must be")
+    check.equal(jobs[job_ids[1]]["error"], "Invalid PDF")
+    check.equal(jobs[job_ids[2]]["status"], JobStatus.COMPLETED.value, "Omitted job, completed it is")
+    check.equal(
+        summarize_batch(list(jobs.values())),
+        {"pending": 0, "running": 0, "completed": 2, "failed": 1, "total": 3},
+        "Batch counts, correct they must be",
+    )
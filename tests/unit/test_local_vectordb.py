@@ -0,0 +1,236 @@
+"""
+Unit tests for the local vector store, these are.
+Nearest chunks, filters, tombstones and persistence, verify I must.
+"""
+import asyncio
+from dataclasses import dataclass
+from hashlib import sha256
+import pytest
+import pytest_check as check
+from agno.knowledge.document import Document
+from agno.knowledge.embedder import Embedder
+from agent_config.local_vectordb import LocalVectorDb
+
+
+@dataclass
+class KeywordEmbedder(Embedder):
+    """Deterministic embedder, by words it hashes. Network, it needs not."""
+    id: str = "keyword-test"
+    dimensions: int = 32
+    enable_batch: bool = False
+
+    def get_embedding(self, text: str):
+        vector = [0.0] * self.dimensions
+        for word in text.lower().split():
+            vector[int(sha256(word.encode()).hexdigest(), 16) % self.dimensions] += 1.0
+        return vector
+
+    def get_embedding_and_usage(self, text: str):
+        return self.get_embedding(text), None
+
+    async def async_get_embedding(self, text: str):
+        return self.get_embedding(text)
+
+    async def async_get_embedding_and_usage(self, text: str):
+        return self.get_embedding_and_usage(text)
+
+
+def make_docs(document_id: str, source: str, texts: list[str]) -> list[Document]:
+    return [
+        Document(content=text, id=f"{document_id}_{i}", name=document_id, meta_data={"document_id": document_id, "source": source})
+        for i, text in enumerate(texts)
+    ]
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Local store on a temporary directory, create I do."""
+    store = LocalVectorDb(name="test", dimension=32, embedder=KeywordEmbedder(), path=tmp_path / "vectors", initial_capacity=2)
+    store.create()
+    yield store
+    store.close()
+
+
+def test_search_returns_nearest_chunk(store):
+    """Closest chunk, first it must come."""
+    store.insert("hash_a", make_docs("doc_a", "a.pdf", ["refund policy thirty days", "shipping takes a week", "warranty covers defects"]))
+
+    results = store.search("refund policy", limit=2)
+    check.equal(len(results), 2, "Two results, asked for they were")
+    check.equal(results[0].content, "refund policy thirty days", "Refund chunk, first it must be")
+    check.equal(results[0].meta_data["document_id"], "doc_a", "Metadata, returned it must be")
+
+
+def test_filters_by_document_id_and_source(store):
+    """Filters on document and source, honoured they must be."""
+    store.insert("hash_a", make_docs("doc_a", "a.pdf", ["refund policy"]))
+    store.insert("hash_b", make_docs("doc_b", "b.pdf", ["refund policy details"]))
+
+    only_b = store.search("refund policy", limit=5, filters={"document_id": "doc_b"})
+    check.equal([d.meta_data["document_id"] for d in only_b], ["doc_b"], "Only doc_b, returned it must be")
+
+    both = store.search("refund policy", limit=5, filters={"source": {"$in": ["a.pdf", "b.pdf"]}})
+    check.equal(len(both), 2, "Both sources, matched they must be")
+
+
+def test_delete_by_metadata_tombstones(store):
+    """Deleted document, in results appear it must not."""
+    store.insert("hash_a", make_docs("doc_a", "a.pdf", ["refund policy"]))
+    store.insert("hash_b", make_docs("doc_b", "b.pdf", ["refund rules"]))
+
+    check.is_true(store.delete_by_metadata({"source": "a.pdf"}), "Delete, succeed it must")
+    results = store.search("refund policy", limit=5)
+    check.equal([d.meta_data["source"] for d in results], ["b.pdf"], "Deleted source, gone it must be")
+    check.equal(store.get_count(), 1, "One live chunk, remain it must")
+
+
+def test_upsert_replaces_content_hash(store):
+    """Same content hash upserted again, duplicated it must not be."""
+    store.upsert("hash_a", make_docs("doc_a", "a.pdf", ["refund policy"]))
+    store.upsert("hash_a", make_docs("doc_a", "a.pdf", ["refund policy"]))
+    check.equal(store.get_count(), 1, "One chunk only, there must be")
+
+
+def test_persists_and_grows_across_reopen(store, tmp_path):
+    """Beyond initial capacity it grows; after reopening, still there it is."""
+    store.insert("hash_a", make_docs("doc_a", "a.pdf", [f"chunk number {i}" for i in range(5)]))
+    store.close()
+
+    reopened = LocalVectorDb(name="test", dimension=32, embedder=KeywordEmbedder(), path=tmp_path / "vectors")
+    check.equal(reopened.get_count(), 5, "All chunks, persisted they must be")
+    check.is_true(reopened.content_hash_exists("hash_a"), "Content hash, remembered it must be")
+    results = asyncio.run(reopened.async_search("chunk number 3", limit=1))
+    check.equal(results[0].content, "chunk number 3", "Async search after reopen, work it must")
+    reopened.close()
+
+
+def test_optimize_compacts_tombstones(store):
+    """Compacted, the tombstones are. Live chunks, still found they must be."""
+    store.insert("hash_a", make_docs("doc_a", "a.pdf", ["alpha text", "beta text"]))
+    store.insert("hash_b", make_docs("doc_b", "b.pdf", ["gamma text"]))
+    store.delete_by_content_id("missing")
+    store.delete_by_name("doc_a")
+
+    store.optimize()
+    check.equal(store._count, 1, "Only live rows, after compaction remain")
+    check.equal(store.search("gamma text", limit=1)[0].content, "gamma text", "Live chunk, found it must be")
+
+
+def wait_for_maintenance(store):
+    """Background maintenance, finish it must before checks."""
+    if store._maintenance is not None:
+        store._maintenance.join()
+
+
+def clustered_docs(rng, centers, per_center: int, prefix: str) -> list[Document]:
+    docs = []
+    for c, center in enumerate(centers):
+        for i in range(per_center):
+            vector = center + 0.05 * rng.standard_normal(len(center))
+            docs.append(
+                Document(
+                    content=f"{prefix} cluster {c} item {i}",
+                    id=f"{prefix}_{c}_{i}",
+                    meta_data={"document_id": f"{prefix}_{c}", "source": f"{prefix}.pdf"},
+                    embedding=vector.tolist(),
+                )
+            )
+    return docs
+
+
+def test_ivf_index_matches_exact_search(tmp_path):
+    """IVF index, trained in background it is. All clusters probed, exact results it must give."""
+    import numpy as np
+    rng = np.random.default_rng(7)
+    centers = rng.standard_normal((4, 32))
+    store = LocalVectorDb(
+        name="ivf", dimension=32, embedder=KeywordEmbedder(), path=tmp_path / "ivf",
+        index_type="ivf", nlist=4, nprobe=4, ann_min_rows=50,
+    )
+    store.insert("hash_a", clustered_docs(rng, centers, 20, "a"))
+    wait_for_maintenance(store)
+    check.is_not_none(store._ivf, "IVF index, built it must be")
+
+    query = centers[2].tolist()
+    approx = [row for row, _ in store.search_vector(query, limit=5)]
+    store._ivf, ivf = None, store._ivf
+    exact = [row for row, _ in store.search_vector(query, limit=5)]
+    store._ivf = ivf
+    check.equal(approx, exact, "Every cluster probed, exact it must be")
+    store.close()
+
+
+def test_ivf_incremental_insert_and_tombstone(tmp_path):
+    """New chunks, without retraining found they are. Deleted ones, never returned."""
+    import numpy as np
+    rng = np.random.default_rng(11)
+    centers = rng.standard_normal((4, 32))
+    store = LocalVectorDb(
+        name="ivf", dimension=32, embedder=KeywordEmbedder(), path=tmp_path / "ivf",
+        index_type="ivf", nlist=4, nprobe=1, ann_min_rows=50,
+    )
+    store.insert("hash_a", clustered_docs(rng, centers, 20, "a"))
+    wait_for_maintenance(store)
+    built = store._ivf
+
+    store.insert("hash_b", clustered_docs(rng, centers[:1], 5, "b"))
+    check.is_(store._ivf, built, "Small insert, retrain it must not")
+    hits = store._documents_for_rows(store.search_vector(centers[0].tolist(), limit=40))
+    check.is_true(any(d.id.startswith("b_") for d in hits), "Incrementally added chunk, found it must be")
+
+    store.delete_by_metadata({"document_id": "a_0"})
+    wait_for_maintenance(store)
+    hits = store._documents_for_rows(store.search_vector(centers[0].tolist(), limit=40))
+    check.is_false(any(d.meta_data["document_id"] == "a_0" for d in hits), "Tombstoned chunks, hidden they must be")
+    store.close()
+
+
+@pytest.mark.parametrize("quantization", ["int8", "pq"])
+def test_quantized_search_reranks_to_exact(tmp_path, quantization):
+    """Quantized codes, shortlist they do; by float vectors re-ranked, exact top results remain."""
+    import numpy as np
+    rng = np.random.default_rng(5)
+    centers = rng.standard_normal((4, 32))
+    store = LocalVectorDb(
+        name="quant", dimension=32, embedder=KeywordEmbedder(), path=tmp_path / "quant",
+        quantization=quantization, pq_subspaces=8, quant_min_rows=50,
+    )
+    store.insert("hash_a", clustered_docs(rng, centers, 100, "a"))
+    wait_for_maintenance(store)
+    check.is_not_none(store._quantizer, "Quantizer, trained in background it must be")
+
+    usage = store.memory_usage()
+    check.less(usage["code_bytes"], usage["float_bytes"], "Codes, smaller than floats they must be")
+
+    store.insert("hash_b", clustered_docs(rng, centers[:1], 5, "b"))
+    query = centers[0].tolist()
+    approx = store.search_vector(query, limit=5)
+    store._quantizer, quantizer = None, store._quantizer
+    exact = store.search_vector(query, limit=5)
+    store._quantizer = quantizer
+    check.equal([row for row, _ in approx], [row for row, _ in exact], "Re-ranked, exact results it must give")
+    check.equal(approx[0][1], pytest.approx(exact[0][1]), "Exact float scores, returned they must be")
+    store.close()
+
+
+def test_quantized_codes_survive_reopen_and_compaction(tmp_path):
+    """Saved the quantizer is; compacted, the codes with the vectors move."""
+    import numpy as np
+    rng = np.random.default_rng(9)
+    centers = rng.standard_normal((4, 32))
+    path = tmp_path / "quant"
+    store = LocalVectorDb(name="quant", dimension=32, embedder=KeywordEmbedder(), path=path, quantization="int8", quant_min_rows=50)
+    store.insert("hash_a", clustered_docs(rng, centers, 50, "a"))
+    wait_for_maintenance(store)
+    store.close()
+
+    store = LocalVectorDb(name="quant", dimension=32, embedder=KeywordEmbedder(), path=path, quantization="int8", quant_min_rows=50)
+    store.create()
+    check.is_not_none(store._quantizer, "Quantizer, from disk loaded it must be")
+    store.delete_by_metadata({"document_id": "a_1"})
+    store.optimize()
+    wait_for_maintenance(store)
+    check.equal(store._count, 150, "Tombstoned rows, compacted away they are")
+    expected = store._quantizer.encode(np.asarray(store._matrix[: store._count]))
+    check.is_true(np.array_equal(np.asarray(store._codes[: store._count]), expected), "Codes, aligned with rows they stay")
+    store.close()
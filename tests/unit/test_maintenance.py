@@ -0,0 +1,84 @@
+"""
+Unit tests for session maintenance, these are.
+Idle sessions archived then pruned, and the database compacted, verify I must.
+"""
+import gzip
+import json
+import sqlite3
+from contextlib import closing, contextmanager
+from time import time
+
+import pytest_check as check
+from agno.db.base import SessionType
+from agno.db.sqlite import SqliteDb
+from agno.session import AgentSession
+
+from agent_config import maintenance
+from agent_config.session_store import TieredSqliteDb
+
+
+def test_maintenance_archives_idle_sessions_and_reports_size(tmp_path, monkeypatch):
+    """Idle sessions, archived and deleted they are; the active one, kept. Sizes, reported they are."""
+    db_path = tmp_path / "app.db"
+    db = SqliteDb(db_file=str(db_path))
+
+    @contextmanager
+    def mock_get_conn():
+        with closing(sqlite3.connect(db_path)) as conn:
+            with conn:
+                yield conn
+
+    monkeypatch.setattr(maintenance, "db", db)
+    monkeypatch.setattr(maintenance, "get_conn", mock_get_conn)
+    monkeypatch.setattr(maintenance, "APP_DB_PATH", db_path)
+
+    padding = {"notes": "x" * 20000}
+    for session_id in ("old_1", "old_2", "active"):
+        db.upsert_session(AgentSession(session_id=session_id, agent_id="a1", session_data=padding, created_at=int(time())))
+    with closing(sqlite3.connect(db_path)) as conn, conn:
+        conn.execute("UPDATE agno_sessions SET updated_at = ? WHERE session_id LIKE 'old_%'", (int(time()) - 40 * 86400,))
+
+    maintenance.compact_database()
+    with closing(sqlite3.connect(db_path)) as conn:
+        check.not_equal(conn.execute("PRAGMA auto_vacuum").fetchone()[0], maintenance.AUTO_VACUUM_INCREMENTAL,
+                        "The full VACUUM, by the background pass never run it is")
+    check.is_true(maintenance.enable_incremental_vacuum(), "By the admin step, converted it is")
+    check.is_false(maintenance.enable_incremental_vacuum(), "Twice, converted it is not")
+
+    report = maintenance.run_session_maintenance(retention_days=30, archive_dir=tmp_path / "archive")
+
+    check.equal(report["expired_sessions"], 2, "Both idle sessions, expired they must be")
+    check.is_none(db.get_session(session_id="old_1", session_type=SessionType.AGENT), "Pruned, the idle one is")
+    check.is_not_none(db.get_session(session_id="active", session_type=SessionType.AGENT), "The active one, kept")
+    with gzip.open(report["archive"], "rt") as archive:
+        archived = [json.loads(line) for line in archive]
+    check.equal(sorted(row["session_id"] for row in archived), ["old_1", "old_2"], "Archived first, they must be")
+    check.less(report["size_after"], report["size_before"], "Freed pages, returned to the filesystem they are")
+    with closing(sqlite3.connect(db_path)) as conn:
+        check.equal(conn.execute("PRAGMA auto_vacuum").fetchone()[0], maintenance.AUTO_VACUUM_INCREMENTAL)
+
+
+def test_archive_flushes_first_and_skips_live_sessions(tmp_path, monkeypatch):
+    """Pending writes, flushed before the table is read; a session in the hot tier just used, archived it is not."""
+    db = TieredSqliteDb(db_file=str(tmp_path / "app.db"), flush_seconds=3600)
+    monkeypatch.setattr(maintenance, "db", db)
+    long_ago = int(time()) - 40 * 86400
+    for session_id in ("idle", "live"):
+        db.upsert_session(AgentSession(session_id=session_id, agent_id="a1", created_at=long_ago))
+    db.flush_sessions()
+    with closing(sqlite3.connect(tmp_path / "app.db")) as conn, conn:
+        conn.execute("UPDATE agno_sessions SET updated_at = ?", (long_ago,))
+    db._sessions.clear()
+
+    # A new turn on the old session, only in memory it is.
+    live = db.get_session(session_id="live", session_type=SessionType.AGENT)
+    live.session_data = {"turn": "just now"}
+    db.upsert_session(live)
+
+    expired, _ = maintenance.archive_expired_sessions(int(time()) - 30 * 86400, tmp_path / "archive")
+
+    check.equal(expired, 1, "Only the idle session, archived it is")
+    db._sessions.clear()
+    kept = db.get_session(session_id="live", session_type=SessionType.AGENT)
+    check.equal(kept.session_data, {"turn": "just now"}, "The latest turn, lost it is not")
+    db.close()
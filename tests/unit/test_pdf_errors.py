@@ -11,6 +11,10 @@ import sqlite3
 from agent_config.file_store import init_file_table, get_conn
 
 
+# Ingested the uploads are; embedded offline, they must be.
+pytestmark = pytest.mark.usefixtures("offline_embedder")
+
+
 @pytest.fixture
 def temp_upload_dir(monkeypatch):
     """Temporary upload directory, set I do."""
@@ -5,13 +5,19 @@ Real PDF files, test with I must.
 import pytest
 import pytest_check as check
 from pathlib import Path
-from agent_config.document import handle_pdf_upload, UPLOAD_DIR
+from agent_config.document import handle_pdf_upload, stage_pdf_file, stage_zip_archive, hash_content, FileTooLargeError, UPLOAD_DIR
+from io import BytesIO
 from agent_config.file_store import init_file_table, list_uploaded_files, delete_uploaded_file
 import tempfile
 import sqlite3
+import zipfile
 from agent_config.db import get_conn
 
 
+# Ingested the uploads are; embedded offline, they must be.
+pytestmark = pytest.mark.usefixtures("offline_embedder")
+
+
 @pytest.fixture
 def temp_upload_dir(monkeypatch):
     """Temporary upload directory, set I do. Original path, override I will."""
@@ -124,10 +130,10 @@ def test_handle_pdf_upload_valid_pdf(temp_upload_dir, temp_db):
 
 
 def test_handle_pdf_upload_creates_unique_document_id(temp_upload_dir, temp_db):
-    """Document IDs, unique they must be. Each upload, different ID it should get."""
+    """Document IDs, unique they must be. Different bytes, different ID they should get."""
     pdf_content = create_minimal_pdf()
     result1 = handle_pdf_upload("test1.pdf", pdf_content)
-    result2 = handle_pdf_upload("test2.pdf", pdf_content)
+    result2 = handle_pdf_upload("test2.pdf", pdf_content + b"\n% revision 2\n")
     
     check.not_equal(
         result1["document_id"],
@@ -136,6 +142,41 @@ def test_handle_pdf_upload_creates_unique_document_id(temp_upload_dir, temp_db):
     )
 
 
+def test_handle_pdf_upload_deduplicates_identical_bytes(temp_upload_dir, temp_db):
+    """Identical bytes, embedded twice they must not be. Existing document ID, return I will."""
+    pdf_content = create_minimal_pdf()
+    result1 = handle_pdf_upload("test1.pdf", pdf_content)
+    result2 = handle_pdf_upload("copy_of_test1.pdf", pdf_content)
+    
+    check.equal(result1["document_id"], result2["document_id"], "Same document ID, it must be")
+    check.is_true(result2.get("duplicate"), "Duplicate flag, set it must be")
+    check.equal(len(list_uploaded_files()), 1, "One record only, there should be")
+
+
+def test_vector_store_failure_fails_the_job(temp_upload_dir, temp_db, monkeypatch):
+    """Refused by the vector store the chunks were, then failed the job is; saved, no record is."""
+    from agent_config import document as doc_module
+    from agent_config.document import ingest_pdf_job, stage_pdf_upload
+    from agent_config.jobs import IngestionQueue, JobStatus, create_job, get_job, init_job_table
+
+    def refuse(*args, **kwargs):
+        raise ConnectionError("vector store down")
+
+    monkeypatch.setattr(doc_module.knowledge.vector_db, "upsert", refuse)
+    monkeypatch.setattr(doc_module.knowledge.vector_db, "insert", refuse)
+    init_job_table()
+    staged = stage_pdf_upload("test.pdf", create_minimal_pdf())
+    job_id = create_job(**staged)
+
+    IngestionQueue(handler=ingest_pdf_job, max_workers=1)._run(job_id)
+
+    check.equal(get_job(job_id)["status"], JobStatus.FAILED.value, "Failed, the job must be")
+    check.equal(list_uploaded_files(), [], "Without vectors, recorded the document must not be")
+    with pytest.raises(Exception):
+        handle_pdf_upload("test.pdf", create_minimal_pdf())
+    check.equal(list_uploaded_files(), [], "Deduplicated against a failed upload, nothing is")
+
+
 def test_handle_pdf_upload_saves_to_db(temp_upload_dir, temp_db):
     """File record, database it must save. List files, retrieve it should."""
     pdf_content = create_minimal_pdf()
@@ -169,6 +210,73 @@ def test_handle_pdf_upload_rejects_wrong_extension(temp_upload_dir, temp_db):
         handle_pdf_upload("test.docx", pdf_content)
 
 
+def test_stage_pdf_file_streams_and_hashes(temp_upload_dir, monkeypatch):
+    """In chunks the file is copied. Same hash as the whole bytes, it must have."""
+    monkeypatch.setattr("agent_config.document.UPLOAD_CHUNK_BYTES", 7)
+    pdf_content = create_minimal_pdf()
+
+    staged = stage_pdf_file("chunked.pdf", BytesIO(pdf_content), max_bytes=len(pdf_content))
+
+    check.equal(staged["content_hash"], hash_content(pdf_content), "Incremental hash, match it must")
+    check.equal(Path(staged["file_path"]).read_bytes(), pdf_content, "Copied bytes, identical they must be")
+    check.equal(list(temp_upload_dir.glob("*.part")), [], "Partial file, left behind it must not be")
+
+
+def test_stage_pdf_file_rejects_oversized_stream(temp_upload_dir, monkeypatch):
+    """Over the limit the stream grows, stop and clean up I must."""
+    monkeypatch.setattr("agent_config.document.UPLOAD_CHUNK_BYTES", 4)
+
+    with pytest.raises(FileTooLargeError):
+        stage_pdf_file("big.pdf", BytesIO(b"x" * 64), max_bytes=16)
+
+    check.equal(list(temp_upload_dir.iterdir()), [], "Nothing on disk, remain it must")
+
+
+def test_stage_zip_archive_stages_each_pdf(temp_upload_dir):
+    """From a zip, every PDF staged it must be. Other members, rejected with a reason they are."""
+    pdf_content = create_minimal_pdf()
+    archive = BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("reports/a.pdf", pdf_content)
+        zf.writestr("b.PDF", pdf_content + b"\n")
+        zf.writestr("notes.txt", b"not a pdf")
+        zf.writestr("__MACOSX/reports/._a.pdf", b"resource fork")
+        zf.writestr("big.pdf", b"x" * (len(pdf_content) + 2))
+    archive.seek(0)
+
+    staged = stage_zip_archive(archive, max_bytes=len(pdf_content) + 1)
+
+    by_name = {item["file_name"]: item for item in staged}
+    check.equal(set(by_name), {"a.pdf", "b.PDF", "notes.txt", "big.pdf"}, "Metadata members, skipped they must be")
+    check.equal(by_name["a.pdf"]["content_hash"], hash_content(pdf_content), "Member bytes, hashed they must be")
+    check.is_true(Path(by_name["b.PDF"]["file_path"]).exists(), "Staged to disk, the member must be")
+    check.equal(by_name["notes.txt"]["error"], "Only PDF files are allowed")
+    check.equal(by_name["big.pdf"]["error"], "File too large")
+
+
+def test_stage_zip_archive_caps_total_uncompressed_bytes(temp_upload_dir):
+    """Past the total budget the streamed members grow, the whole archive rejected and cleaned up is."""
+    pdf_content = create_minimal_pdf()
+    archive = BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        for i in range(3):
+            zf.writestr(f"{i}.pdf", pdf_content + b"\n" * i)
+    archive.seek(0)
+
+    with pytest.raises(ValueError, match="Archive too large"):
+        stage_zip_archive(archive, max_bytes=len(pdf_content) * 2, max_total_bytes=len(pdf_content) * 2)
+
+    check.equal(list(temp_upload_dir.iterdir()), [], "Staged members, removed they must be")
+    archive.seek(0)
+    check.equal(len(stage_zip_archive(archive, max_total_bytes=len(pdf_content) * 3 + 3)), 3, "Within budget, all staged")
+
+
+def test_stage_zip_archive_rejects_invalid_archive(temp_upload_dir):
+    """Not a zip at all, rejected the upload must be."""
+    with pytest.raises(ValueError):
+        stage_zip_archive(BytesIO(b"not a zip"))
+
+
 def test_pdf_parser_with_real_file(sample_pdf_path, temp_upload_dir, temp_db):
     """Real PDF file, parse it I must. Content extracted, it should be."""
     pdf_content = sample_pdf_path.read_bytes()
@@ -180,3 +288,42 @@ def test_pdf_parser_with_real_file(sample_pdf_path, temp_upload_dir, temp_db):
     # File size, reasonable it should be
     file_size = Path(result["file_path"]).stat().st_size
     check.greater(file_size, 0, "File size, greater than zero it must be")
+
+
+def write_numbered_pdf(path: Path, pages: int) -> None:
+    """Each page, its own number in the text it carries."""
+    from pypdf import PdfWriter
+    from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    }))
+    for number in range(1, pages + 1):
+        page = writer.add_blank_page(612, 792)
+        stream = DecodedStreamObject()
+        stream.set_data(f"BT /F1 12 Tf 72 720 Td (Section {number} text) Tj ET".encode())
+        page[NameObject("/Contents")] = writer._add_object(stream)
+        page[NameObject("/Resources")] = DictionaryObject({NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})})
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def test_parallel_pdf_reader_matches_serial_order(tmp_path):
+    """Across processes the pages parsed are; same order and page numbers as serial, they must keep."""
+    from agno.knowledge.reader.pdf_reader import PDFReader
+    from agent_config.pdf_reader import ParallelPDFReader, page_shards, shutdown_pdf_pool
+    path = tmp_path / "numbered.pdf"
+    write_numbered_pdf(path, 20)
+
+    check.equal(page_shards(20, 2), [(0, 8), (8, 16), (16, 20)], "Contiguous shards, covering every page")
+    try:
+        parallel = ParallelPDFReader(workers=2, min_pages=1, chunk=False).read(path)
+    finally:
+        shutdown_pdf_pool()
+    serial = PDFReader(chunk=False).read(path)
+
+    check.equal([d.content for d in parallel], [d.content for d in serial], "Same text in same order, it must be")
+    check.equal([d.meta_data["page"] for d in parallel], list(range(1, 21)), "Page numbers, preserved they are")
+    check.is_in("Section 20 text", parallel[-1].content, "Last page, last it must come")
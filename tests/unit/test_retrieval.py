@@ -0,0 +1,168 @@
+"""
+Unit tests for hybrid retrieval, these are.
+BM25 lookups, rank fusion and the lexical shortcut, verify I must.
+"""
+import asyncio
+from dataclasses import dataclass
+from hashlib import sha256
+import pytest
+import pytest_check as check
+from agno.knowledge.content import Content
+from agno.knowledge.document import Document
+from agno.knowledge.embedder import Embedder
+from agent_config.lexical_index import LexicalIndex
+from agent_config.local_vectordb import LocalVectorDb
+from agent_config.retrieval import HybridKnowledge, exact_terms, reciprocal_rank_fusion
+
+
+@dataclass
+class CountingEmbedder(Embedder):
+    """Hashed words it embeds; how often asked, it counts."""
+    id: str = "counting-test"
+    dimensions: int = 32
+    enable_batch: bool = False
+    calls: int = 0
+
+    def get_embedding(self, text: str):
+        self.calls += 1
+        vector = [0.0] * self.dimensions
+        for word in text.lower().split():
+            vector[int(sha256(word.encode()).hexdigest(), 16) % self.dimensions] += 1.0
+        return vector
+
+    def get_embedding_and_usage(self, text: str):
+        return self.get_embedding(text), None
+
+    async def async_get_embedding(self, text: str):
+        return self.get_embedding(text)
+
+    async def async_get_embedding_and_usage(self, text: str):
+        return self.get_embedding_and_usage(text)
+
+
+CHUNKS = [
+    "Clause 4.2.1 requires written notice within thirty days.",
+    "Clause 4.2 covers general notices to the supplier.",
+    "Part AB-1234 is the replacement hinge for model X.",
+    "Refunds are issued within fourteen days of the return.",
+]
+
+
+@pytest.fixture
+def hybrid(tmp_path):
+    """Hybrid knowledge over a local store and lexical index, build I do."""
+    embedder = CountingEmbedder()
+    vector_db = LocalVectorDb(name="hybrid", dimension=32, embedder=embedder, path=tmp_path / "vectors")
+    lexical = LexicalIndex(tmp_path / "lexical.db")
+    knowledge = HybridKnowledge(vector_db=vector_db, lexical_index=lexical, max_results=3)
+    documents = [Document(content=text, id=f"chunk_{i}", name="contract") for i, text in enumerate(CHUNKS)]
+    content = Content(content_hash="hash_contract", metadata={"document_id": "doc_1", "source": "contract.pdf"})
+    knowledge._handle_vector_db_insert(content, documents, upsert=False)
+    embedder.calls = 0
+    yield knowledge, embedder
+    lexical.close()
+    vector_db.close()
+
+
+def test_lexical_index_matches_punctuated_terms(tmp_path):
+    """Clause numbers and part codes, as whole terms matched they must be."""
+    index = LexicalIndex(tmp_path / "lexical.db")
+    index.add("hash_a", [Document(content=text) for text in CHUNKS], {"document_id": "doc_1", "source": "a.pdf"})
+
+    hits = index.search("AB-1234", limit=5)
+    check.equal(hits[0][0].content, CHUNKS[2], "Part number chunk, first it must come")
+    check.equal(hits[0][0].meta_data["source"], "a.pdf", "Metadata, kept it must be")
+    check.equal(index.search("AB-1234", filters={"document_id": "doc_2"}), [], "Other document, matched it must not be")
+
+    check.equal(index.delete({"source": "a.pdf"}), len(CHUNKS), "Every chunk of the source, deleted it must be")
+    check.equal(index.count(), 0, "Empty the index, now it is")
+    index.close()
+
+
+def test_lexical_index_deletes_through_key_table(tmp_path):
+    """Re-added content, by rowid its old chunks replaced are; an index from before the key table, backfilled it is."""
+    index = LexicalIndex(tmp_path / "lexical.db")
+    index.add("hash_a", [Document(content=CHUNKS[0], id="c0")], {"document_id": "doc_1"})
+    conn = index._get_conn()
+    conn.execute("DROP TABLE chunk_keys")
+    conn.commit()
+    index.close()
+
+    index = LexicalIndex(tmp_path / "lexical.db")
+    index.add("hash_b", [Document(content=text, id=f"c{i}") for i, text in enumerate(CHUNKS[1:], 1)], {"document_id": "doc_2"})
+    index.add("hash_b", [Document(content=CHUNKS[3], id="c3")], {"document_id": "doc_2"})
+    check.equal(index.count(), 2, "Same hash again, its old chunks replaced they are")
+    check.equal(index.search("written notice", filters={"document_id": "doc_1"})[0][0].id, "c0", "Backfilled, the old row is")
+
+    check.equal(index.delete_chunks(["c0"]), 1, "By chunk ID, deleted it must be")
+    keys = index._get_conn().execute("SELECT COUNT(*) FROM chunk_keys").fetchone()[0]
+    check.equal(keys, index.count(), "In step, the key table and the FTS rows stay")
+    plan = " ".join(row[-1] for row in index._get_conn().execute("EXPLAIN QUERY PLAN SELECT rowid FROM chunk_keys WHERE document_id = ?", ["doc_2"]))
+    check.is_in("idx_chunk_keys_document_id", plan, "By index, the rows found are")
+    index.close()
+
+
+def test_exact_terms_and_rank_fusion():
+    """Exact terms detected, and chunks found by both retrievers ranked first they must be."""
+    check.equal(exact_terms('What does clause 4.2.1 say about "model X"?'), ["4.2.1", "model X"], "Numbers and quotes, exact they are")
+    check.equal(exact_terms("what is the refund policy"), [], "Plain words, exact they are not")
+
+    a, b, c = (Document(content=t) for t in ("alpha", "beta", "gamma"))
+    fused = reciprocal_rank_fusion([[a, b], [Document(content="beta"), c]], limit=3)
+    check.equal([d.content for d in fused], ["beta", "alpha", "gamma"], "In both lists, beta wins it must")
+    check.is_in("rrf_score", fused[0].meta_data, "Fusion score, recorded it must be")
+
+
+def test_decisive_lexical_hit_skips_embedding(hybrid):
+    """Exact clause asked for, by BM25 alone answered it is; embedded the query is not."""
+    knowledge, embedder = hybrid
+    results = knowledge.search("What does clause 4.2.1 require?")
+    check.equal(results[0].content, CHUNKS[0], "Exact clause, first it must be")
+    check.equal(embedder.calls, 0, "Embedding round trip, skipped it must be")
+    check.equal(knowledge.stats()["lexical_only"], 1, "Lexical shortcut, counted it must be")
+
+
+def test_plain_question_fuses_vector_and_lexical(hybrid):
+    """No exact term, then both retrievers asked and fused they are."""
+    knowledge, embedder = hybrid
+    results = asyncio.run(knowledge.asearch("refunds issued after return"))
+    check.equal(results[0].content, CHUNKS[3], "Refund chunk, first it must be")
+    check.equal(embedder.calls, 1, "Query, embedded once it must be")
+    check.equal(knowledge.stats()["fused"], 1, "Fusion, counted it must be")
+
+
+def test_document_scope_filters_both_retrievers(hybrid):
+    """Scoped to one document, from the others nothing returned must be."""
+    knowledge, embedder = hybrid
+    other = [Document(content="Refunds for doc two are never issued.", id="chunk_other", name="policy")]
+    content = Content(content_hash="hash_policy", metadata={"document_id": "doc_2", "source": "policy.pdf"})
+    knowledge._handle_vector_db_insert(content, other, upsert=False)
+
+    scope = {"document_id": {"$in": ["doc_2"]}}
+    results = knowledge.search("refunds issued", filters=scope)
+    check.equal([d.meta_data["document_id"] for d in results], ["doc_2"], "Only the scoped document, searched it is")
+    unscoped = knowledge.search("refunds issued")
+    check.is_in("doc_1", [d.meta_data["document_id"] for d in unscoped], "Unscoped, the whole corpus searched it is")
+
+
+@pytest.mark.parametrize("agentic", [False, True])
+def test_document_scope_survives_the_agent_knowledge_tool(hybrid, agentic):
+    """Through the agent's search tool the scope goes; validated, dropped it is not."""
+    from agno.agent import Agent
+    from agent_config.agent import scope_filters
+
+    knowledge, embedder = hybrid
+    other = [Document(content="Refunds for doc two are never issued.", id="chunk_other", name="policy")]
+    content = Content(content_hash="hash_policy", metadata={"document_id": "doc_2", "source": "policy.pdf"})
+    knowledge._handle_vector_db_insert(content, other, upsert=False)
+    check.equal(knowledge.validate_filters(scope_filters(["doc_2"])), (scope_filters(["doc_2"]), []))
+
+    agent = Agent(knowledge=knowledge, enable_agentic_knowledge_filters=agentic)
+    for async_mode in (False, True):
+        tool = knowledge.get_tools(
+            knowledge_filters=scope_filters(["doc_2"]), async_mode=async_mode, enable_agentic_filters=agentic, agent=agent
+        )[0]
+        answer = tool.entrypoint("refunds issued")
+        answer = asyncio.run(answer) if async_mode else answer
+        check.is_in("never issued", answer, "The scoped document, found it must be")
+        check.is_not_in("fourteen days", answer, "Outside the scope, excluded the chunks must be")
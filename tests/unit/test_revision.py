@@ -0,0 +1,182 @@
+"""
+Unit tests for incremental document revision, these are.
+Only changed chunks, embedded and deleted they must be.
+"""
+import sqlite3
+import threading
+from dataclasses import dataclass
+from hashlib import sha256
+from uuid import uuid4
+import pytest
+import pytest_check as check
+from agno.knowledge.document import Document
+from agno.knowledge.embedder import Embedder
+from agent_config import document as document_module
+from agent_config.document import EmptyDocumentError, diff_chunks, document_lock, handle_delete_pdf, ingest_pdf, revise_pdf
+from agent_config.file_store import get_corpus_stats, get_document_chunks, get_file_record, init_file_table
+from agent_config.lexical_index import LexicalIndex
+from agent_config.local_vectordb import LocalVectorDb
+from agent_config.retrieval import HybridKnowledge, chunk_key
+
+
+@dataclass
+class CountingEmbedder(Embedder):
+    """Hashed words it embeds; every chunk embedded, it remembers."""
+    id: str = "counting-test"
+    dimensions: int = 16
+    enable_batch: bool = False
+
+    def __post_init__(self):
+        self.texts = []
+
+    def get_embedding(self, text: str):
+        self.texts.append(text)
+        vector = [0.0] * self.dimensions
+        for word in text.lower().split():
+            vector[int(sha256(word.encode()).hexdigest(), 16) % self.dimensions] += 1.0
+        return vector
+
+    def get_embedding_and_usage(self, text: str):
+        return self.get_embedding(text), None
+
+    async def async_get_embedding(self, text: str):
+        return self.get_embedding(text)
+
+    async def async_get_embedding_and_usage(self, text: str):
+        return self.get_embedding_and_usage(text)
+
+
+class LineReader:
+    """One chunk per line of the file, it reads. PDFs, needed they are not."""
+
+    def read(self, path, name=None, password=None):
+        lines = path.read_text().splitlines()
+        return [Document(content=line, id=str(uuid4()), name=name, meta_data={"page": 1}) for line in lines]
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    """A local store, lexical index and file table on temporary paths, wire I do."""
+    db_path = tmp_path / "app.db"
+
+    def mock_get_conn():
+        conn = sqlite3.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    monkeypatch.setattr("agent_config.file_store.get_conn", mock_get_conn)
+    init_file_table()
+
+    embedder = CountingEmbedder()
+    vector_db = LocalVectorDb(name="revision", dimension=16, embedder=embedder, path=tmp_path / "vectors")
+    lexical = LexicalIndex(tmp_path / "lexical.db")
+    knowledge = HybridKnowledge(vector_db=vector_db, lexical_index=lexical)
+    monkeypatch.setattr(document_module, "vector_db", vector_db)
+    monkeypatch.setattr(document_module, "lexical_index", lexical)
+    monkeypatch.setattr(document_module, "knowledge", knowledge)
+    monkeypatch.setattr(document_module, "pdf_reader", LineReader())
+    yield tmp_path, embedder, vector_db, lexical
+    lexical.close()
+    vector_db.close()
+
+
+def test_diff_chunks_keeps_matching_vector_ids():
+    """Unchanged chunks, their stored IDs they take. Repeated text, once per copy matched it is."""
+    texts = ["intro", "terms", "terms"]
+    stored = [(chunk_key(Document(content=text)), f"vec_{i}") for i, text in enumerate(texts)]
+    documents = [Document(content=text) for text in ("intro", "terms", "appendix")]
+
+    kept, added, removed = diff_chunks(stored, documents)
+
+    check.equal([d.id for d in kept], ["vec_0", "vec_1"], "Stored IDs, reused they must be")
+    check.equal([d.content for d in added], ["appendix"], "New text, added it must be")
+    check.equal(removed, ["vec_2"], "The extra copy, removed it must be")
+
+
+def test_revision_embeds_only_changed_chunks(corpus):
+    """Small edit to a document, only the edited chunk embedded must be. The old one, gone it is."""
+    tmp_path, embedder, vector_db, lexical = corpus
+    first = tmp_path / "v1.pdf"
+    first.write_text("refund policy thirty days\nshipping takes a week\nwarranty covers defects")
+    ingest_pdf("doc_a", "manual.pdf", str(first), "hash_v1")
+    embedder.texts.clear()
+
+    second = tmp_path / "v2.pdf"
+    second.write_text("refund policy thirty days\nshipping takes two weeks\nwarranty covers defects")
+    revision = revise_pdf("doc_a", str(second), "hash_v2")
+
+    check.equal((revision["added"], revision["removed"], revision["unchanged"]), (1, 1, 2), "One chunk changed, only")
+    check.equal(embedder.texts, ["shipping takes two weeks"], "Only the edited chunk, embedded it must be")
+    check.equal(vector_db.get_count(), 3, "Three live chunks, the store must hold")
+    check.equal(len(get_document_chunks("doc_a")), 3, "The chunk set, updated it must be")
+    check.equal(get_file_record("doc_a")["content_hash"], "hash_v2", "New version, recorded it must be")
+    check.is_false(first.exists(), "Old file, removed it must be")
+    check.equal(lexical.search("week", limit=5), [], "Removed chunk, from BM25 gone it must be")
+    check.equal(vector_db.search("shipping weeks", limit=1)[0].content, "shipping takes two weeks")
+
+
+def test_delete_leaves_same_named_document(corpus):
+    """Two uploads with one file name, deleting one the other must keep. Stats, from the manifest they come."""
+    tmp_path, embedder, vector_db, lexical = corpus
+    for document_id, text in (("doc_a", "alpha clause one\nalpha clause two"), ("doc_b", "beta clause one")):
+        path = tmp_path / f"{document_id}.pdf"
+        path.write_text(text)
+        ingest_pdf(document_id, "manual.pdf", str(path), f"hash_{document_id}")
+
+    check.equal(get_corpus_stats()["chunks"], 3, "Every chunk, in the manifest it must be")
+    check.is_true(handle_delete_pdf("doc_a"), "Delete, succeed it must")
+
+    check.equal(vector_db.get_count(), 1, "The other document's chunk, kept it must be")
+    check.equal(vector_db.search("beta clause", limit=5)[0].meta_data["document_id"], "doc_b")
+    check.equal(lexical.count(), 1, "From BM25 too, only doc_a gone it must be")
+    check.is_none(get_file_record("doc_a"), "Record, removed it must be")
+    stats = get_corpus_stats()
+    check.equal((stats["documents"], stats["chunks"]), (1, 1), "Manifest, cleaned up it must be")
+    check.greater(stats["tokens"], 0, "Token counts, recorded they must be")
+
+
+def test_revision_without_text_rejected(corpus):
+    """Parsed to nothing the new version is, rejected it must be; the stored chunks, untouched."""
+    tmp_path, embedder, vector_db, lexical = corpus
+    first = tmp_path / "v1.pdf"
+    first.write_text("refund policy thirty days\nshipping takes a week")
+    ingest_pdf("doc_a", "manual.pdf", str(first), "hash_v1")
+    empty = tmp_path / "v2.pdf"
+    empty.write_text("")
+
+    with pytest.raises(EmptyDocumentError):
+        revise_pdf("doc_a", str(empty), "hash_v2")
+
+    check.equal(vector_db.get_count(), 2, "Indexed still, the old chunks must be")
+    check.equal(len(get_document_chunks("doc_a")), 2, "The manifest, kept it must be")
+    check.equal(get_file_record("doc_a")["content_hash"], "hash_v1", "The old version, current it stays")
+
+
+def test_revision_waits_for_concurrent_delete(corpus):
+    """Held by a delete the document is, the revision waits; then, the deleted document it finds."""
+    tmp_path, embedder, vector_db, lexical = corpus
+    first = tmp_path / "v1.pdf"
+    first.write_text("refund policy thirty days")
+    ingest_pdf("doc_a", "manual.pdf", str(first), "hash_v1")
+    second = tmp_path / "v2.pdf"
+    second.write_text("refund policy sixty days")
+    outcome = []
+
+    def revise():
+        try:
+            outcome.append(revise_pdf("doc_a", str(second), "hash_v2"))
+        except KeyError as e:
+            outcome.append(e)
+
+    with document_lock("doc_a"):
+        worker = threading.Thread(target=revise)
+        worker.start()
+        worker.join(0.2)
+        check.is_true(worker.is_alive(), "Behind the lock, the revision waits")
+        document_module._delete_vectors("doc_a", [v for _, v in get_document_chunks("doc_a")])
+        document_module.delete_uploaded_file("doc_a")
+    worker.join()
+
+    check.is_instance(outcome[0], KeyError, "The deleted document, revised it is not")
+    check.equal(vector_db.get_count(), 0, "Resurrected, no chunk is")
+    check.equal(document_module._document_locks, {}, "Released, the per-document locks are")
@@ -0,0 +1,126 @@
+"""
+Unit tests for the two-tier session store, these are.
+From memory active sessions served, written behind in batches, and on close flushed, verify I must.
+"""
+from time import time
+
+import pytest
+import pytest_check as check
+from agno.db.base import SessionType
+from agno.db.sqlite import SqliteDb
+from agno.models.message import Message
+from agno.run.agent import RunOutput
+from agno.run.base import RunStatus
+from agno.session import AgentSession
+from agno.session.summary import SessionSummary
+
+from agent_config.session_store import TieredSqliteDb
+
+
+def session(session_id: str, runs: int = 1) -> AgentSession:
+    return AgentSession(
+        session_id=session_id,
+        agent_id="a1",
+        created_at=int(time()),
+        runs=[
+            RunOutput(
+                run_id=f"{session_id}_{i}",
+                agent_id="a1",
+                session_id=session_id,
+                status=RunStatus.completed,
+                messages=[Message(role="user", content=f"question {i}")],
+            )
+            for i in range(runs)
+        ],
+    )
+
+
+@pytest.fixture
+def stores(tmp_path):
+    """A tiered store and a plain reader of the same file, open I do."""
+    path = str(tmp_path / "sessions.db")
+    tiered = TieredSqliteDb(db_file=path, cache_size=2, flush_seconds=3600)
+    durable = SqliteDb(db_file=path)
+    yield tiered, durable
+    tiered.close()
+
+
+def test_hot_sessions_served_from_memory_and_written_behind(stores):
+    """Until flushed, on disk the session is not; from memory read back it is."""
+    tiered, durable = stores
+    tiered.upsert_session(session("s1"))
+
+    check.is_none(durable.get_session(session_id="s1", session_type=SessionType.AGENT), "Written behind, not yet on disk")
+    cached = tiered.get_session(session_id="s1", session_type=SessionType.AGENT)
+    check.equal(len(cached.runs), 1, "From memory, the session served is")
+    check.equal(tiered.cache_stats()["hits"], 1)
+
+    cached.runs.append(cached.runs[0])
+    check.equal(len(tiered.get_session(session_id="s1", session_type=SessionType.AGENT).runs), 1, "Copies handed out, they are")
+
+    check.equal(tiered.flush_sessions(), 1, "One dirty session, flushed it is")
+    check.equal(len(durable.get_session(session_id="s1", session_type=SessionType.AGENT).runs), 1, "Durable now, it is")
+
+
+def test_evicted_dirty_sessions_still_flushed(stores):
+    """Past the LRU size, evicted sessions not yet written, lost they must not be."""
+    tiered, durable = stores
+    for session_id in ("s1", "s2", "s3"):
+        tiered.upsert_session(session(session_id))
+
+    check.equal(tiered.cache_stats()["size"], 2, "Bounded, the hot tier is")
+    tiered.close()
+    stored = durable.get_sessions(session_type=SessionType.AGENT)
+    check.equal(sorted(s.session_id for s in stored), ["s1", "s2", "s3"], "On close, every session flushed it is")
+
+
+def test_summary_and_delete_go_through_the_cache(stores):
+    """A summary on the cached copy set is; a deleted session, from memory gone too."""
+    tiered, durable = stores
+    tiered.upsert_session(session("s1"))
+
+    check.is_true(tiered.update_cached_summary("s1", SessionSummary(summary="about refunds")))
+    tiered.flush_sessions()
+    check.equal(durable.get_session(session_id="s1", session_type=SessionType.AGENT).summary.summary, "about refunds")
+
+    tiered.delete_sessions(["s1"])
+    check.is_none(tiered.get_session(session_id="s1", session_type=SessionType.AGENT), "Deleted, from both tiers it is")
+    check.is_false(tiered.update_cached_summary("missing", SessionSummary(summary="x")), "Not cached, to the column it falls")
+
+
+def test_failed_flush_requeues_only_what_failed(stores):
+    """The batch failing, one by one written the sessions are; the broken one alone, dirty it stays."""
+    tiered, durable = stores
+    tiered.upsert_session(session("s1"))
+    broken = session("s2")
+    broken.session_data = {"unserializable": object()}
+    tiered.upsert_session(broken)
+
+    check.equal(tiered.flush_sessions(), 1, "Only the written session, counted it is")
+    check.is_not_none(durable.get_session(session_id="s1", session_type=SessionType.AGENT), "The good one, durable it is")
+    check.is_none(durable.get_session(session_id="s2", session_type=SessionType.AGENT), "The broken one, written it is not")
+    check.equal(tiered.cache_stats()["dirty"], 1, "Back in the dirty set, the failure goes")
+    tiered._forget(["s2"])
+
+
+def test_cached_copy_revalidated_against_other_workers(tmp_path):
+    """Written by another worker the session was, then reloaded it is; stale history served it is not."""
+    path = str(tmp_path / "sessions.db")
+    first = TieredSqliteDb(db_file=path, flush_seconds=3600)
+    second = TieredSqliteDb(db_file=path, flush_seconds=3600)
+    first.upsert_session(session("s1"))
+    first.flush_sessions()
+    check.equal(len(second.get_session(session_id="s1", session_type=SessionType.AGENT).runs), 1)
+
+    first.upsert_session(session("s1", runs=2))
+    first.flush_sessions()
+    check.equal(len(second.get_session(session_id="s1", session_type=SessionType.AGENT).runs), 2, "Reloaded, the newer turns are")
+    check.equal(second.cache_stats()["misses"], 2, "The stale copy, served it was not")
+    check.equal(len(second.get_session(session_id="s1", session_type=SessionType.AGENT).runs), 2)
+    check.equal(second.cache_stats()["hits"], 1, "Still current, from memory it comes")
+
+    first.upsert_session(session("s2"))
+    listed = sorted(s.session_id for s in first.get_sessions(session_type=SessionType.AGENT))
+    check.equal(listed, ["s1", "s2"], "Listing, after a flush it runs; the pending session, seen it is")
+    first.close()
+    second.close()